@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк записи в processed_messages.
+
+Сравнивает прежнюю схему (новое соединение и commit с настройками
+по умолчанию на каждый вызов) с долгоживущим соединением DatabaseManager
+в режиме WAL и с отложенной групповой записью отметок.
+
+Запуск: python benchmarks/bench_db_inserts.py
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db_manager import DatabaseManager  # noqa: E402
+from db_schema import create_database  # noqa: E402
+
+
+class LegacyDatabaseManager:
+    """Прежняя реализация: соединение открывается на каждый запрос"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def _get_connection(self):
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def message_exists(self, message_id, channel_id):
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*) FROM processed_messages
+            WHERE message_id = ? AND channel_id = ?
+        ''', (message_id, channel_id))
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count > 0
+
+    def add_processed_message(self, message_id, channel_id):
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO processed_messages (message_id, channel_id)
+                VALUES (?, ?)
+            ''', (message_id, channel_id))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            conn.close()
+
+
+def measure(db, count: int) -> float:
+    """Возвращает число проверенных и записанных сообщений в секунду"""
+    start = time.perf_counter()
+    for message_id in range(count):
+        if not db.message_exists(message_id, "-100"):
+            db.add_processed_message(message_id, "-100")
+    return count / (time.perf_counter() - start)
+
+
+def main(count: int = 2000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_file = str(Path(tmp) / "legacy.db")
+        pooled_file = str(Path(tmp) / "pooled.db")
+        buffered_file = str(Path(tmp) / "buffered.db")
+        create_database(legacy_file)
+        create_database(pooled_file)
+        create_database(buffered_file)
+
+        legacy = measure(LegacyDatabaseManager(legacy_file), count)
+        db = DatabaseManager(pooled_file)
+        pooled = measure(db, count)
+        db.close()
+        db = DatabaseManager(buffered_file, processed_flush_every=100)
+        buffered = measure(db, count)
+        db.close()
+
+    print(f"Сообщений: {count}")
+    print(f"соединение на вызов: {legacy:>10,.0f} вставок/сек")
+    print(f"общее соединение:    {pooled:>10,.0f} вставок/сек ({pooled / legacy:.2f}x)")
+    print(f"групповая запись:    {buffered:>10,.0f} вставок/сек ({buffered / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк обогащения сообщений в parser.monitor.process_message.
+
+Сравнивает прежнюю цепочку extract_city -> find_tags -> is_hot_content ->
+create_short_title (каждый шаг заново приводит и сканирует текст)
+с однократным разбором analyze_text.
+
+Запуск: python benchmarks/bench_enrichment.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parser.classifiers import find_tags, is_hot_content  # noqa: E402
+from parser.enrichment import analyze_text  # noqa: E402
+from parser.summarizer import create_short_title, extract_date_info  # noqa: E402
+from benchmarks.corpus import load_texts  # noqa: E402
+
+
+def legacy_extract_city(text: str) -> str:
+    """Прежняя реализация parser.monitor.extract_city"""
+    cities = ["Москва", "Санкт-Петербург", "Спб", "СПб", "Питер"]
+    text = text.lower()
+    for city in cities:
+        if city.lower() in text:
+            if city.lower() in ["спб", "питер"]:
+                return "Санкт-Петербург"
+            return city
+    return "Москва"
+
+
+def legacy_chain(text: str):
+    """Прежняя последовательность шагов в process_message"""
+    city = legacy_extract_city(text)
+    tags = list(find_tags(text))
+    is_hot = is_hot_content(tags)
+    short = create_short_title(text, tags, city)
+    return city, tags, is_hot, short
+
+
+def measure(func, texts, rounds: int) -> float:
+    """Возвращает пропускную способность в постах в секунду"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            func(text)
+    return rounds * len(texts) / (time.perf_counter() - start)
+
+
+def main(rounds: int = 3000) -> None:
+    texts = load_texts()
+    for text in texts:
+        city, tags, is_hot, short = legacy_chain(text)
+        analysis = analyze_text(text)
+        assert (analysis.city, set(analysis.tags), analysis.is_hot) == (city, set(tags), is_hot)
+        assert analysis.short == create_short_title(text, analysis.tags, city)
+
+    legacy = measure(legacy_chain, texts, rounds)
+    legacy_dates = measure(lambda text: (legacy_chain(text), extract_date_info(text)), texts, rounds)
+    fused = measure(analyze_text, texts, rounds)
+
+    print(f"Корпус: {len(texts)} постов, {rounds} повторов")
+    print(f"текущая цепочка:          {legacy:>10,.0f} постов/сек")
+    print(f"текущая цепочка + даты:   {legacy_dates:>10,.0f} постов/сек")
+    print(f"analyze_text (с датами):  {fused:>10,.0f} постов/сек ({fused / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
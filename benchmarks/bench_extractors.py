@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк извлечения цен и дат.
+
+Сравнивает прежние extract_price (четыре прохода finditer) и
+extract_date_info (сборка шаблонов и до трех re.search на вызов)
+с предкомпилированными сканерами на корпусе parsed_messages_*.json.
+
+Запуск: python benchmarks/bench_extractors.py
+"""
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parser.classifiers import extract_price  # noqa: E402
+from parser.summarizer import extract_date_info, scan_prices_and_dates  # noqa: E402
+from benchmarks.corpus import load_texts  # noqa: E402
+
+
+def legacy_extract_price(text: str) -> list:
+    """Прежняя реализация extract_price"""
+    price_patterns = [
+        r'(\d+)\s*₽',
+        r'(\d+)\s*руб',
+        r'(\d+)\s*р\b',
+        r'(\d+)\s*rub',
+    ]
+    prices = []
+    for pattern in price_patterns:
+        matches = re.finditer(pattern, text, re.IGNORECASE)
+        prices.extend(int(match.group(1)) for match in matches)
+    return sorted(prices) if prices else []
+
+
+def legacy_extract_date_info(text: str):
+    """Прежняя реализация extract_date_info"""
+    months = (
+        "января|февраля|марта|апреля|мая|июня|"
+        "июля|августа|сентября|октября|ноября|декабря"
+    )
+    date_patterns = [
+        rf'(?:до|по)\s+(\d{{1,2}}(?:\s+)?(?:{months}))',
+        rf'(?:с|начиная с)\s+(\d{{1,2}}(?:\s+)?(?:{months}))',
+        rf'(\d{{1,2}}(?:\s+)?(?:{months}))',
+    ]
+    for pattern in date_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    return None
+
+
+def measure(func, texts, rounds: int) -> float:
+    """Возвращает пропускную способность в постах в секунду"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            func(text)
+    return rounds * len(texts) / (time.perf_counter() - start)
+
+
+def main(rounds: int = 5000) -> None:
+    texts = load_texts()
+    for text in texts:
+        scan = scan_prices_and_dates(text)
+        assert scan.prices == legacy_extract_price(text) == extract_price(text)
+        assert scan.date == legacy_extract_date_info(text) == extract_date_info(text)
+
+    legacy = measure(
+        lambda text: (legacy_extract_price(text), legacy_extract_date_info(text)), texts, rounds
+    )
+    separate = measure(lambda text: (extract_price(text), extract_date_info(text)), texts, rounds)
+    combined = measure(scan_prices_and_dates, texts, rounds)
+
+    print(f"Корпус: {len(texts)} постов, {rounds} повторов")
+    print(f"прежние extract_price + extract_date_info: {legacy:>10,.0f} постов/сек")
+    print(
+        f"предкомпилированные extract_price + extract_date_info: {separate:>10,.0f} постов/сек "
+        f"({separate / legacy:.2f}x)"
+    )
+    print(f"scan_prices_and_dates: {combined:>10,.0f} постов/сек ({combined / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк классификации тегов.
+
+Сравнивает прежний цикл по TAG_RULES (lower() и поиск для каждого
+ключевого слова) со скомпилированными find_tags / find_tags_many.
+
+Запуск: python benchmarks/bench_find_tags.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parser.classifiers import TAG_RULES, find_tags, find_tags_many, normalize_text  # noqa: E402
+from benchmarks.corpus import load_texts  # noqa: E402
+
+
+def legacy_find_tags(text: str) -> set:
+    """Прежняя реализация find_tags"""
+    normalized_text = normalize_text(text)
+    found_tags = set()
+    for tag, rule in TAG_RULES.items():
+        if any(keyword.lower() in normalized_text for keyword in rule.keywords):
+            found_tags.add(tag)
+    return found_tags
+
+
+def measure(func, texts, rounds: int) -> float:
+    """Возвращает пропускную способность в постах в секунду"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(texts)
+    return rounds * len(texts) / (time.perf_counter() - start)
+
+
+def main(rounds: int = 5000) -> None:
+    texts = load_texts()
+    assert [legacy_find_tags(t) for t in texts] == find_tags_many(texts)
+
+    legacy = measure(lambda batch: [legacy_find_tags(t) for t in batch], texts, rounds)
+    single = measure(lambda batch: [find_tags(t) for t in batch], texts, rounds)
+    batch = measure(find_tags_many, texts, rounds)
+
+    print(f"Корпус: {len(texts)} постов, {rounds} повторов")
+    print(f"прежний цикл:   {legacy:>10,.0f} постов/сек")
+    print(f"find_tags:      {single:>10,.0f} постов/сек ({single / legacy:.2f}x)")
+    print(f"find_tags_many: {batch:>10,.0f} постов/сек ({batch / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
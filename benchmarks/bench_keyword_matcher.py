@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк поиска ключевых слов в TelegramMonitor.
+
+Сравнивает прежнюю проверку `any(keyword in text for keyword in keywords)`
+с KeywordMatcher на словарях из 10, 1 000 и 50 000 слов.
+
+Запуск: python benchmarks/bench_keyword_matcher.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parser.keyword_matcher import KeywordMatcher  # noqa: E402
+from benchmarks.corpus import load_texts  # noqa: E402
+
+ALPHABET = "абвгдежзийклмнопрстуфхцчшщыэюя"
+SIZES = (10, 1_000, 50_000)
+
+
+def make_keywords(count: int, seed: int = 42) -> list:
+    """Генерирует словарь случайных слов с несколькими реальными ключевыми словами"""
+    rnd = random.Random(seed)
+    keywords = {"кофе", "бар", "завтрак"}
+    while len(keywords) < count:
+        keywords.add("".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(4, 9))))
+    return list(keywords)
+
+
+def posts_per_second(func, texts, min_time: float = 0.5) -> float:
+    """Прогоняет func по корпусу, пока не наберется min_time секунд"""
+    processed = 0
+    start = time.perf_counter()
+    while True:
+        for text in texts:
+            func(text)
+        processed += len(texts)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return processed / elapsed
+
+
+def main() -> None:
+    texts = [text.lower() for text in load_texts()]
+    print(f"Корпус: {len(texts)} постов, средняя длина {sum(map(len, texts)) / len(texts):.0f} символов")
+    print(f"{'слов':>8} {'any(in)':>12} {'contains_any':>14} {'find_all':>12}  режим")
+
+    for size in SIZES:
+        keywords = make_keywords(size)
+
+        build_start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        build_time = time.perf_counter() - build_start
+
+        naive = posts_per_second(lambda text: any(k in text for k in keywords), texts)
+        compiled = posts_per_second(matcher.contains_any, texts)
+        offsets = posts_per_second(matcher.find_all, texts)
+
+        mode = "automaton" if matcher.uses_automaton else "scan"
+        print(
+            f"{size:>8} {naive:>12,.0f} {compiled:>14,.0f} {offsets:>12,.0f}  "
+            f"{mode} (сборка {build_time * 1000:.1f} мс)"
+        )
+    print("Единицы: постов/сек")
+
+
+if __name__ == "__main__":
+    main()
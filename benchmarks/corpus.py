@@ -0,0 +1,27 @@
+"""Загрузка корпуса сообщений для бенчмарков"""
+import json
+from pathlib import Path
+from typing import List
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_texts(pattern: str = "parsed_messages_*.json") -> List[str]:
+    """
+    Загружает тексты сообщений из сохраненных выгрузок парсера.
+
+    Args:
+        pattern: Маска файлов выгрузки в корне проекта
+
+    Returns:
+        List[str]: Непустые тексты сообщений
+    """
+    texts = []
+    for path in sorted(BASE_DIR.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            texts.extend(item.get("text") or "" for item in json.load(f))
+
+    texts = [text for text in texts if text.strip()]
+    if not texts:
+        raise SystemExit(f"Не найдено сообщений по маске {pattern}")
+    return texts
@@ -10,7 +10,7 @@ from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils import executor
 from dotenv import load_dotenv
-from db_manager import DatabaseManager
+from db_manager import DatabaseManager, AsyncDatabaseManager
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -30,8 +30,15 @@ bot = Bot(token=BOT_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(bot, storage=storage)
 
-# Инициализация менеджера базы данных
-db = DatabaseManager()
+# Инициализация менеджера базы данных. Отметки об обработанных сообщениях
+# пишутся пачками: при сбое теряется не больше PROCESSED_FLUSH_EVERY
+# отметок или PROCESSED_FLUSH_INTERVAL_MS миллисекунд
+db = DatabaseManager.from_env()
+
+# Обработчики обращаются к базе через поток чтения и поток-писатель: бот
+# делит цикл событий с мониторингом, и синхронный запрос остановил бы
+# обработку новых постов. Этот же экземпляр использует монитор (main.py)
+adb = AsyncDatabaseManager(db)
 
 # Определение состояний для FSM (конечного автомата)
 class Form(StatesGroup):
@@ -44,10 +51,10 @@ class Form(StatesGroup):
     search = State()  # Состояние поиска
 
 # Функция для создания главной клавиатуры
-def get_main_keyboard(user_id=None):
+async def get_main_keyboard(user_id=None):
     is_admin = False
     if user_id:
-        user = db.get_user(user_id)
+        user = await adb.get_user(user_id)
         is_admin = user and user['is_admin'] == 1
     
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
@@ -68,15 +75,15 @@ def get_main_keyboard(user_id=None):
 @dp.message_handler(commands=['start'])
 async def cmd_start(message: types.Message):
     user_id = message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     if not user:
-        db.add_user(user_id)
-        user = db.get_user(user_id)
+        await adb.add_user(user_id)
+        user = await adb.get_user(user_id)
     
     await message.answer(
         f"Привет, {message.from_user.first_name}! Я бот для отслеживания скидок и акций из Telegram-каналов.",
-        reply_markup=get_main_keyboard(user_id)
+        reply_markup=await get_main_keyboard(user_id)
     )
 
 # Обработчик команды /admin для назначения администратором
@@ -90,17 +97,17 @@ async def cmd_admin(message: types.Message):
         return
     
     user_id = message.from_user.id
-    db.set_admin_status(user_id, 1)
+    await adb.set_admin_status(user_id, 1)
     
     await message.answer(
         "Вы успешно назначены администратором.",
-        reply_markup=get_main_keyboard(user_id)
+        reply_markup=await get_main_keyboard(user_id)
     )
 
 # Обработчик для выбора города
 @dp.message_handler(Text(equals='🌆 Выбрать город'))
 async def choose_city(message: types.Message):
-    cities = db.get_all_cities()
+    cities = (await adb.get_catalog()).cities
     
     if not cities:
         await message.answer("В базе данных нет городов. Попросите администратора добавить города.")
@@ -119,9 +126,9 @@ async def process_city_choice(callback_query: types.CallbackQuery, state: FSMCon
     city_id = int(callback_query.data.split('_')[1])
     user_id = callback_query.from_user.id
     
-    db.update_user_city(user_id, city_id)
+    await adb.update_user_city(user_id, city_id)
     
-    city = next((c for c in db.get_all_cities() if c['id'] == city_id), None)
+    city = (await adb.get_catalog()).get_city(city_id)
     city_name = city['name'] if city else 'Неизвестный город'
     
     await bot.answer_callback_query(callback_query.id)
@@ -136,14 +143,16 @@ async def process_city_choice(callback_query: types.CallbackQuery, state: FSMCon
 @dp.message_handler(Text(equals='📊 Статистика'))
 async def show_stats(message: types.Message):
     user_id = message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     if not user or not user['city_id']:
         await message.answer("Сначала выберите город.")
         return
     
-    channels = db.get_channels_by_city(user['city_id'])
-    keywords = db.get_all_keywords()
+    # Справочники берутся из кэша, база читается только после их изменения
+    catalog = await adb.get_catalog()
+    channels = catalog.get_channels_by_city(user['city_id'])
+    keywords = catalog.keywords
     
     stats_text = f"📊 Статистика для города {user['city_name']}:\n\n"
     stats_text += f"📢 Каналы ({len(channels)}):\n"
@@ -168,7 +177,7 @@ async def show_stats(message: types.Message):
 @dp.message_handler(Text(equals='➕ Добавить канал'))
 async def add_channel_start(message: types.Message):
     user_id = message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     if not user or user['is_admin'] != 1:
         await message.answer("У вас нет прав для этой операции.")
@@ -195,7 +204,7 @@ async def add_channel_process(message: types.Message, state: FSMContext):
         channel_username = parts[2].strip()
         city_id = int(parts[3].strip())
         
-        result = db.add_channel(channel_id, channel_name, channel_username, city_id)
+        result = await adb.add_channel(channel_id, channel_name, channel_username, city_id)
         
         if result:
             await message.answer(f"Канал {channel_name} успешно добавлен.")
@@ -211,7 +220,7 @@ async def add_channel_process(message: types.Message, state: FSMContext):
 @dp.message_handler(Text(equals='➕ Добавить ключевое слово'))
 async def add_keyword_start(message: types.Message):
     user_id = message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     if not user or user['is_admin'] != 1:
         await message.answer("У вас нет прав для этой операции.")
@@ -228,7 +237,7 @@ async def add_keyword_process(message: types.Message, state: FSMContext):
         await message.answer("Ключевое слово не может быть пустым.")
         return
     
-    result = db.add_keyword(keyword)
+    result = await adb.add_keyword(keyword)
     
     if result:
         await message.answer(f"Ключевое слово '{keyword}' успешно добавлено.")
@@ -241,7 +250,7 @@ async def add_keyword_process(message: types.Message, state: FSMContext):
 @dp.message_handler(Text(equals='➕ Добавить город'))
 async def add_city_start(message: types.Message):
     user_id = message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     if not user or user['is_admin'] != 1:
         await message.answer("У вас нет прав для этой операции.")
@@ -258,7 +267,7 @@ async def add_city_process(message: types.Message, state: FSMContext):
         await message.answer("Название города не может быть пустым.")
         return
     
-    result = db.add_city(city_name)
+    result = await adb.add_city(city_name)
     
     if result:
         await message.answer(f"Город '{city_name}' успешно добавлен.")
@@ -271,13 +280,13 @@ async def add_city_process(message: types.Message, state: FSMContext):
 @dp.message_handler(Text(equals='❌ Удалить канал'))
 async def delete_channel_start(message: types.Message):
     user_id = message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     if not user or user['is_admin'] != 1:
         await message.answer("У вас нет прав для этой операции.")
         return
     
-    channels = db.get_channels_by_city()
+    channels = (await adb.get_catalog()).channels
     
     if not channels:
         await message.answer("В базе данных нет каналов.")
@@ -297,7 +306,7 @@ async def delete_channel_start(message: types.Message):
 async def delete_channel_process(callback_query: types.CallbackQuery, state: FSMContext):
     channel_id = callback_query.data.split('_')[2]
     
-    db.delete_channel(channel_id)
+    await adb.delete_channel(channel_id)
     
     await bot.answer_callback_query(callback_query.id)
     await bot.send_message(
@@ -311,13 +320,13 @@ async def delete_channel_process(callback_query: types.CallbackQuery, state: FSM
 @dp.message_handler(Text(equals='❌ Удалить ключевое слово'))
 async def delete_keyword_start(message: types.Message):
     user_id = message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     if not user or user['is_admin'] != 1:
         await message.answer("У вас нет прав для этой операции.")
         return
     
-    keywords = db.get_all_keywords(active_only=False)
+    keywords = await adb.get_all_keywords(active_only=False)
     
     if not keywords:
         await message.answer("В базе данных нет ключевых слов.")
@@ -337,7 +346,7 @@ async def delete_keyword_start(message: types.Message):
 async def delete_keyword_process(callback_query: types.CallbackQuery, state: FSMContext):
     keyword_id = int(callback_query.data.split('_')[2])
     
-    db.delete_keyword(keyword_id)
+    await adb.delete_keyword(keyword_id)
     
     await bot.answer_callback_query(callback_query.id)
     await bot.send_message(
@@ -364,5 +373,9 @@ async def search_process(message: types.Message, state: FSMContext):
 async def unknown_message(message: types.Message):
     await message.answer("Не понимаю эту команду. Используйте меню для взаимодействия.")
 
+async def on_shutdown(dispatcher):
+    """Дописывает очередь записей в базу и останавливает ее потоки"""
+    await adb.close()
+
 if __name__ == '__main__':
-    executor.start_polling(dp, skip_updates=True) 
\ No newline at end of file
+    executor.start_polling(dp, skip_updates=True, on_shutdown=on_shutdown) 
\ No newline at end of file
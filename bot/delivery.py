@@ -0,0 +1,369 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from parser.throttle import FloodGate, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Bot API (https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this):
+# около 30 сообщений в секунду на бота, не больше одного сообщения в секунду
+# в личный чат и не больше 20 сообщений в минуту в группу или канал
+GLOBAL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+
+# Приоритеты: меньше - раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Сколько раз повторять запрос после FloodWait
+MAX_RETRIES = 3
+
+# Как часто можно редактировать сообщение о ходе отправки (секунды)
+STATUS_INTERVAL = 2.0
+
+
+def chat_rate(chat_id: Any) -> float:
+    """
+    Возвращает допустимую частоту сообщений в чат.
+
+    Args:
+        chat_id: ID чата Bot API (у групп и каналов отрицательный) или @username
+
+    Returns:
+        float: Сообщений в секунду
+    """
+    if isinstance(chat_id, int) and chat_id > 0:
+        return PRIVATE_CHAT_RATE
+    return GROUP_CHAT_RATE
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Извлекает паузу из ошибки FloodWait.
+
+    Args:
+        error: TelegramRetryAfter (aiogram) или FloodWaitError (Telethon)
+
+    Returns:
+        Optional[float]: Секунды ожидания или None, если это другая ошибка
+    """
+    for attr in ('retry_after', 'seconds'):
+        value = getattr(error, attr, None)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    return None
+
+
+@dataclass
+class ChatLimiter:
+    """Ограничения отправки в один чат"""
+    pacer: TokenBucket
+    flood_gate: FloodGate = field(default_factory=FloodGate)
+    # Держится на время доставки, чтобы сообщения приходили в порядке постановки
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    chat_id: Any = field(compare=False)
+    send: Callable[[Any], Awaitable[Any]] = field(compare=False)
+    prepare: Optional[Callable[[], Awaitable[Any]]] = field(compare=False)
+    future: "asyncio.Future[Any]" = field(compare=False)
+    payload: Optional["asyncio.Task[Any]"] = field(default=None, compare=False)
+
+
+class DeliveryQueue:
+    """
+    Очередь исходящих сообщений бота.
+
+    Сообщения выбираются по приоритету, в один чат уходят в порядке
+    постановки, в разные чаты - параллельно. Частота ограничена общим
+    лимитом бота и лимитом каждого чата (token bucket). Медиа готовится
+    (скачивается) заранее и параллельно, пока предыдущие сообщения ждут
+    своей очереди. Подготовленных, но еще не отправленных сообщений
+    не больше prepare_concurrency, поэтому длинная очередь медиа не держит
+    в памяти все файлы сразу. После FloodWait чат ставится на паузу,
+    и запрос повторяется.
+    """
+
+    def __init__(self, workers: int = 4, prepare_concurrency: int = 4,
+                 global_rate: float = GLOBAL_RATE, max_retries: int = MAX_RETRIES,
+                 rate_for: Callable[[Any], float] = chat_rate):
+        """
+        Args:
+            workers: Сколько сообщений отправлять одновременно
+            prepare_concurrency: Сколько медиа готовить и держать наперед
+                (место освобождается только после отправки)
+            global_rate: Сообщений в секунду на бота (0 - без ограничения)
+            max_retries: Сколько раз повторять запрос после FloodWait
+            rate_for: Допустимая частота сообщений в чат (0 - без ограничения)
+        """
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.rate_for = rate_for
+        self._pacer = TokenBucket(global_rate, capacity=global_rate)
+        self.prepare_concurrency = max(1, prepare_concurrency)
+        # Сообщения, подготовка которых еще не начата, в порядке доставки
+        self._unprepared: List[_Job] = []
+        self._prepared = 0
+        self._limiters: Dict[Any, ChatLimiter] = {}
+        self._queue: "asyncio.PriorityQueue[_Job]" = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    async def __aenter__(self) -> 'DeliveryQueue':
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        """Запускает обработчики очереди"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def join(self) -> None:
+        """Ждет, пока будут доставлены все поставленные сообщения"""
+        await self._queue.join()
+
+    async def close(self) -> None:
+        """Доставляет поставленные сообщения и останавливает обработчики"""
+        if self._tasks:
+            await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def limiter(self, chat_id: Any) -> ChatLimiter:
+        """
+        Возвращает ограничения чата, создавая их при первом обращении.
+
+        Args:
+            chat_id: ID чата или @username
+
+        Returns:
+            ChatLimiter: Ограничения чата
+        """
+        limiter = self._limiters.get(chat_id)
+        if limiter is None:
+            limiter = self._limiters[chat_id] = ChatLimiter(TokenBucket(self.rate_for(chat_id)))
+        return limiter
+
+    def submit(
+        self,
+        chat_id: Any,
+        send: Callable[[Any], Awaitable[Any]],
+        prepare: Optional[Callable[[], Awaitable[Any]]] = None,
+        priority: int = PRIORITY_NORMAL,
+    ) -> "asyncio.Future[Any]":
+        """
+        Ставит сообщение в очередь.
+
+        Подготовка начинается, как только освободится место среди
+        prepare_concurrency сообщений, и идет параллельно с отправкой
+        предыдущих; send вызывается с ее результатом.
+
+        Args:
+            chat_id: Куда отправлять
+            send: Отправка; получает результат prepare (или None)
+            prepare: Подготовка, например скачивание медиа
+            priority: Приоритет (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+        Returns:
+            asyncio.Future: Результат send или ошибка отправки
+        """
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(priority, next(self._seq), chat_id, send, prepare, future)
+        self._queue.put_nowait(job)
+        if prepare is not None:
+            heapq.heappush(self._unprepared, job)
+            self._prefetch()
+        return future
+
+    def _start_prepare(self, job: _Job) -> None:
+        self._prepared += 1
+        job.payload = asyncio.get_running_loop().create_task(job.prepare())
+
+    def _prefetch(self) -> None:
+        """Начинает подготовку следующих по очереди сообщений, пока есть свободные места"""
+        while self._unprepared and self._prepared < self.prepare_concurrency:
+            job = heapq.heappop(self._unprepared)
+            if job.payload is None and not job.future.done():
+                self._start_prepare(job)
+
+    async def acquire(self, chat_id: Any) -> float:
+        """
+        Ждет разрешения на запрос в чат: конца FloodWait, общего и чатового токена.
+
+        Args:
+            chat_id: ID чата или @username
+
+        Returns:
+            float: Сколько секунд пришлось ждать
+        """
+        limiter = self.limiter(chat_id)
+        waited = await limiter.flood_gate.wait()
+        waited += await limiter.pacer.acquire()
+        waited += await self._pacer.acquire()
+        return waited
+
+    async def call(self, chat_id: Any, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполняет запрос к чату с учетом лимитов и повтором после FloodWait.
+
+        Args:
+            chat_id: ID чата или @username
+            request: Запрос к API (вызывается заново при повторе)
+
+        Returns:
+            Результат запроса
+        """
+        for attempt in itertools.count(1):
+            await self.acquire(chat_id)
+            try:
+                return await request()
+            except Exception as e:
+                delay = retry_after(e)
+                if delay is None or attempt > self.max_retries:
+                    raise
+                logger.warning(
+                    f"FloodWait в чате {chat_id}: пауза {delay:.0f} сек (попытка {attempt})"
+                )
+                self.limiter(chat_id).flood_gate.block(delay)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                # Блокировка захватывается сразу после извлечения из очереди,
+                # поэтому сообщения одного чата доставляются по порядку
+                async with self.limiter(job.chat_id).lock:
+                    await self._deliver(job)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, job: _Job) -> None:
+        if job.prepare is not None and job.payload is None:
+            # Очередь дошла до сообщения раньше, чем освободилось место
+            # для подготовки: готовим сразу, иначе обработчик ждал бы вечно
+            self._start_prepare(job)
+        try:
+            payload = await job.payload if job.payload is not None else None
+            result = await self.call(job.chat_id, lambda: job.send(payload))
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            if job.payload is not None:
+                # Отправленное медиа больше не нужно: освобождаем память и место
+                if not job.payload.done():
+                    job.payload.cancel()
+                job.payload = None
+                self._prepared -= 1
+                self._prefetch()
+
+
+class StatusMessage:
+    """
+    Одно сообщение о ходе отправки, которое редактируется вместо отправки новых.
+
+    Частые обновления схлопываются: сообщение редактируется не чаще раза
+    в interval секунд, и всегда последним текстом.
+    """
+
+    def __init__(self, bot: Any, queue: DeliveryQueue, chat_id: Any,
+                 interval: float = STATUS_INTERVAL):
+        """
+        Args:
+            bot: Экземпляр aiogram Bot
+            queue: Очередь, лимиты которой соблюдаются при редактировании
+            chat_id: Куда отправлять
+            interval: Минимальный промежуток между редактированиями (секунды)
+        """
+        self.bot = bot
+        self.queue = queue
+        self.chat_id = chat_id
+        self.interval = interval
+        self.message_id: Optional[int] = None
+        self.edits = 0
+        self._text: Optional[str] = None
+        self._shown: Optional[str] = None
+        self._edited_at = 0.0
+        self._pending: Optional["asyncio.Task[None]"] = None
+
+    async def start(self, text: str) -> None:
+        """
+        Отправляет сообщение о ходе отправки.
+
+        Args:
+            text: Начальный текст
+        """
+        message = await self.queue.call(
+            self.chat_id, lambda: self.bot.send_message(self.chat_id, text)
+        )
+        self.message_id = message.message_id
+        self._text = self._shown = text
+        self._edited_at = time.monotonic()
+
+    def update(self, text: str) -> None:
+        """
+        Запоминает новый текст; сообщение будет отредактировано позже.
+
+        Args:
+            text: Текст о ходе отправки
+        """
+        self._text = text
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.create_task(self._edit_later())
+
+    async def finish(self, text: str) -> None:
+        """
+        Сразу показывает итоговый текст.
+
+        Args:
+            text: Итог отправки
+        """
+        if self._pending is not None:
+            self._pending.cancel()
+            await asyncio.gather(self._pending, return_exceptions=True)
+        self._text = text
+        await self._edit()
+
+    async def _edit_later(self) -> None:
+        await asyncio.sleep(max(0.0, self._edited_at + self.interval - time.monotonic()))
+        await self._edit()
+
+    async def _edit(self) -> None:
+        text = self._text
+        if self.message_id is None or text == self._shown:
+            return
+        try:
+            await self.queue.call(
+                self.chat_id,
+                lambda: self.bot.edit_message_text(
+                    text, chat_id=self.chat_id, message_id=self.message_id
+                ),
+            )
+            self._shown = text
+            self.edits += 1
+        except Exception as e:
+            logger.warning(f"Не удалось обновить сообщение о ходе отправки: {e}")
+        self._edited_at = time.monotonic()
@@ -1,20 +1,107 @@
 import logging
+import os
+import tempfile
 import time
-from typing import List
+from typing import Any, List, Optional
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramAPIError
+from aiogram.types import FSInputFile
 from telethon.tl.types import Message
 
+from bot.delivery import DeliveryQueue, StatusMessage
 from config import settings
+from parser.media_relay import CHUNK_SIZE
 
 
-async def send_messages_to_user(bot: Bot, messages: List[Message]):
+async def _download_media(message: Message) -> FSInputFile:
+    """Скачивает медиа сообщения кусками во временный файл для отправки через Bot API.
+
+    В памяти одновременно лежит не больше одного куска, а aiogram
+    читает файл с диска тоже кусками, поэтому расход памяти не растет
+    с размером файла. Файл удаляет вызывающий после отправки.
+    """
+    download_start = time.time()
+    name = getattr(message.file, 'name', None) or f"{message.id}{message.file.ext or ''}"
+    fd, path = tempfile.mkstemp(prefix='media_', suffix=os.path.splitext(name)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async for chunk in message.client.iter_download(message.media, request_size=CHUNK_SIZE):
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    logging.info(f"Медиафайл сообщения {message.id} скачан за {time.time() - download_start:.2f} сек")
+    return FSInputFile(path, filename=name)
+
+
+def _remove_files(paths: List[str]):
+    """Удаляет временные файлы отправленного сообщения."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.warning(f"Не удалось удалить временный файл {path}: {e}")
+
+
+def submit_message(bot: Bot, queue: DeliveryQueue, chat_id: Any, message: Message):
+    """Ставит сообщение Telethon в очередь отправки.
+
+    Фото и видео начинают скачиваться сразу, параллельно с отправкой
+    предыдущих сообщений.
+
+    Args:
+        bot: Экземпляр aiogram Bot.
+        queue: Очередь исходящих сообщений.
+        chat_id: Кому отправлять.
+        message: Сообщение Telethon.
+
+    Returns:
+        asyncio.Future: Отправленное сообщение или ошибка отправки.
+    """
+    # Формируем ссылку на оригинальное сообщение
+    message_link = f"https://t.me/{message.chat.username}/{message.id}"
+    text_to_send = f"{message.text or message.caption or ''}\n\nИсточник: {message_link}"
+
+    # Временный файл удаляется, когда сообщение отправлено или не отправлено окончательно
+    spooled: List[str] = []
+
+    async def prepare():
+        media = await _download_media(message)
+        spooled.append(media.path)
+        return media
+
+    if message.media and message.photo:
+        future = queue.submit(
+            chat_id,
+            lambda media: bot.send_photo(chat_id=chat_id, photo=media, caption=text_to_send),
+            prepare=prepare,
+        )
+    elif message.media and message.video:
+        future = queue.submit(
+            chat_id,
+            lambda media: bot.send_video(chat_id=chat_id, video=media, caption=text_to_send),
+            prepare=prepare,
+        )
+    else:
+        # Текст и другие типы медиа
+        return queue.submit(chat_id, lambda _: bot.send_message(chat_id, text_to_send))
+    future.add_done_callback(lambda _: _remove_files(spooled))
+    return future
+
+
+async def send_messages_to_user(
+    bot: Bot, messages: List[Message], queue: Optional[DeliveryQueue] = None
+):
     """Отправляет список сообщений пользователю через бота.
 
+    Сообщения идут через очередь с лимитами Telegram, медиа скачивается
+    параллельно, а ход отправки показывается в одном редактируемом сообщении.
+
     Args:
         bot: Экземпляр aiogram Bot.
         messages: Список сообщений Telethon для отправки.
+        queue: Общая очередь отправки; если не передана, создается на время вызова.
     """
     if not messages:
         logging.info("Нет новых сообщений для отправки.")
@@ -23,65 +110,39 @@ async def send_messages_to_user(bot: Bot, messages: List[Message]):
 
     start_time = time.time()
     total = len(messages)
-    logging.info(f"Начинаем отправку {total} сообщений пользователю ID {settings.USER_ID}")
-    await bot.send_message(settings.USER_ID, f"🔄 Начинаю отправку {total} новых сообщений...")
+    chat_id = settings.USER_ID
+    logging.info(f"Начинаем отправку {total} сообщений пользователю ID {chat_id}")
 
-    for i, message in enumerate(messages, 1):
-        msg_start = time.time()
-        try:
-            # Формируем ссылку на оригинальное сообщение
-            message_link = f"https://t.me/{message.chat.username}/{message.id}"
-            text_to_send = f"{message.text or message.caption or ''}\n\nИсточник: {message_link}"
-
-            # Отправляем прогресс
-            if total > 1:
-                progress = f"[{i}/{total}] "
-                await bot.send_message(settings.USER_ID, f"⏳ {progress}Отправляю сообщение {i} из {total}...")
-            
-            # Если есть медиа, отправляем его с текстом
-            if message.media:
-                # Сообщаем о скачивании
-                await bot.send_message(settings.USER_ID, f"⏳ Скачиваю медиафайл для сообщения {i}...")
-                download_start = time.time()
-                
-                # Скачиваем медиафайл временно
-                media_file = await message.download_media(file=bytes)
-                logging.info(f"Медиафайл для сообщения {i} скачан за {time.time() - download_start:.2f} сек")
-                
-                # Отправляем файл
-                send_start = time.time()
-                if message.photo:
-                    await bot.send_photo(
-                        chat_id=settings.USER_ID,
-                        photo=media_file,
-                        caption=text_to_send
-                    )
-                elif message.video:
-                    await bot.send_video(
-                        chat_id=settings.USER_ID,
-                        video=media_file,
-                        caption=text_to_send
-                    )
-                # Другие типы медиа
-                else:
-                    await bot.send_message(settings.USER_ID, text_to_send)
-                
-                logging.info(f"Сообщение {i} с медиа отправлено за {time.time() - send_start:.2f} сек")
-            else:
-                # Текстовое сообщение
-                await bot.send_message(settings.USER_ID, text_to_send)
-                logging.info(f"Текстовое сообщение {i} отправлено")
-
-            message_time = time.time() - msg_start
-            logging.info(f"Сообщение {i}/{total} обработано за {message_time:.2f} сек")
-
-        except TelegramAPIError as e:
-            logging.error(f"Ошибка отправки сообщения ID {message.id}: {e}")
-            await bot.send_message(settings.USER_ID, f"❌ Ошибка отправки сообщения: {str(e)[:100]}...")
-        except Exception as e:
-            logging.error(f"Непредвиденная ошибка при обработке сообщения ID {message.id}: {e}")
-            await bot.send_message(settings.USER_ID, f"❌ Непредвиденная ошибка: {str(e)[:100]}...")
+    owns_queue = queue is None
+    if owns_queue:
+        queue = DeliveryQueue()
+        queue.start()
+
+    status = StatusMessage(bot, queue, chat_id)
+    sent = failed = 0
+    try:
+        await status.start(f"🔄 Начинаю отправку {total} новых сообщений...")
+        futures = [submit_message(bot, queue, chat_id, message) for message in messages]
+
+        for i, (message, future) in enumerate(zip(messages, futures), 1):
+            try:
+                await future
+                sent += 1
+                logging.info(f"Сообщение {i}/{total} отправлено")
+            except TelegramAPIError as e:
+                failed += 1
+                logging.error(f"Ошибка отправки сообщения ID {message.id}: {e}")
+            except Exception as e:
+                failed += 1
+                logging.error(f"Непредвиденная ошибка при обработке сообщения ID {message.id}: {e}")
+            status.update(f"⏳ [{i}/{total}] Отправлено: {sent}, ошибок: {failed}")
+    finally:
+        if owns_queue:
+            await queue.close()
 
     total_time = time.time() - start_time
-    await bot.send_message(settings.USER_ID, f"✅ Отправка завершена! {total} сообщений отправлено за {total_time:.2f} сек")
-    logging.info(f"Все {total} сообщений отправлены за {total_time:.2f} сек") 
\ No newline at end of file
+    summary = f"✅ Отправка завершена! {sent} из {total} сообщений отправлено за {total_time:.2f} сек"
+    if failed:
+        summary += f"\n❌ Не удалось отправить: {failed}"
+    await status.finish(summary)
+    logging.info(f"Отправлено {sent} из {total} сообщений за {total_time:.2f} сек")
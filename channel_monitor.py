@@ -4,11 +4,15 @@ import logging
 import os
 import re
 from datetime import datetime, timedelta
-from telethon import TelegramClient
 from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
 from dotenv import load_dotenv
 import json
-import tempfile
+from parser.watermarks import HighWaterMarks
+from parser.media_cache import MediaCache
+from parser.entity_cache import EntityCache
+from parser.album import album_text, group_albums
+from parser.clients import BOT, USER, get_registry
+from parser.media_relay import send_album
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -20,6 +24,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Файл с последними обработанными ID по каналам
+WATERMARKS_FILE = os.getenv("WATERMARKS_FILE", "data/watermarks.json")
+
+# Сколько новых сообщений канала догружать после простоя
+CATCHUP_LIMIT = 1000
+
+# Кэш медиа: репосты одного файла не скачиваются и не загружаются повторно
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "data/media")
+MEDIA_CACHE_MAX_MB = int(os.getenv("MEDIA_CACHE_MAX_MB", 512))
+
+# Кэш сущностей: целевой канал запрашивается у API один раз, а не при каждой пересылке
+ENTITY_CACHE_FILE = os.getenv("ENTITY_CACHE_FILE", "data/entities.db")
+
 def normalize_channel_name(channel):
     """Преобразование ссылки или имени канала в формат @username"""
     # Если это ссылка вида https://t.me/username
@@ -44,102 +61,134 @@ def is_fresh_message(message_date, max_age_days=7):
     age = now - message_date
     return age.days <= max_age_days
 
-async def get_channel_messages(client, channel, limit=100):
-    """Получение сообщений из канала"""
+async def get_channel_messages(client, channel, limit=100, watermarks=None):
+    """Получение сообщений из канала
+    
+    Если переданы watermarks, загружаются только сообщения новее последнего
+    обработанного (min_id): после простоя история догружается страницами,
+    но не больше CATCHUP_LIMIT сообщений. Отметка канала сдвигается
+    на самое новое полученное сообщение.
+    """
     try:
         # Нормализуем имя канала
         channel = normalize_channel_name(channel)
         logger.info(f"Получение сообщений из канала: {channel}")
         
+        min_id = watermarks.get(channel) if watermarks else 0
+        if min_id:
+            limit = CATCHUP_LIMIT
+        
+        history = []
+        newest_id = 0
+        async for message in client.iter_messages(channel, limit=limit, min_id=min_id):
+            newest_id = max(newest_id, message.id)
+            history.append(message)
+        
+        # Части альбома (общий grouped_id) собираются в один пост с одной подписью
         messages = []
-        async for message in client.iter_messages(channel, limit=limit):
-            if message.text and is_fresh_message(message.date):  # Проверяем дату сообщения
+        for parts in group_albums(history):
+            message = parts[0]
+            text = album_text(parts)
+            if text and is_fresh_message(message.date):  # Проверяем дату сообщения
                 messages.append({
                     'id': message.id,
-                    'text': message.text,
+                    'text': text,
                     'date': message.date.isoformat(),
                     'channel': channel,
-                    'media': bool(message.media),
-                    'message': message
+                    'media': any(part.media for part in parts),
+                    'message': message,
+                    'parts': parts
                 })
                 logger.info(f"Найдено свежее сообщение от {message.date}")
         
+        # Сдвигаем отметку только после успешной загрузки всей истории
+        if watermarks and newest_id:
+            watermarks.advance(channel, newest_id)
+        
         logger.info(f"Найдено {len(messages)} свежих сообщений в канале {channel}")
         return messages
     except Exception as e:
         logger.error(f"Ошибка при получении сообщений из канала {channel}: {e}")
         return []
 
+async def resolve_output_peer(bot_client, output_channel, entities=None):
+    """InputPeer целевого канала для бота (через кэш сущностей аккаунта бота)"""
+    if not isinstance(output_channel, str):
+        # Уже готовый InputPeer
+        return output_channel
+    output_channel = normalize_channel_name(output_channel)
+    if entities is not None:
+        return await entities.get_input_entity(bot_client, output_channel)
+    return await bot_client.get_input_entity(output_channel)
+
 def contains_keywords(text, keywords):
     """Проверка наличия ключевых слов в тексте"""
     text = text.lower()
     return any(keyword.lower() in text for keyword in keywords)
 
-async def forward_message(user_client, bot_client, message, output_channel):
-    """Пересылка сообщения в целевой канал"""
+async def forward_message(user_client, bot_client, message, output_channel, media_cache=None, parts=None,
+                          entities=None):
+    """Пересылка сообщения (или всех частей альбома из parts) в целевой канал
+    
+    output_channel - имя канала или InputPeer, уже полученный через
+    resolve_output_peer (тогда запросов к API за каналом нет вовсе).
+    """
     try:
-        # Нормализуем имя выходного канала
-        output_channel = normalize_channel_name(output_channel)
         logger.info(f"Начинаем пересылку сообщения в канал {output_channel}")
         
-        # Получаем информацию о канале
-        chat = await bot_client.get_entity(output_channel)
-        logger.info(f"Получена информация о целевом канале: {chat}")
+        # InputPeer канала берется из кэша сущностей, к API - только при промахе
+        peer = await resolve_output_peer(bot_client, output_channel, entities)
         
-        # Создаем временную директорию для медиафайлов
-        with tempfile.TemporaryDirectory() as temp_dir:
-            try:
-                # Если есть медиа, скачиваем его
-                if message.media:
-                    logger.info("Сообщение содержит медиафайл")
-                    media_path = await user_client.download_media(
-                        message.media,
-                        file=temp_dir
-                    )
-                    logger.info(f"Медиафайл успешно скачан: {media_path}")
-                    
-                    # Отправляем медиафайл с текстом
-                    await bot_client.send_file(
-                        chat.id,
-                        media_path,
-                        caption=message.text[:1000] if message.text else None  # Ограничиваем длину текста
-                    )
-                    logger.info("Медиафайл успешно отправлен")
-                else:
-                    # Отправляем только текст
-                    logger.info("Отправка текстового сообщения...")
-                    await bot_client.send_message(
-                        chat.id,
-                        message.text[:4000] if message.text else ""  # Ограничиваем длину текста
-                    )
-                    logger.info("Текстовое сообщение успешно отправлено")
-                
-                logger.info(f"Сообщение успешно переслано в канал {output_channel}")
-                return True
-                
-            except Exception as e:
-                logger.error(f"Ошибка при отправке сообщения: {str(e)}")
-                return False
-                
+        try:
+            text = album_text(parts or [message])
+            media_parts = [part for part in parts or [message] if part.photo or part.document]
+            
+            # Если есть фото или файлы, передаем их боту потоком (альбом - одним запросом)
+            if media_parts:
+                logger.info(f"Сообщение содержит медиафайлы: {len(media_parts)}")
+                await send_album(
+                    user_client,
+                    bot_client,
+                    peer,
+                    media_parts,
+                    cache=media_cache,
+                    caption=text[:1000] if text else None  # Ограничиваем длину текста
+                )
+                logger.info("Медиафайлы успешно отправлены")
+            else:
+                # Отправляем только текст
+                logger.info("Отправка текстового сообщения...")
+                await bot_client.send_message(
+                    peer,
+                    text[:4000] if text else ""  # Ограничиваем длину текста
+                )
+                logger.info("Текстовое сообщение успешно отправлено")
+            
+            logger.info(f"Сообщение успешно переслано в канал {output_channel}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка при отправке сообщения: {str(e)}")
+            return False
+            
     except Exception as e:
         logger.error(f"Критическая ошибка при пересылке сообщения: {e}")
         logger.error(f"Тип ошибки: {type(e)}")
         logger.error(f"Детали ошибки: {str(e)}")
         return False
 
-async def check_bot_permissions(bot_client):
+async def check_bot_permissions(bot_client, entities=None):
     """Проверка прав бота в целевом канале"""
     try:
         output_channel = normalize_channel_name(os.getenv("OUTPUT_CHANNEL"))
         logger.info(f"Проверка прав бота в канале {output_channel}")
         
-        # Получаем информацию о канале
-        chat = await bot_client.get_entity(output_channel)
-        logger.info(f"Информация о канале: {chat}")
+        # Канал берется из кэша сущностей (тот же, что используется при пересылке)
+        peer = await resolve_output_peer(bot_client, output_channel, entities)
         
         # Пробуем отправить тестовое сообщение
         try:
-            await bot_client.send_message(chat.id, "Тестовое сообщение для проверки прав")
+            await bot_client.send_message(peer, "Тестовое сообщение для проверки прав")
             logger.info("Права бота проверены успешно")
             return True
         except Exception as e:
@@ -150,7 +199,7 @@ async def check_bot_permissions(bot_client):
         logger.error(f"Ошибка при проверке канала: {e}")
         return False
 
-async def process_channels(user_client, bot_client):
+async def process_channels(user_client, bot_client, entities=None):
     """Обработка всех каналов"""
     channels = [normalize_channel_name(channel.strip()) for channel in os.getenv("TARGET_CHANNELS", "").split(",")]
     keywords = os.getenv("KEYWORDS", "").split(",")
@@ -164,12 +213,17 @@ async def process_channels(user_client, bot_client):
         logger.error("Не указаны каналы или ключевые слова")
         return
     
+    # Целевой канал определяется один раз на весь проход
+    output_peer = await resolve_output_peer(bot_client, output_channel, entities)
+    
     matched_messages = []
+    watermarks = HighWaterMarks(WATERMARKS_FILE)
+    media_cache = MediaCache(MEDIA_CACHE_DIR, max_bytes=MEDIA_CACHE_MAX_MB * 1024 * 1024)
     
     for channel in channels:
         logger.info(f"Начинаем обработку канала: {channel}")
         try:
-            messages = await get_channel_messages(user_client, channel)
+            messages = await get_channel_messages(user_client, channel, watermarks=watermarks)
             logger.info(f"Получено {len(messages)} сообщений из канала {channel}")
             
             for message_data in messages:
@@ -180,12 +234,18 @@ async def process_channels(user_client, bot_client):
                     
                     # Пересылаем сообщение
                     logger.info("Начинаем пересылку сообщения...")
-                    await forward_message(user_client, bot_client, message_data['message'], output_channel)
+                    await forward_message(
+                        user_client, bot_client, message_data['message'], output_peer,
+                        media_cache, parts=message_data['parts']
+                    )
                     logger.info("Сообщение успешно переслано!")
                     break  # Пересылаем только первое найденное сообщение для теста
         except Exception as e:
             logger.error(f"Ошибка при обработке канала {channel}: {e}")
     
+    watermarks.save()
+    media_cache.close()
+    
     if not matched_messages:
         logger.info("Сообщений с ключевыми словами не найдено")
     else:
@@ -193,34 +253,26 @@ async def process_channels(user_client, bot_client):
 
 async def main():
     """Основная функция"""
-    user_client = None
-    bot_client = None
+    clients = get_registry()
+    entities = EntityCache(ENTITY_CACHE_FILE)
     
     try:
-        # Инициализация клиентов
-        user_client = TelegramClient('user_session', int(os.getenv("API_ID")), os.getenv("API_HASH"))
-        bot_client = TelegramClient('bot_session', int(os.getenv("API_ID")), os.getenv("API_HASH"))
-        
-        # Запуск клиентов
-        await user_client.start()
-        await bot_client.start(bot_token=os.getenv("BOT_TOKEN"))
-        
-        logger.info("Клиенты успешно запущены")
-        
-        # Проверяем права бота
-        if not await check_bot_permissions(bot_client):
-            logger.error("Бот не имеет необходимых прав для работы. Проверьте настройки канала.")
-            return
-        
-        await process_channels(user_client, bot_client)
+        # Клиенты берутся из общего реестра процесса
+        async with clients.borrow(USER) as user_client, clients.borrow(BOT) as bot_client:
+            logger.info("Клиенты успешно запущены")
+            
+            # Проверяем права бота
+            if not await check_bot_permissions(bot_client, entities):
+                logger.error("Бот не имеет необходимых прав для работы. Проверьте настройки канала.")
+                return
+            
+            await process_channels(user_client, bot_client, entities)
         
     except Exception as e:
         logger.error(f"Ошибка в основной функции: {e}")
     finally:
-        if user_client:
-            await user_client.disconnect()
-        if bot_client:
-            await bot_client.disconnect()
+        entities.close()
+        await clients.close()
         logger.info("Клиенты отключены")
 
 if __name__ == "__main__":
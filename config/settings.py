@@ -55,7 +55,28 @@ PARSER = {
     'min_delay': 1,
     'max_delay': 3,
     'target_channels': ['@afisharestaurants', '@breakfastinmsk'],
+    # Сколько каналов один аккаунт читает одновременно
+    'channel_concurrency': int(os.getenv('CHANNEL_CONCURRENCY', 3)),
+    # Ограничение частоты запросов к API на аккаунт (token bucket)
+    'requests_per_second': float(os.getenv('REQUESTS_PER_SECOND', 1)),
+    'request_burst': int(os.getenv('REQUEST_BURST', 3)),
+    # Старый список обработанных ID (переносится в dedup_file при первом запуске)
     'processed_file': DATA_DIR / 'processed.json',
+    # Обработанные сообщения с ключом (канал, ID) и сроком хранения
+    'dedup_file': DATA_DIR / 'processed.db',
+    'dedup_ttl_days': 30,
+    # Последний обработанный ID по каналам (min_id для следующей загрузки)
+    'watermarks_file': DATA_DIR / 'watermarks.json',
+    # Сколько новых сообщений канала догружать после простоя
+    'catchup_limit': 1000,
+    # Кэш сущностей (ID -> username, название, access_hash), общий для клиентов
+    'entity_cache_file': DATA_DIR / 'entities.db',
+    'entity_cache_ttl_hours': 24,
+    'entity_cache_size': 1000,
+    # Разбор текстов в пуле процессов, чтобы догрузка тысяч сообщений не
+    # останавливала цикл событий (0 - разбор в цикле событий)
+    'enrichment_workers': int(os.getenv('ENRICHMENT_WORKERS', 0)),
+    'enrichment_batch_size': int(os.getenv('ENRICHMENT_BATCH_SIZE', 64)),
 }
 
 # Настройки логирования
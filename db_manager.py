@@ -1,262 +1,926 @@
+import asyncio
+import atexit
+import functools
+import os
+import queue
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 import logging
+from parser.bloom import BloomFilter
+from db_schema import PROCESSED_BUCKET_GLOB, PROCESSED_BUCKET_PREFIX, processed_bucket_statements
 
 logger = logging.getLogger(__name__)
 
+# Выборки по городу, для которых в db_schema есть покрывающие индексы
+# (план запросов проверяется в tests/test_db_schema.py)
+CHANNELS_BY_CITY_QUERY = '''
+    SELECT c.*, ct.name as city_name 
+    FROM channels c
+    LEFT JOIN cities ct ON c.city_id = ct.id
+    WHERE c.city_id = ? AND c.is_active = 1
+'''
+
+USERS_BY_CITY_QUERY = '''
+    SELECT u.*, c.name as city_name 
+    FROM users u
+    LEFT JOIN cities c ON u.city_id = c.id
+    WHERE u.city_id = ?
+'''
+
+class Catalog:
+    """Снимок справочников одной версии (не изменяется после создания)"""
+    
+    def __init__(self, version, cities, channels, keywords):
+        self.version = version
+        self.cities = cities
+        self.channels = channels  # Только активные каналы
+        self.keywords = keywords  # Только активные ключевые слова
+        
+    def get_city(self, city_id):
+        """Возвращает город по ID или None"""
+        return next((city for city in self.cities if city['id'] == city_id), None)
+        
+    def get_channels_by_city(self, city_id=None):
+        """Активные каналы города или все активные каналы"""
+        if city_id is None:
+            return self.channels
+        return [channel for channel in self.channels if channel['city_id'] == city_id]
+
 class DatabaseManager:
-    def __init__(self, db_file='telegram_parser.db'):
+    def __init__(self, db_file='telegram_parser.db', message_filter_capacity=100000,
+                 message_filter_fp_rate=0.01, synchronous='NORMAL',
+                 processed_flush_every=0, processed_flush_interval=1.0,
+                 processed_retention_days=30, processed_bucket_days=0):
         self.db_file = db_file
+        self.synchronous = synchronous
+        
+        # Долгоживущие соединения: по одному на поток (бот и монитор работают
+        # в разных потоках, а sqlite3.Connection нельзя делить между потоками)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        # Фильтр Блума перед processed_messages: отвечает "точно не видели"
+        # без обращения к диску. Строится лениво при первой проверке.
+        # Фильтр видит только записи, добавленные через этот экземпляр,
+        # поэтому писать в processed_messages должен один DatabaseManager.
+        self.message_filter_capacity = message_filter_capacity
+        self.message_filter_fp_rate = message_filter_fp_rate
+        self._message_filter = None
+        self._filter_lock = threading.RLock()
+        self._filter_lookups = 0
+        self._filter_negatives = 0
+        self._filter_false_positives = 0
+        
+        # Отложенная запись processed_messages (0 - писать сразу).
+        # Отметки копятся в памяти и записываются одной транзакцией, когда их
+        # набирается processed_flush_every или старшей исполняется
+        # processed_flush_interval секунд. При сбое процесса теряется не больше
+        # этого объема: такие сообщения будут обработаны повторно.
+        self.processed_flush_every = processed_flush_every
+        self.processed_flush_interval = processed_flush_interval
+        self._pending_messages = {}
+        self._pending_since = None
+        self._flusher = None
+        self._flusher_stop = threading.Event()
+        if processed_flush_every:
+            atexit.register(self.flush_processed_messages)
+            
+        # Срок хранения отметок (0 - хранить всегда). С processed_bucket_days
+        # новые отметки пишутся в таблицы-периоды по столько дней, и
+        # устаревший период удаляется целиком, а не построчно
+        self.processed_retention_days = processed_retention_days
+        self.processed_bucket_days = processed_bucket_days
+        self._bucket_tables = None
+        
+        # Кэш справочников, общий для бота и монитора. Любая запись в города,
+        # каналы или ключевые слова повышает catalog_version, и следующий
+        # get_catalog() перечитывает их из базы
+        self.catalog_version = 0
+        self._catalog = None
+        self._catalog_lock = threading.Lock()
+        # Версия справочников в базе (catalog_state), из которой собран кэш:
+        # по ней видны изменения, сделанные другими процессами
+        self._stored_catalog_version = None
+        
+    @classmethod
+    def from_env(cls, db_file='telegram_parser.db'):
+        """Создает менеджер с настройками отметок из переменных окружения"""
+        return cls(
+            db_file,
+            processed_flush_every=int(os.getenv('PROCESSED_FLUSH_EVERY', '100')),
+            processed_flush_interval=int(os.getenv('PROCESSED_FLUSH_INTERVAL_MS', '1000')) / 1000,
+            processed_retention_days=int(os.getenv('PROCESSED_RETENTION_DAYS', '30')),
+            processed_bucket_days=int(os.getenv('PROCESSED_BUCKET_DAYS', '0'))
+        )
         
     def _get_connection(self):
-        """Получает соединение с базой данных"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row  # Чтобы получать результаты в виде словарей
+        """Получает соединение текущего потока, открывая его при первом обращении"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_file,
+                timeout=30,
+                cached_statements=256,  # Кэш подготовленных выражений
+                check_same_thread=False  # Только чтобы close() работал из любого потока
+            )
+            conn.row_factory = sqlite3.Row  # Чтобы получать результаты в виде словарей
+            # WAL: читатели не блокируют писателя, а коммит не требует fsync
+            # основного файла; NORMAL синхронизирует журнал только на checkpoint
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
         return conn
         
+    def close(self):
+        """Записывает отложенные отметки и закрывает все соединения (вызывать при остановке)"""
+        self._stop_flusher()
+        self.flush_processed_messages()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+        
+    def _fetch_all(self, query, params=()):
+        """Выполняет запрос и возвращает строки в виде словарей"""
+        return [dict(row) for row in self._get_connection().execute(query, params)]
+        
+    def _write(self, query, params=()):
+        """Выполняет изменяющий запрос в транзакции и возвращает курсор"""
+        conn = self._get_connection()
+        if getattr(self._local, 'in_batch', False):
+            # Коммит сделает batch() после всех записей
+            return conn.execute(query, params)
+        with conn:
+            return conn.execute(query, params)
+        
+    @contextmanager
+    def batch(self):
+        """Объединяет записи текущего потока в одну транзакцию"""
+        conn = self._get_connection()
+        if getattr(self._local, 'in_batch', False):
+            yield conn
+            return
+            
+        self._local.in_batch = True
+        self._local.catalog_dirty = False
+        # Отметки, записанные внутри пачки: из памяти и в фильтр - только после коммита
+        self._local.batch_marks = {}
+        committed = False
+        try:
+            with conn:
+                yield conn
+            committed = True
+        finally:
+            self._local.in_batch = False
+            marks, self._local.batch_marks = self._local.batch_marks, {}
+            if committed and marks:
+                self._marks_committed(marks)
+            if getattr(self._local, 'catalog_dirty', False):
+                self._catalog_changed()
+        
+    def _write_catalog(self, query, params=()):
+        """Изменяет справочник (города, каналы, ключевые слова) и сбрасывает их кэш"""
+        cursor = self._write(query, params)
+        self._catalog_changed()
+        return cursor
+        
+    def _catalog_changed(self):
+        """Повышает версию справочников после коммита изменения"""
+        if getattr(self._local, 'in_batch', False):
+            # Версия повысится после коммита пачки, иначе другой поток мог бы
+            # закэшировать еще не зафиксированные данные под новой версией
+            self._local.catalog_dirty = True
+            return
+        with self._catalog_lock:
+            self.catalog_version += 1
+            self._catalog = None
+            
+    def get_catalog(self):
+        """
+        Возвращает снимок справочников текущей версии.
+        
+        База читается только после изменения справочников, все остальные
+        обращения отдают готовый снимок из памяти.
+        """
+        catalog = self._catalog
+        if catalog is not None and catalog.version == self.catalog_version:
+            return catalog
+            
+        with self._catalog_lock:
+            version = self.catalog_version
+            if self._catalog is not None and self._catalog.version == version:
+                return self._catalog
+            # Версия читается до справочников: изменение, сделанное между
+            # чтениями, вызовет лишнюю перезагрузку, но не будет пропущено
+            self._stored_catalog_version = self._read_stored_catalog_version()
+            catalog = Catalog(
+                version,
+                cities=self.get_all_cities(),
+                channels=self.get_channels_by_city(),
+                keywords=self.get_all_keywords()
+            )
+            self._catalog = catalog
+        logger.info(f"Справочники загружены, версия {version}")
+        return catalog
+        
+    def _read_stored_catalog_version(self):
+        """Версия справочников из базы (None, если миграция еще не применена)"""
+        try:
+            row = self._get_connection().execute(
+                'SELECT version FROM catalog_state WHERE id = 1'
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row['version'] if row else None
+        
+    def sync_catalog_version(self):
+        """
+        Сверяет кэш справочников с версией в базе и возвращает catalog_version.
+        
+        Справочники может изменить другой процесс (бот, когда воркеры
+        мониторинга запущены отдельно), а catalog_version повышается только
+        записями через этот экземпляр. Если версия в базе изменилась, кэш
+        сбрасывается и catalog_version повышается.
+        """
+        stored = self._read_stored_catalog_version()
+        with self._catalog_lock:
+            if stored != self._stored_catalog_version:
+                self._stored_catalog_version = stored
+                self.catalog_version += 1
+                self._catalog = None
+            return self.catalog_version
+        
     # Методы для работы с городами
     def get_all_cities(self):
         """Получает список всех городов"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM cities')
-        cities = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return cities
+        return self._fetch_all('SELECT * FROM cities')
         
     def add_city(self, name):
         """Добавляет новый город"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute('INSERT INTO cities (name) VALUES (?)', (name,))
-            conn.commit()
-            city_id = cursor.lastrowid
-            conn.close()
-            return city_id
+            return self._write_catalog('INSERT INTO cities (name) VALUES (?)', (name,)).lastrowid
         except sqlite3.IntegrityError:
-            conn.close()
             return None
             
     def delete_city(self, city_id):
         """Удаляет город"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM cities WHERE id = ?', (city_id,))
-        conn.commit()
-        conn.close()
+        self._write_catalog('DELETE FROM cities WHERE id = ?', (city_id,))
         
     # Методы для работы с каналами
     def get_channels_by_city(self, city_id=None):
         """Получает каналы для указанного города или все каналы"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
         if city_id is not None:
-            cursor.execute('''
-                SELECT c.*, ct.name as city_name 
-                FROM channels c
-                LEFT JOIN cities ct ON c.city_id = ct.id
-                WHERE c.city_id = ? AND c.is_active = 1
-            ''', (city_id,))
-        else:
-            cursor.execute('''
-                SELECT c.*, ct.name as city_name 
-                FROM channels c
-                LEFT JOIN cities ct ON c.city_id = ct.id
-                WHERE c.is_active = 1
-            ''')
-            
-        channels = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return channels
+            return self._fetch_all(CHANNELS_BY_CITY_QUERY, (city_id,))
+        
+        return self._fetch_all('''
+            SELECT c.*, ct.name as city_name 
+            FROM channels c
+            LEFT JOIN cities ct ON c.city_id = ct.id
+            WHERE c.is_active = 1
+        ''')
         
     def add_channel(self, channel_id, channel_name, channel_username=None, city_id=None):
         """Добавляет новый канал в базу"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute('''
+            return self._write_catalog('''
                 INSERT INTO channels (channel_id, channel_name, channel_username, city_id) 
                 VALUES (?, ?, ?, ?)
-            ''', (channel_id, channel_name, channel_username, city_id))
-            conn.commit()
-            channel_id = cursor.lastrowid
-            conn.close()
-            return channel_id
+            ''', (channel_id, channel_name, channel_username, city_id)).lastrowid
         except sqlite3.IntegrityError:
-            conn.close()
             return None
             
     def update_channel(self, channel_id, is_active, city_id=None):
         """Обновляет данные канала"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
         if city_id is not None:
-            cursor.execute('''
+            self._write_catalog('''
                 UPDATE channels SET is_active = ?, city_id = ? 
                 WHERE channel_id = ?
             ''', (is_active, city_id, channel_id))
         else:
-            cursor.execute('''
+            self._write_catalog('''
                 UPDATE channels SET is_active = ? WHERE channel_id = ?
             ''', (is_active, channel_id))
-        conn.commit()
-        conn.close()
         
     def delete_channel(self, channel_id):
         """Удаляет канал из базы"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM channels WHERE channel_id = ?', (channel_id,))
-        conn.commit()
-        conn.close()
+        self._write_catalog('DELETE FROM channels WHERE channel_id = ?', (channel_id,))
         
     # Методы для работы с ключевыми словами
     def get_all_keywords(self, active_only=True):
         """Получает список всех ключевых слов"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
         if active_only:
-            cursor.execute('SELECT * FROM keywords WHERE is_active = 1')
-        else:
-            cursor.execute('SELECT * FROM keywords')
-            
-        keywords = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return keywords
+            return self._fetch_all('SELECT * FROM keywords WHERE is_active = 1')
+        return self._fetch_all('SELECT * FROM keywords')
         
     def add_keyword(self, word):
         """Добавляет новое ключевое слово"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute('INSERT INTO keywords (word) VALUES (?)', (word,))
-            conn.commit()
-            keyword_id = cursor.lastrowid
-            conn.close()
-            return keyword_id
+            return self._write_catalog('INSERT INTO keywords (word) VALUES (?)', (word,)).lastrowid
         except sqlite3.IntegrityError:
-            conn.close()
             return None
             
     def update_keyword(self, keyword_id, is_active):
         """Обновляет статус ключевого слова"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE keywords SET is_active = ? WHERE id = ?', 
-                      (is_active, keyword_id))
-        conn.commit()
-        conn.close()
+        self._write_catalog('UPDATE keywords SET is_active = ? WHERE id = ?', 
+                            (is_active, keyword_id))
         
     def delete_keyword(self, keyword_id):
         """Удаляет ключевое слово"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM keywords WHERE id = ?', (keyword_id,))
-        conn.commit()
-        conn.close()
+        self._write_catalog('DELETE FROM keywords WHERE id = ?', (keyword_id,))
         
     # Методы для работы с историей сообщений
+    @staticmethod
+    def _message_key(message_id, channel_id):
+        """Ключ сообщения в фильтре Блума"""
+        return f"{channel_id}:{message_id}"
+        
+    def _build_message_filter(self):
+        """Строит фильтр Блума по таблице processed_messages"""
+        conn = self._get_connection()
+        try:
+            tables = self._processed_tables()
+            total = sum(conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                        for table in tables)
+            message_filter = BloomFilter(
+                max(self.message_filter_capacity, total * 2),
+                self.message_filter_fp_rate
+            )
+            for table in tables:
+                for row in conn.execute(f'SELECT message_id, channel_id FROM {table}'):
+                    message_filter.add(self._message_key(row['message_id'], row['channel_id']))
+        except sqlite3.OperationalError as e:
+            # Таблица еще не создана
+            logger.warning(f"Не удалось построить фильтр сообщений: {e}")
+            message_filter = BloomFilter(self.message_filter_capacity, self.message_filter_fp_rate)
+        
+        logger.info(f"Фильтр сообщений построен: {message_filter.count} записей, "
+                    f"{message_filter.memory_bytes} байт")
+        return message_filter
+        
+    def _get_message_filter(self):
+        """Возвращает фильтр Блума, перестраивая его при переполнении"""
+        with self._filter_lock:
+            if self._message_filter is None or self._message_filter.is_full:
+                self._message_filter = self._build_message_filter()
+            return self._message_filter
+        
     def message_exists(self, message_id, channel_id):
         """Проверяет, существует ли сообщение в истории"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM processed_messages 
-            WHERE message_id = ? AND channel_id = ?
-        ''', (message_id, channel_id))
-        exists = cursor.fetchone() is not None
-        conn.close()
+        # Отметка еще не записана, но уже считается обработанной
+        if self._message_key(message_id, channel_id) in self._pending_messages:
+            return True
+            
+        # Если фильтр говорит "нет", сообщения точно нет в базе
+        self._filter_lookups += 1
+        if self._message_key(message_id, channel_id) not in self._get_message_filter():
+            self._filter_negatives += 1
+            return False
+            
+        exists = self._stored_message_exists(message_id, channel_id)
+        
+        if not exists:
+            self._filter_false_positives += 1
         return exists
         
     def add_processed_message(self, message_id, channel_id):
         """Добавляет сообщение в историю обработанных"""
+        if self.processed_flush_every:
+            return self._buffer_processed_message(message_id, channel_id)
+            
+        # Вставка и пополнение фильтра под одной блокировкой, чтобы фильтр,
+        # перестраиваемый в другом потоке, не пропустил запись
+        with self._filter_lock:
+            message_filter = self._get_message_filter()
+            # UNIQUE действует только внутри одной таблицы-периода
+            if self.processed_bucket_days and self.message_exists(message_id, channel_id):
+                return False
+            try:
+                self._write(f'''
+                    INSERT INTO {self._processed_table()} (message_id, channel_id) 
+                    VALUES (?, ?)
+                ''', (message_id, channel_id))
+            except sqlite3.IntegrityError:
+                return False
+            
+            key = self._message_key(message_id, channel_id)
+            message_filter.add(key)
+            if getattr(self._local, 'in_batch', False):
+                # Фильтр, перестроенный до коммита пачки, не увидит эту строку:
+                # ключ добавится в него еще раз после коммита
+                self._local.batch_marks[key] = None
+        return True
+            
+    def _processed_tables(self):
+        """Таблицы с отметками: периоды от новых к старым, затем processed_messages"""
+        if self._bucket_tables is None:
+            rows = self._get_connection().execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+                (PROCESSED_BUCKET_GLOB,)
+            )
+            self._bucket_tables = sorted((row['name'] for row in rows), reverse=True)
+        return self._bucket_tables + ['processed_messages']
+        
+    def _processed_table(self):
+        """Таблица для новых отметок, при необходимости создает текущий период"""
+        if not self.processed_bucket_days:
+            return 'processed_messages'
+            
+        day = (datetime.now(timezone.utc).date() - datetime(1970, 1, 1).date()).days
+        start = datetime(1970, 1, 1) + timedelta(days=day - day % self.processed_bucket_days)
+        table = f"{PROCESSED_BUCKET_PREFIX}{start:%Y%m%d}"
+        with self._filter_lock:
+            if table not in self._processed_tables():
+                conn = self._get_connection()
+                for statement in processed_bucket_statements(table):
+                    conn.execute(statement)
+                self._bucket_tables = sorted(self._bucket_tables + [table], reverse=True)
+                logger.info(f"Создана таблица отметок {table}")
+        return table
+        
+    def _stored_message_exists(self, message_id, channel_id):
+        """Ищет отметку во всех таблицах, начиная с самого нового периода"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT INTO processed_messages (message_id, channel_id) 
+        for table in self._processed_tables():
+            try:
+                row = conn.execute(f'''
+                    SELECT 1 FROM {table} 
+                    WHERE message_id = ? AND channel_id = ?
+                ''', (message_id, channel_id)).fetchone()
+            except sqlite3.OperationalError:
+                # Период удален очисткой в другом потоке
+                continue
+            if row is not None:
+                return True
+        return False
+        
+    def purge_processed_messages(self, retention_days=None):
+        """
+        Удаляет отметки старше срока хранения, возвращает число удаленных строк.
+        
+        Таблица-период удаляется целиком, если следующий за ней период
+        начался раньше границы хранения; в остальных таблицах строки
+        удаляются по индексу processed_at.
+        """
+        retention_days = self.processed_retention_days if retention_days is None else retention_days
+        if not retention_days:
+            return 0
+            
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        cutoff_text = cutoff.strftime('%Y-%m-%d %H:%M:%S')
+        cutoff_table = f"{PROCESSED_BUCKET_PREFIX}{cutoff:%Y%m%d}"
+        
+        removed = 0
+        with self._filter_lock:
+            conn = self._get_connection()
+            buckets = sorted(self._processed_tables()[:-1])
+            with self.batch():
+                for table, next_table in zip(buckets, buckets[1:] + [None]):
+                    if next_table is not None and next_table <= cutoff_table:
+                        removed += conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                        conn.execute(f'DROP TABLE {table}')
+                        self._bucket_tables.remove(table)
+                        logger.info(f"Удалена таблица отметок {table}")
+                    else:
+                        removed += self._write(
+                            f'DELETE FROM {table} WHERE processed_at < ?', (cutoff_text,)
+                        ).rowcount
+                        
+                removed += self._write(
+                    'DELETE FROM processed_messages WHERE processed_at < ?', (cutoff_text,)
+                ).rowcount
+                
+                # Закрепления пересылок нужны столько же, сколько отметки
+                claims = self._write(
+                    'DELETE FROM forward_claims WHERE claimed_at < ?', (cutoff_text,)
+                ).rowcount
+                
+            if removed:
+                # Удаленные ключи остались бы в фильтре ложными срабатываниями
+                self._message_filter = None
+                
+        logger.info(f"Удалено устаревших отметок: {removed}, закреплений пересылок: {claims}")
+        return removed
+        
+    def _buffer_processed_message(self, message_id, channel_id):
+        """Откладывает запись отметки до ближайшей групповой записи"""
+        key = self._message_key(message_id, channel_id)
+        with self._filter_lock:
+            if self.message_exists(message_id, channel_id):
+                return False
+                
+            self._pending_messages[key] = (message_id, channel_id)
+            self._get_message_filter().add(key)
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+                self._start_flusher()
+            if len(self._unflushed_messages()) >= self.processed_flush_every:
+                self.flush_processed_messages()
+        return True
+        
+    def _unflushed_messages(self):
+        """Отложенные отметки, еще не записанные в открытую пачку этого потока"""
+        marks = getattr(self._local, 'batch_marks', None)
+        if not marks:
+            return self._pending_messages
+        return {key: row for key, row in self._pending_messages.items() if key not in marks}
+        
+    def _marks_committed(self, marks):
+        """
+        Учитывает зафиксированные отметки: добавляет ключи в фильтр и убирает
+        записанные отложенные отметки из памяти.
+        
+        Фильтр мог быть перестроен между вставкой и коммитом и не содержать
+        этих ключей, поэтому они добавляются заново.
+        """
+        with self._filter_lock:
+            message_filter = self._get_message_filter()
+            for key, row in marks.items():
+                message_filter.add(key)
+                if row is not None and self._pending_messages.get(key) == row:
+                    del self._pending_messages[key]
+            if not self._pending_messages:
+                self._pending_since = None
+        
+    def flush_processed_messages(self):
+        """Записывает отложенные отметки одной транзакцией, возвращает их число"""
+        with self._filter_lock:
+            marks = dict(self._unflushed_messages())
+            if not marks:
+                return 0
+                
+            # Отметки убираются из памяти только после коммита, поэтому
+            # проверка дубликатов в других потоках не видит "дыры"
+            table = self._processed_table()
+            conn = self._get_connection()
+            query = f'''
+                INSERT OR IGNORE INTO {table} (message_id, channel_id) 
                 VALUES (?, ?)
-            ''', (message_id, channel_id))
-            conn.commit()
-            conn.close()
-            return True
-        except sqlite3.IntegrityError:
-            conn.close()
-            return False
+            '''
+            if getattr(self._local, 'in_batch', False):
+                # Внутри batch() или пачки писателя: отметки фиксируются вместе
+                # с ней и остаются в памяти до ее коммита, а при откате пачки
+                # будут записаны следующей записью
+                conn.executemany(query, marks.values())
+                self._local.batch_marks.update(marks)
+                return len(marks)
+            with conn:
+                conn.executemany(query, marks.values())
+            self._marks_committed(marks)
+        logger.debug(f"Записано отложенных отметок: {len(marks)}")
+        return len(marks)
+        
+    def _start_flusher(self):
+        """Запускает поток, записывающий отметки по таймеру"""
+        if not self.processed_flush_interval or (self._flusher and self._flusher.is_alive()):
+            return
+        self._flusher_stop.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name='db-flusher', daemon=True)
+        self._flusher.start()
+        
+    def _stop_flusher(self):
+        """Останавливает поток записи по таймеру"""
+        if self._flusher and self._flusher.is_alive():
+            self._flusher_stop.set()
+            self._flusher.join()
+        self._flusher = None
+        
+    def _flush_loop(self):
+        """Записывает отметки, как только старшая из них ждет processed_flush_interval"""
+        while True:
+            since = self._pending_since
+            timeout = self.processed_flush_interval
+            if since is not None:
+                timeout = max(0.0, since + self.processed_flush_interval - time.monotonic())
+            if self._flusher_stop.wait(timeout):
+                return
+            if self._pending_since is None or \
+                    time.monotonic() - self._pending_since < self.processed_flush_interval:
+                continue
+            try:
+                self.flush_processed_messages()
+            except sqlite3.Error as e:
+                # Отметки остаются в памяти до следующей попытки
+                logger.error(f"Ошибка записи отложенных отметок: {e}")
             
+    def get_message_filter_stats(self):
+        """Статистика фильтра Блума: память, расчетная и наблюдаемая доля ложных срабатываний"""
+        stats = self._get_message_filter().stats()
+        # Ложные срабатывания считаются среди сообщений, которых не было в базе
+        absent = self._filter_negatives + self._filter_false_positives
+        stats.update({
+            'lookups': self._filter_lookups,
+            'skipped_db_queries': self._filter_negatives,
+            'false_positives': self._filter_false_positives,
+            'observed_fp_rate': self._filter_false_positives / absent if absent else 0.0,
+        })
+        return stats
+        
+    # Методы для нескольких воркеров мониторинга
+    @contextmanager
+    def _immediate(self):
+        """
+        Транзакция, сразу захватывающая блокировку записи.
+
+        Чтение и запись внутри нее не пересекаются с другими процессами,
+        поэтому два воркера не могут одновременно занять один канал.
+        """
+        conn = self._get_connection()
+        if conn.in_transaction:
+            # Уже внутри начатой записи batch(), блокировка у нас
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def claim_channels(self, worker_id, channel_ids, ttl):
+        """
+        Продлевает аренду каналов воркера и возвращает его долю каналов.
+
+        Вызывается каждым воркером как пульс. Воркеры и аренды, которые не
+        продлевались ttl секунд, считаются брошенными: их каналы достаются
+        живым воркерам. Каждый воркер держит не больше ceil(каналов / воркеров)
+        каналов, лишние отпускает, поэтому новый воркер получает свою долю
+        со следующим пульсом остальных.
+        """
+        channel_ids = sorted({str(channel_id) for channel_id in channel_ids})
+        now = time.time()
+        with self._immediate() as conn:
+            conn.execute('DELETE FROM monitor_workers WHERE expires_at < ?', (now,))
+            conn.execute('DELETE FROM channel_leases WHERE expires_at < ?', (now,))
+            conn.execute('INSERT OR REPLACE INTO monitor_workers (worker_id, expires_at) VALUES (?, ?)',
+                         (worker_id, now + ttl))
+            workers = conn.execute('SELECT COUNT(*) FROM monitor_workers').fetchone()[0]
+            share = -(-len(channel_ids) // workers)
+
+            leases = {row['channel_id']: row['worker_id']
+                      for row in conn.execute('SELECT channel_id, worker_id FROM channel_leases')}
+            wanted = set(channel_ids)
+            # Свои каналы, которых больше нет в справочнике, и сверх доли отпускаем
+            mine = [channel_id for channel_id in channel_ids if leases.get(channel_id) == worker_id]
+            released = [channel_id for channel_id, owner in leases.items()
+                        if owner == worker_id and channel_id not in wanted]
+            released += mine[share:]
+            mine = mine[:share]
+            free = [channel_id for channel_id in channel_ids if channel_id not in leases]
+            mine += free[:max(0, share - len(mine))]
+
+            conn.executemany('DELETE FROM channel_leases WHERE channel_id = ?',
+                             [(channel_id,) for channel_id in released])
+            conn.executemany('''
+                INSERT OR REPLACE INTO channel_leases (channel_id, worker_id, expires_at)
+                VALUES (?, ?, ?)
+            ''', [(channel_id, worker_id, now + ttl) for channel_id in mine])
+        return set(mine)
+
+    def release_worker(self, worker_id):
+        """Снимает воркера и его аренды (при остановке), каналы сразу свободны для других"""
+        with self._immediate() as conn:
+            conn.execute('DELETE FROM channel_leases WHERE worker_id = ?', (worker_id,))
+            conn.execute('DELETE FROM monitor_workers WHERE worker_id = ?', (worker_id,))
+
+    def claim_forward(self, message_id, channel_id, worker_id):
+        """
+        Закрепляет пересылку поста за воркером.
+
+        Возвращает True, если пост достался этому воркеру (или уже был
+        за ним), и False, если его пересылает или переслал другой воркер.
+        Фильтр Блума каждого процесса не видит отметок других процессов,
+        поэтому решающая проверка - этот журнал в общей базе.
+        """
+        inserted = self._write('''
+            INSERT OR IGNORE INTO forward_claims (message_id, channel_id, worker_id)
+            VALUES (?, ?, ?)
+        ''', (message_id, channel_id, worker_id)).rowcount
+        if inserted:
+            return True
+        row = self._get_connection().execute('''
+            SELECT worker_id FROM forward_claims WHERE message_id = ? AND channel_id = ?
+        ''', (message_id, channel_id)).fetchone()
+        return row is not None and row['worker_id'] == worker_id
+
+    def release_forward(self, message_id, channel_id, worker_id):
+        """Снимает закрепление поста, если переслать его не удалось"""
+        self._write('''
+            DELETE FROM forward_claims WHERE message_id = ? AND channel_id = ? AND worker_id = ?
+        ''', (message_id, channel_id, worker_id))
+
     # Методы для работы с пользователями
     def get_user(self, user_id):
         """Получает информацию о пользователе"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        user = self._get_connection().execute('''
             SELECT u.*, c.name as city_name 
             FROM users u
             LEFT JOIN cities c ON u.city_id = c.id
             WHERE u.user_id = ?
-        ''', (user_id,))
-        user = cursor.fetchone()
-        conn.close()
+        ''', (user_id,)).fetchone()
         if user:
             return dict(user)
         return None
         
     def add_user(self, user_id, city_id=None, is_admin=0):
         """Добавляет нового пользователя"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute('''
+            self._write('''
                 INSERT INTO users (user_id, city_id, is_admin) 
                 VALUES (?, ?, ?)
             ''', (user_id, city_id, is_admin))
-            conn.commit()
-            conn.close()
             return True
         except sqlite3.IntegrityError:
-            conn.close()
             return False
             
     def update_user_city(self, user_id, city_id):
         """Обновляет город пользователя"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE users SET city_id = ? WHERE user_id = ?', 
-                      (city_id, user_id))
-        conn.commit()
-        conn.close()
+        self._write('UPDATE users SET city_id = ? WHERE user_id = ?', 
+                    (city_id, user_id))
         
     def set_admin_status(self, user_id, is_admin):
         """Устанавливает статус администратора"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE users SET is_admin = ? WHERE user_id = ?', 
-                      (is_admin, user_id))
-        conn.commit()
-        conn.close()
+        self._write('UPDATE users SET is_admin = ? WHERE user_id = ?', 
+                    (is_admin, user_id))
         
     def get_all_users(self, city_id=None):
         """Получает список всех пользователей"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
         if city_id:
-            cursor.execute('''
-                SELECT u.*, c.name as city_name 
-                FROM users u
-                LEFT JOIN cities c ON u.city_id = c.id
-                WHERE u.city_id = ?
-            ''', (city_id,))
-        else:
-            cursor.execute('''
-                SELECT u.*, c.name as city_name 
-                FROM users u
-                LEFT JOIN cities c ON u.city_id = c.id
-            ''')
+            return self._fetch_all(USERS_BY_CITY_QUERY, (city_id,))
+        
+        return self._fetch_all('''
+            SELECT u.*, c.name as city_name 
+            FROM users u
+            LEFT JOIN cities c ON u.city_id = c.id
+        ''')
+
+
+class AsyncDatabaseManager:
+    """
+    Неблокирующий доступ к DatabaseManager из асинхронного кода.
+    
+    Чтения выполняются в отдельном потоке и не останавливают цикл событий.
+    Записи ставятся в очередь выделенного потока-писателя, который забирает
+    все накопившиеся записи и выполняет их одной транзакцией.
+    """
+    
+    def __init__(self, db, max_batch=500):
+        self.db = db
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        
+        self._queue = queue.Queue()
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-reader')
+        self._writer = threading.Thread(target=self._write_loop, name='db-writer', daemon=True)
+        self._writer.start()
+        
+    async def read(self, func, *args):
+        """Выполняет читающий метод DatabaseManager в потоке чтения"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader, functools.partial(func, *args))
+        
+    def write(self, func, *args):
+        """
+        Ставит изменяющий метод DatabaseManager в очередь писателя.
+        
+        Возвращает future с результатом метода: его можно дождаться,
+        а можно не ждать, если результат не нужен.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put((func, args, future))
+        return future
+        
+    async def flush(self):
+        """Дожидается записи всего, что было поставлено в очередь раньше"""
+        await self.write(lambda: None)
+        
+    async def close(self):
+        """Записывает очередь и останавливает потоки"""
+        self._queue.put(None)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.join)
+        await loop.run_in_executor(self._reader, self.db.flush_processed_messages)
+        self._reader.shutdown(wait=True)
+        
+    def _write_loop(self):
+        """Цикл потока-писателя"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+                
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                
+            self._run_batch(batch)
             
-        users = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return users 
\ No newline at end of file
+    def _run_batch(self, batch):
+        """Выполняет пачку записей одной транзакцией и передает результаты"""
+        results = []
+        try:
+            with self.db.batch():
+                for func, args, future in batch:
+                    try:
+                        results.append((future, func(*args), None))
+                    except Exception as e:
+                        results.append((future, None, e))
+        except Exception as e:
+            # Транзакция не зафиксирована: ошибка для всей пачки
+            logger.error(f"Ошибка записи пачки из {len(batch)} операций: {e}")
+            results = [(future, None, e) for _, _, future in batch]
+            
+        self.batches += 1
+        self.writes += len(batch)
+        for future, result, error in results:
+            try:
+                future.get_loop().call_soon_threadsafe(_resolve_future, future, result, error)
+            except RuntimeError:
+                # Цикл событий уже закрыт, результат никто не ждет
+                pass
+                
+    # Методы, которые использует монитор
+    async def message_exists(self, message_id, channel_id):
+        return await self.read(self.db.message_exists, message_id, channel_id)
+        
+    async def add_processed_message(self, message_id, channel_id):
+        return await self.write(self.db.add_processed_message, message_id, channel_id)
+        
+    async def get_channels_by_city(self, city_id=None):
+        return await self.read(self.db.get_channels_by_city, city_id)
+        
+    async def get_all_keywords(self, active_only=True):
+        return await self.read(self.db.get_all_keywords, active_only)
+        
+    async def get_catalog(self):
+        return await self.read(self.db.get_catalog)
+        
+    async def sync_catalog_version(self):
+        return await self.read(self.db.sync_catalog_version)
+        
+    # Методы, которые использует бот администрирования
+    async def get_user(self, user_id):
+        return await self.read(self.db.get_user, user_id)
+        
+    async def add_user(self, user_id, city_id=None, is_admin=0):
+        return await self.write(self.db.add_user, user_id, city_id, is_admin)
+        
+    async def set_admin_status(self, user_id, is_admin):
+        return await self.write(self.db.set_admin_status, user_id, is_admin)
+        
+    async def update_user_city(self, user_id, city_id):
+        return await self.write(self.db.update_user_city, user_id, city_id)
+        
+    async def add_city(self, name):
+        return await self.write(self.db.add_city, name)
+        
+    async def add_channel(self, channel_id, channel_name, channel_username=None, city_id=None):
+        return await self.write(self.db.add_channel, channel_id, channel_name, channel_username, city_id)
+        
+    async def delete_channel(self, channel_id):
+        return await self.write(self.db.delete_channel, channel_id)
+        
+    async def add_keyword(self, word):
+        return await self.write(self.db.add_keyword, word)
+        
+    async def delete_keyword(self, keyword_id):
+        return await self.write(self.db.delete_keyword, keyword_id)
+        
+    async def claim_channels(self, worker_id, channel_ids, ttl):
+        return await self.write(self.db.claim_channels, worker_id, channel_ids, ttl)
+        
+    async def release_worker(self, worker_id):
+        return await self.write(self.db.release_worker, worker_id)
+        
+    async def claim_forward(self, message_id, channel_id, worker_id):
+        return await self.write(self.db.claim_forward, message_id, channel_id, worker_id)
+        
+    async def release_forward(self, message_id, channel_id, worker_id):
+        return await self.write(self.db.release_forward, message_id, channel_id, worker_id)
+
+
+def _resolve_future(future, result, error):
+    """Передает результат записи в future (в потоке цикла событий)"""
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -1,74 +1,259 @@
 import sqlite3
 import os
 
-def create_database():
-    """Создает базу данных, если она не существует"""
-    conn = sqlite3.connect('telegram_parser.db')
-    cursor = conn.cursor()
-    
-    # Таблица городов
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS cities (
-        id INTEGER PRIMARY KEY,
-        name TEXT UNIQUE NOT NULL
-    )
-    ''')
-    
-    # Таблица каналов с привязкой к городам
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS channels (
-        id INTEGER PRIMARY KEY,
-        channel_id TEXT NOT NULL,
-        channel_name TEXT NOT NULL,
-        channel_username TEXT,
-        city_id INTEGER,
-        is_active INTEGER DEFAULT 1,
-        FOREIGN KEY (city_id) REFERENCES cities (id),
-        UNIQUE(channel_id)
-    )
-    ''')
-    
-    # Таблица ключевых слов для фильтрации
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS keywords (
-        id INTEGER PRIMARY KEY,
-        word TEXT NOT NULL,
-        is_active INTEGER DEFAULT 1,
-        UNIQUE(word)
-    )
-    ''')
-    
-    # Таблица обработанных сообщений
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS processed_messages (
-        id INTEGER PRIMARY KEY,
-        message_id INTEGER NOT NULL,
-        channel_id TEXT NOT NULL,
-        processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        UNIQUE(message_id, channel_id)
-    )
-    ''')
-    
-    # Таблица пользователей с их городами
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY,
-        user_id INTEGER UNIQUE NOT NULL,
-        city_id INTEGER,
-        is_admin INTEGER DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (city_id) REFERENCES cities (id)
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+# Миграции схемы по порядку. Номер последней примененной миграции хранится
+# в PRAGMA user_version, поэтому каждая выполняется ровно один раз.
+# Новые миграции только добавляются в конец списка, старые не меняются.
+MIGRATIONS = [
+    (1, "Начальная схема", [
+        # Таблица городов
+        '''
+        CREATE TABLE IF NOT EXISTS cities (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+        ''',
+        # Таблица каналов с привязкой к городам
+        '''
+        CREATE TABLE IF NOT EXISTS channels (
+            id INTEGER PRIMARY KEY,
+            channel_id TEXT NOT NULL,
+            channel_name TEXT NOT NULL,
+            channel_username TEXT,
+            city_id INTEGER,
+            is_active INTEGER DEFAULT 1,
+            FOREIGN KEY (city_id) REFERENCES cities (id),
+            UNIQUE(channel_id)
+        )
+        ''',
+        # Таблица ключевых слов для фильтрации
+        '''
+        CREATE TABLE IF NOT EXISTS keywords (
+            id INTEGER PRIMARY KEY,
+            word TEXT NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            UNIQUE(word)
+        )
+        ''',
+        # Таблица обработанных сообщений
+        '''
+        CREATE TABLE IF NOT EXISTS processed_messages (
+            id INTEGER PRIMARY KEY,
+            message_id INTEGER NOT NULL,
+            channel_id TEXT NOT NULL,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(message_id, channel_id)
+        )
+        ''',
+        # Таблица пользователей с их городами
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER UNIQUE NOT NULL,
+            city_id INTEGER,
+            is_admin INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (city_id) REFERENCES cities (id)
+        )
+        ''',
+    ]),
+    (2, "Покрывающие индексы для выборок по городу", [
+        # get_channels_by_city(city_id): поиск по (city_id, is_active), остальные
+        # столбцы канала берутся из индекса без чтения таблицы
+        '''
+        CREATE INDEX IF NOT EXISTS idx_channels_city_active
+        ON channels (city_id, is_active, channel_id, channel_name, channel_username)
+        ''',
+        # get_all_users(city_id)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_users_city
+        ON users (city_id, user_id, is_admin, created_at)
+        ''',
+    ]),
+    (3, "Индекс по времени обработки для удаления старых отметок", [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_processed_messages_processed_at
+        ON processed_messages (processed_at)
+        ''',
+    ]),
+    (4, "Аренда каналов и журнал пересылок для нескольких воркеров мониторинга", [
+        # Живые воркеры: каждый продлевает запись пульсом, пока работает
+        '''
+        CREATE TABLE IF NOT EXISTS monitor_workers (
+            worker_id TEXT PRIMARY KEY,
+            expires_at REAL NOT NULL
+        )
+        ''',
+        # Канал слушает только воркер, держащий аренду; просроченная аренда
+        # (воркер упал) достается другим воркерам
+        '''
+        CREATE TABLE IF NOT EXISTS channel_leases (
+            channel_id TEXT PRIMARY KEY,
+            worker_id TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_channel_leases_worker
+        ON channel_leases (worker_id, channel_id)
+        ''',
+        # Кто пересылает пост: первая запись выигрывает, поэтому при передаче
+        # канала между воркерами пост не пересылается дважды
+        '''
+        CREATE TABLE IF NOT EXISTS forward_claims (
+            message_id INTEGER NOT NULL,
+            channel_id TEXT NOT NULL,
+            worker_id TEXT NOT NULL,
+            claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (message_id, channel_id)
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_forward_claims_claimed_at
+        ON forward_claims (claimed_at)
+        ''',
+    ]),
+    (5, "Версия справочников в базе для воркеров в других процессах", [
+        # Воркеры в других процессах и на других хостах не видят версию
+        # справочников в памяти бота и сверяются с этой строкой
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        '''
+        INSERT OR IGNORE INTO catalog_state (id, version) VALUES (1, 0)
+        ''',
+        # Любое изменение городов, каналов и ключевых слов повышает версию
+        # в той же транзакции, кто бы его ни сделал
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_cities_insert_catalog_version
+        AFTER INSERT ON cities
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_cities_update_catalog_version
+        AFTER UPDATE ON cities
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_cities_delete_catalog_version
+        AFTER DELETE ON cities
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_channels_insert_catalog_version
+        AFTER INSERT ON channels
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_channels_update_catalog_version
+        AFTER UPDATE ON channels
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_channels_delete_catalog_version
+        AFTER DELETE ON channels
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_keywords_insert_catalog_version
+        AFTER INSERT ON keywords
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_keywords_update_catalog_version
+        AFTER UPDATE ON keywords
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_keywords_delete_catalog_version
+        AFTER DELETE ON keywords
+        BEGIN
+            UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Таблицы-периоды для отметок об обработке: processed_messages_ГГГГММДД, где
+# дата - начало периода. Старый период удаляется целиком через DROP TABLE
+PROCESSED_BUCKET_PREFIX = 'processed_messages_'
+PROCESSED_BUCKET_GLOB = PROCESSED_BUCKET_PREFIX + '[0-9]' * 8
+
+def processed_bucket_statements(table):
+    """Возвращает DDL таблицы-периода с той же структурой, что и processed_messages"""
+    return [
+        f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            message_id INTEGER NOT NULL,
+            channel_id TEXT NOT NULL,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(message_id, channel_id)
+        )
+        ''',
+        f'''
+        CREATE INDEX IF NOT EXISTS idx_{table}_processed_at
+        ON {table} (processed_at)
+        ''',
+    ]
+
+def get_schema_version(conn):
+    """Возвращает номер последней примененной миграции"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(db_file='telegram_parser.db'):
+    """Применяет недостающие миграции, каждую в своей транзакции"""
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        version = get_schema_version(conn)
+        for number, description, statements in MIGRATIONS:
+            if number <= version:
+                continue
+            conn.execute('BEGIN')
+            try:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {number}')
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+            version = number
+            print(f"Применена миграция {number}: {description}")
+        return version
+    finally:
+        conn.close()
+
+def create_database(db_file='telegram_parser.db'):
+    """Создает базу данных, если она не существует, и обновляет схему"""
+    migrate(db_file)
     
     print("База данных успешно создана!")
 
-def add_default_data():
+def add_default_data(db_file='telegram_parser.db'):
     """Добавляет начальные данные в базу"""
-    conn = sqlite3.connect('telegram_parser.db')
+    conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
     
     # Добавляем несколько городов
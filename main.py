@@ -13,13 +13,13 @@ from pathlib import Path
 from parser.session_manager import SessionManager
 from parser.message_parser import MessageParser
 from dotenv import load_dotenv
-from telethon import TelegramClient, events
+from telethon import events
 from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
-import threading
 from db_schema import create_database, add_default_data
 from telegram_monitor import TelegramMonitor
+from parser.clients import get_registry
 from aiogram import executor
-from bot import dp
+from bot import dp, db, adb
 
 # Импортируем наши модули
 try:
@@ -261,10 +261,11 @@ target_channel = os.getenv('TARGET_CHANNEL')
 output_channel = os.getenv('OUTPUT_CHANNEL')
 session_string = os.getenv('SESSION_STRING')
 
-# Создание клиента Telegram
-client = TelegramClient('bot_session', api_id, api_hash)
+# Общий реестр клиентов Telegram: все компоненты процесса берут клиентов
+# из него и работают в одном цикле событий
+clients = get_registry(api_id=api_id, api_hash=api_hash, bot_token=bot_token, phone=phone)
 
-async def save_session():
+async def save_session(client):
     """Сохраняет строку сессии в .env файл"""
     session_string = client.session.save()
     with open('.env', 'r') as file:
@@ -280,13 +281,12 @@ async def save_session():
 
 async def main():
     try:
-        # Подключение к Telegram
+        # Подключение к Telegram (клиент бота из общего реестра)
+        client = await clients.bot()
         if session_string:
-            await client.start(bot_token=bot_token)
             logger.info("Бот успешно запущен с сохраненной сессией")
         else:
-            await client.start(phone=phone, bot_token=bot_token)
-            await save_session()
+            await save_session(client)
             logger.info("Бот успешно запущен и сессия сохранена")
 
         # Обработчик новых сообщений
@@ -333,14 +333,27 @@ def setup_database():
 
 async def run_monitor():
     """Запускает мониторинг Telegram-каналов"""
-    monitor = TelegramMonitor()
+    # Бот и монитор делят один DatabaseManager, его потоки чтения и записи
+    # и один реестр клиентов
+    monitor = TelegramMonitor(db=db, clients=clients, adb=adb)
     await monitor.run()
 
-def start_monitor_thread():
-    """Запускает мониторинг в отдельном потоке"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(run_monitor())
+# Задача мониторинга в цикле событий бота администрирования
+monitor_task = None
+
+async def on_startup(dispatcher):
+    """Запускает мониторинг в том же цикле событий, что и бот администрирования"""
+    global monitor_task
+    monitor_task = asyncio.create_task(run_monitor())
+
+async def on_shutdown(dispatcher):
+    """Останавливает мониторинг, отключает клиентов Telegram и потоки базы"""
+    if monitor_task is not None:
+        monitor_task.cancel()
+        await asyncio.gather(monitor_task, return_exceptions=True)
+    await clients.close()
+    # Монитор остановлен, его записи уже в очереди писателя
+    await adb.close()
 
 def check_env_variables():
     """Проверяет наличие необходимых переменных окружения"""
@@ -364,14 +377,9 @@ def main():
     # Настраиваем базу данных
     setup_database()
     
-    # Запускаем мониторинг в отдельном потоке
-    monitor_thread = threading.Thread(target=start_monitor_thread)
-    monitor_thread.daemon = True
-    monitor_thread.start()
-    
-    # Запускаем бота администрирования
+    # Запускаем бота администрирования; мониторинг стартует в его цикле событий
     logger.info("Запуск бота для управления системой")
-    executor.start_polling(dp, skip_updates=True)
+    executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,10 +1,12 @@
 import os
 import logging
-from telethon import TelegramClient, events
+from telethon import events
 from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
 from dotenv import load_dotenv
 import re
 from datetime import datetime
+from parser.album import AlbumAssembler, album_text
+from parser.clients import get_registry
 
 # Настройка логирования
 logging.basicConfig(
@@ -53,27 +55,24 @@ async def forward_messages():
     logger.info(f"Целевой канал: {TARGET_CHANNEL}")
     logger.info(f"Канал назначения: {OUTPUT_CHANNEL}")
 
-    # Создаем клиент для чтения публичного канала
-    client = TelegramClient('user_session', API_ID, API_HASH)
+    # Клиенты для чтения публичного канала и для отправки берутся из общего реестра
+    clients = get_registry(api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN, phone=PHONE)
     
     try:
-        # Авторизация через номер телефона
-        await client.start(phone=PHONE)
+        client = await clients.user()
         logger.info("Клиент успешно запущен")
         
         me = await client.get_me()
         logger.info(f"Авторизован как: {me.first_name}")
 
-        # Создаем отдельный клиент для бота (для отправки в канал)
-        bot = TelegramClient('bot_session', API_ID, API_HASH)
-        await bot.start(bot_token=BOT_TOKEN)
+        # Клиент бота (для отправки в канал)
+        bot = await clients.bot()
         bot_info = await bot.get_me()
         logger.info(f"Бот авторизован как: {bot_info.username}")
 
-        @client.on(events.NewMessage(chats=TARGET_CHANNEL))
-        async def handler(event):
+        async def handle_post(parts):
             try:
-                message = event.message
+                message = parts[0]
                 logger.info(f"Получено новое сообщение из канала {TARGET_CHANNEL}")
                 
                 # Проверяем тип медиа
@@ -85,17 +84,21 @@ async def forward_messages():
                 elif isinstance(message.media, MessageMediaDocument):
                     media_type = "Документ"
 
+                # Подпись альбома хранится в одной из частей
+                text = album_text(parts)
+
                 # Если есть медиа и текст
-                if media_type and message.text:
-                    logger.info(f"Обнаружено сообщение с {media_type}")
+                if media_type and text:
+                    logger.info(f"Обнаружено сообщение с {media_type} (частей: {len(parts)})")
                     # Форматируем текст
-                    formatted_text = format_message(message.text)
+                    formatted_text = format_message(text)
                     
-                    # Отправляем через бота
+                    # Отправляем через бота (альбом - одним запросом)
+                    media = [part.media for part in parts if part.media]
                     await bot.send_message(
                         OUTPUT_CHANNEL,
                         formatted_text,
-                        file=message.media
+                        file=media if len(media) > 1 else media[0]
                     )
                     logger.info(f"Отправлено {media_type} в канал {OUTPUT_CHANNEL}")
                 else:
@@ -104,6 +107,13 @@ async def forward_messages():
             except Exception as e:
                 logger.error(f"Ошибка при обработке сообщения: {str(e)}")
 
+        # Части альбома (общий grouped_id) копятся и обрабатываются одним постом
+        albums = AlbumAssembler(handle_post)
+
+        @client.on(events.NewMessage(chats=TARGET_CHANNEL))
+        async def handler(event):
+            await albums.add(event.message)
+
         logger.info(f"Начинаю мониторинг канала {TARGET_CHANNEL}")
         await client.run_until_disconnected()
     
@@ -111,8 +121,7 @@ async def forward_messages():
         logger.error(f"Критическая ошибка: {str(e)}")
         raise
     finally:
-        await client.disconnect()
-        await bot.disconnect()
+        await clients.close()
 
 if __name__ == '__main__':
     import asyncio
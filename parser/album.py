@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать остальные части альбома после последней пришедшей (секунды).
+# Telegram присылает части одного поста почти одновременно
+ALBUM_WINDOW = 0.5
+
+# Больше частей в одном альбоме Telegram не допускает
+MAX_ALBUM_SIZE = 10
+
+AlbumKey = Tuple[Any, int]
+AlbumHandler = Callable[[List[Any]], Awaitable[None]]
+
+
+def album_key(message: Any) -> Optional[AlbumKey]:
+    """
+    Возвращает ключ альбома, к которому относится сообщение.
+
+    Args:
+        message: Сообщение Telethon
+
+    Returns:
+        Optional[AlbumKey]: (чат, grouped_id) или None для обычного сообщения
+    """
+    grouped_id = getattr(message, 'grouped_id', None)
+    if not grouped_id:
+        return None
+    return (message.chat_id, grouped_id)
+
+
+def album_text(parts: List[Any]) -> str:
+    """
+    Возвращает подпись альбома.
+
+    Подпись хранится только в одной из частей (обычно в первой).
+
+    Args:
+        parts: Части альбома
+
+    Returns:
+        str: Текст первой части с подписью или пустая строка
+    """
+    for part in parts:
+        if part.text:
+            return part.text
+    return ''
+
+
+def group_albums(messages: Iterable[Any]) -> List[List[Any]]:
+    """
+    Собирает части альбомов из уже загруженных сообщений (например, истории).
+
+    Посты идут в порядке первого появления, части внутри альбома - по ID.
+
+    Args:
+        messages: Сообщения Telethon в любом порядке
+
+    Returns:
+        List[List[Any]]: Посты; обычное сообщение - пост из одной части
+    """
+    posts: List[List[Any]] = []
+    albums: Dict[AlbumKey, List[Any]] = {}
+    for message in messages:
+        key = album_key(message)
+        if key is None:
+            posts.append([message])
+        elif key in albums:
+            albums[key].append(message)
+        else:
+            albums[key] = [message]
+            posts.append(albums[key])
+    for parts in albums.values():
+        parts.sort(key=lambda part: part.id)
+    return posts
+
+
+class AlbumAssembler:
+    """
+    Собирает части альбомов из потока новых сообщений.
+
+    Обычное сообщение сразу передается обработчику. Части альбома
+    копятся, пока window секунд не приходит новых частей (или пока их
+    не наберется MAX_ALBUM_SIZE), и передаются обработчику одним списком.
+    Так альбом проверяется и пересылается один раз, а не по частям.
+    """
+
+    def __init__(self, handler: AlbumHandler, window: float = ALBUM_WINDOW):
+        """
+        Args:
+            handler: Обработчик поста; получает части, отсортированные по ID
+            window: Сколько ждать следующую часть альбома (секунды)
+        """
+        self.handler = handler
+        self.window = window
+        self._parts: Dict[AlbumKey, List[Any]] = {}
+        self._timers: Dict[AlbumKey, asyncio.TimerHandle] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    async def add(self, message: Any) -> None:
+        """
+        Принимает новое сообщение.
+
+        Args:
+            message: Сообщение Telethon
+        """
+        key = album_key(message)
+        if key is None:
+            await self._dispatch([message])
+            return
+
+        parts = self._parts.setdefault(key, [])
+        if any(part.id == message.id for part in parts):
+            return
+        parts.append(message)
+
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if len(parts) >= MAX_ALBUM_SIZE:
+            await self._dispatch(self._take(key))
+            return
+        self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._expire, key)
+
+    async def flush(self) -> None:
+        """Сразу передает обработчику все недособранные альбомы и ждет обработки"""
+        for key in list(self._parts):
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            await self._dispatch(self._take(key))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _take(self, key: AlbumKey) -> List[Any]:
+        self._timers.pop(key, None)
+        parts = self._parts.pop(key)
+        parts.sort(key=lambda part: part.id)
+        return parts
+
+    def _expire(self, key: AlbumKey) -> None:
+        """Окно ожидания истекло: альбом обрабатывается в отдельной задаче"""
+        if key not in self._parts:
+            return
+        task = asyncio.ensure_future(self._dispatch(self._take(key)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, parts: List[Any]) -> None:
+        try:
+            await self.handler(parts)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке поста {parts[0].id}: {e}")
@@ -0,0 +1,68 @@
+import hashlib
+import math
+from typing import Dict
+
+
+class BloomFilter:
+    """
+    Фильтр Блума для быстрой проверки "точно не встречалось".
+
+    Отрицательный ответ всегда верен, положительный может быть ложным
+    с вероятностью около fp_rate, пока в фильтре не больше capacity элементов.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        """
+        Args:
+            capacity: Ожидаемое число элементов
+            fp_rate: Допустимая доля ложных срабатываний
+        """
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        """Позиции битов ключа (двойное хеширование одного blake2b)"""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> None:
+        """Добавляет ключ в фильтр"""
+        bits = self._bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def memory_bytes(self) -> int:
+        """Размер битового массива в байтах"""
+        return len(self._bits)
+
+    @property
+    def is_full(self) -> bool:
+        """True, если элементов больше расчетной емкости и точность падает"""
+        return self.count > self.capacity
+
+    def expected_fp_rate(self) -> float:
+        """Расчетная доля ложных срабатываний при текущем заполнении"""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+    def stats(self) -> Dict[str, float]:
+        """Параметры и заполненность фильтра"""
+        return {
+            'items': self.count,
+            'capacity': self.capacity,
+            'bits': self.size,
+            'hash_count': self.hash_count,
+            'memory_bytes': self.memory_bytes,
+            'expected_fp_rate': self.expected_fp_rate(),
+        }
@@ -1,7 +1,9 @@
-from typing import List, Set, Dict
+from typing import List, Set, Dict, FrozenSet, Iterable, Optional, Tuple
 import re
 from dataclasses import dataclass
 
+from .keyword_matcher import KeywordMatcher
+
 @dataclass
 class TagRule:
     """Правило для определения тега"""
@@ -52,6 +54,52 @@ TAG_RULES: Dict[str, TagRule] = {
     ),
 }
 
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+# Цена: число и одна из валютных отметок (₽, руб, р, rub)
+PRICE_PATTERN = r'(?P<price>\d+)\s*(?:₽|руб|р\b|rub)'
+_PRICE_RE = re.compile(PRICE_PATTERN, re.IGNORECASE)
+
+def _compile_tag_rules(
+    rules: Dict[str, TagRule]
+) -> Tuple[KeywordMatcher, Dict[str, FrozenSet[str]]]:
+    """
+    Компилирует правила тегов в один поиск по всем ключевым словам.
+    
+    Args:
+        rules: Правила тегов
+        
+    Returns:
+        Tuple[KeywordMatcher, Dict[str, FrozenSet[str]]]: Поиск и отображение
+        ключевого слова в теги, к которым оно относится
+    """
+    keyword_tags: Dict[str, Set[str]] = {}
+    for tag, rule in rules.items():
+        for keyword in rule.keywords:
+            keyword_tags.setdefault(keyword.lower(), set()).add(tag)
+    
+    matcher = KeywordMatcher(keyword_tags)
+    return matcher, {keyword: frozenset(tags) for keyword, tags in keyword_tags.items()}
+
+# Скомпилированные правила; заменяются целиком, чтобы читатели не видели промежуточного состояния
+_compiled_rules = _compile_tag_rules(TAG_RULES)
+
+def reload_tag_rules(rules: Optional[Dict[str, TagRule]] = None) -> None:
+    """
+    Перекомпилирует правила тегов.
+    
+    Вызывается после изменения TAG_RULES или с новым набором правил,
+    который заменяет текущий.
+    
+    Args:
+        rules: Новый набор правил или None, чтобы перечитать TAG_RULES
+    """
+    global _compiled_rules
+    if rules is not None:
+        TAG_RULES.clear()
+        TAG_RULES.update(rules)
+    _compiled_rules = _compile_tag_rules(TAG_RULES)
+
 def normalize_text(text: str) -> str:
     """
     Нормализует текст для поиска ключевых слов.
@@ -62,9 +110,37 @@ def normalize_text(text: str) -> str:
     Returns:
         str: Нормализованный текст в нижнем регистре без спецсимволов
     """
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', ' ', text)
-    return text
+    return normalize_lowered(text.lower())
+
+def normalize_lowered(text: str) -> str:
+    """
+    Нормализует текст, уже приведенный к нижнему регистру.
+    
+    Args:
+        text: Текст в нижнем регистре
+        
+    Returns:
+        str: Текст без спецсимволов
+    """
+    return _NON_WORD_RE.sub(' ', text)
+
+def match_tags(normalized_text: str) -> Set[str]:
+    """
+    Находит теги в уже нормализованном тексте (см. normalize_text).
+    
+    Args:
+        normalized_text: Нормализованный текст
+        
+    Returns:
+        Set[str]: Набор найденных тегов
+    """
+    matcher, keyword_tags = _compiled_rules
+    found_tags: Set[str] = set()
+    
+    for keyword in matcher.matched(normalized_text):
+        found_tags |= keyword_tags[keyword]
+    
+    return found_tags
 
 def find_tags(text: str) -> Set[str]:
     """
@@ -76,14 +152,19 @@ def find_tags(text: str) -> Set[str]:
     Returns:
         Set[str]: Набор найденных тегов
     """
-    normalized_text = normalize_text(text)
-    found_tags = set()
-    
-    for tag, rule in TAG_RULES.items():
-        if any(keyword.lower() in normalized_text for keyword in rule.keywords):
-            found_tags.add(tag)
+    return match_tags(normalize_text(text))
+
+def find_tags_many(texts: Iterable[str]) -> List[Set[str]]:
+    """
+    Находит теги для пачки текстов, например для целой страницы сообщений.
     
-    return found_tags
+    Args:
+        texts: Тексты для анализа
+        
+    Returns:
+        List[Set[str]]: Наборы тегов в порядке входных текстов
+    """
+    return [match_tags(normalize_text(text)) for text in texts]
 
 def is_hot_content(tags: List[str]) -> bool:
     """
@@ -117,16 +198,5 @@ def extract_price(text: str) -> List[int]:
     Returns:
         List[int]: Отсортированный список найденных цен
     """
-    price_patterns = [
-        r'(\d+)\s*₽',
-        r'(\d+)\s*руб',
-        r'(\d+)\s*р\b',
-        r'(\d+)\s*rub',
-    ]
-    
-    prices = []
-    for pattern in price_patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        prices.extend(int(match.group(1)) for match in matches)
-    
-    return sorted(prices) if prices else [] 
\ No newline at end of file
+    prices = [int(match.group('price')) for match in _PRICE_RE.finditer(text)]
+    return sorted(prices)
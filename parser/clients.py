@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Union
+
+from telethon import TelegramClient
+from telethon.sessions import StringSession
+
+logger = logging.getLogger(__name__)
+
+# Роли клиентов: чтение каналов от имени пользователя и отправка от имени бота
+USER = 'user'
+BOT = 'bot'
+
+
+class ClientRegistry:
+    """
+    Общие клиенты Telegram процесса.
+
+    Каждый компонент берет клиента у реестра, а не создает свой, поэтому
+    на весь процесс приходится одно подключение и одна проверка авторизации
+    на роль, и файл сессии не открывается дважды. Клиенты привязаны к циклу
+    событий, в котором были подключены: все компоненты работают в нем же.
+    Отключаются клиенты только при закрытии реестра.
+    """
+
+    def __init__(
+        self,
+        api_id: Optional[int] = None,
+        api_hash: Optional[str] = None,
+        bot_token: Optional[str] = None,
+        phone: Optional[Union[str, Callable[[], str]]] = None,
+        password: Optional[Callable[[], str]] = None,
+        user_session: Any = 'user_session',
+        bot_session: Any = 'bot_session',
+        client_factory: Callable[..., Any] = TelegramClient,
+    ):
+        """
+        Args:
+            api_id: API ID (по умолчанию из переменной окружения API_ID)
+            api_hash: API hash (по умолчанию из API_HASH)
+            bot_token: Токен бота (по умолчанию из BOT_TOKEN)
+            phone: Телефон пользователя для входа или функция, которая его
+                спросит (по умолчанию из PHONE, без него спросит Telethon)
+            password: Функция, спрашивающая облачный пароль 2FA
+            user_session: Имя файла или объект сессии пользователя
+            bot_session: Имя файла или объект сессии бота
+            client_factory: Конструктор клиента с сигнатурой TelegramClient
+        """
+        self.api_id = int(api_id or os.getenv('API_ID') or 0)
+        self.api_hash = api_hash or os.getenv('API_HASH')
+        self.bot_token = bot_token or os.getenv('BOT_TOKEN')
+        self.phone = phone or os.getenv('PHONE')
+        self.password = password
+        self.connects = 0
+        self._sessions = {USER: user_session, BOT: bot_session}
+        self._factory = client_factory
+        self._clients: Dict[str, Any] = {}
+        self._borrowers: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _check_loop(self) -> None:
+        """Проверяет, что реестром пользуются из одного цикла событий"""
+        loop = asyncio.get_running_loop()
+        if self._loop is None or self._loop.is_closed():
+            self._loop = loop
+            self._locks = {}
+        elif self._loop is not loop:
+            raise RuntimeError(
+                "Клиенты Telegram уже подключены в другом цикле событий; "
+                "все компоненты должны работать в одном цикле"
+            )
+
+    async def _login(self, role: str, client: Any) -> None:
+        """Подключает клиента и проверяет авторизацию"""
+        if role == BOT:
+            await client.start(bot_token=self.bot_token)
+        elif role == USER:
+            # Основной аккаунт: не заданные параметры входа Telethon спросит сам
+            kwargs: Dict[str, Any] = {}
+            if self.phone:
+                kwargs['phone'] = self.phone
+            if self.password:
+                kwargs['password'] = self.password
+            await client.start(**kwargs)
+        else:
+            # Дополнительные аккаунты подключаются только с готовой сессией
+            await client.connect()
+            if not await client.is_user_authorized():
+                raise PermissionError(f"Сессия {role} не авторизована")
+
+    def borrowers(self, role: str) -> int:
+        """Сколько компонентов сейчас пользуются клиентом роли"""
+        return self._borrowers.get(role, 0)
+
+    async def acquire(self, role: str) -> Any:
+        """
+        Возвращает клиента роли, подключая его при первом обращении.
+
+        Args:
+            role: USER, BOT или USER:<имя> для дополнительного аккаунта
+
+        Returns:
+            Подключенный и авторизованный клиент
+        """
+        self._check_loop()
+        lock = self._locks.setdefault(role, asyncio.Lock())
+        async with lock:
+            client = self._clients.get(role)
+            if client is None:
+                client = self._factory(self._sessions[role], self.api_id, self.api_hash)
+                try:
+                    await self._login(role, client)
+                except BaseException:
+                    await client.disconnect()
+                    raise
+                self._clients[role] = client
+                self.connects += 1
+                logger.info(f"Клиент {role} подключен")
+            self._borrowers[role] = self.borrowers(role) + 1
+        return client
+
+    async def user(self) -> Any:
+        """Клиент пользователя (чтение каналов)"""
+        return await self.acquire(USER)
+
+    async def bot(self) -> Any:
+        """Клиент бота (отправка)"""
+        return await self.acquire(BOT)
+
+    async def accounts(self, sessions: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Подключает дополнительные аккаунты пользователей.
+
+        Вход без участия человека: сессии, которые не авторизованы или не
+        подключаются, пропускаются с предупреждением.
+
+        Args:
+            sessions: Имя аккаунта -> строка StringSession или объект сессии
+
+        Returns:
+            Dict[str, Any]: Имя аккаунта -> подключенный клиент
+        """
+        connected: Dict[str, Any] = {}
+        for name, session in sessions.items():
+            role = f"{USER}:{name}"
+            if isinstance(session, str):
+                session = StringSession(session)
+            self._sessions.setdefault(role, session)
+            try:
+                connected[name] = await self.acquire(role)
+            except Exception as e:
+                logger.warning(f"Аккаунт {name} пропущен: {e}")
+        return connected
+
+    def release(self, client: Any) -> None:
+        """
+        Возвращает клиента реестру. Соединение остается открытым для других.
+
+        Args:
+            client: Клиент, полученный через acquire
+        """
+        for role, registered in self._clients.items():
+            if registered is client:
+                self._borrowers[role] = max(0, self.borrowers(role) - 1)
+                return
+
+    @asynccontextmanager
+    async def borrow(self, role: str) -> AsyncIterator[Any]:
+        """
+        Выдает клиента на время блока.
+
+        Args:
+            role: USER или BOT
+        """
+        client = await self.acquire(role)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    async def close(self) -> None:
+        """Отключает всех клиентов"""
+        clients, self._clients = self._clients, {}
+        self._borrowers = {}
+        for role, client in clients.items():
+            try:
+                await client.disconnect()
+                logger.info(f"Клиент {role} отключен")
+            except Exception as e:
+                logger.error(f"Ошибка при отключении клиента {role}: {e}")
+
+
+_registry: Optional[ClientRegistry] = None
+
+
+def get_registry(**kwargs: Any) -> ClientRegistry:
+    """
+    Возвращает общий реестр процесса, создавая его при первом вызове.
+
+    Args:
+        **kwargs: Параметры ClientRegistry (учитываются только при создании)
+
+    Returns:
+        ClientRegistry: Реестр клиентов
+    """
+    global _registry
+    if _registry is None:
+        _registry = ClientRegistry(**kwargs)
+    return _registry
@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Сколько хранить отметки об обработке (по умолчанию 30 дней)
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+# Канал для ID из старого processed.json, где канал не сохранялся
+LEGACY_CHANNEL = ''
+
+
+class DedupStore:
+    """
+    Хранилище обработанных сообщений с ключом (канал, ID сообщения).
+
+    Данные лежат в SQLite в режиме WAL: новые отметки дописываются в журнал,
+    проверка идет по первичному ключу на диске, поэтому история не
+    загружается в память целиком. Отметки старше ttl считаются
+    отсутствующими и удаляются при компактировании.
+    """
+
+    def __init__(self, path: Union[str, Path], ttl: float = DEFAULT_TTL):
+        """
+        Args:
+            path: Файл базы данных
+            ttl: Время жизни отметки в секундах (0 - без ограничения)
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS seen (
+                channel TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (channel, message_id)
+            ) WITHOUT ROWID
+        ''')
+
+    def __enter__(self) -> 'DedupStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        self._conn.close()
+
+    def _cutoff(self) -> float:
+        """Момент, раньше которого отметки считаются устаревшими"""
+        return time.time() - self.ttl if self.ttl else float('-inf')
+
+    def __contains__(self, key: Tuple[str, int]) -> bool:
+        channel, message_id = key
+        return self.contains(channel, message_id)
+
+    def __len__(self) -> int:
+        row = self._conn.execute(
+            'SELECT COUNT(*) FROM seen WHERE seen_at >= ?', (self._cutoff(),)
+        ).fetchone()
+        return row[0]
+
+    def contains(self, channel: str, message_id: int) -> bool:
+        """
+        Проверяет, обрабатывалось ли сообщение.
+
+        Args:
+            channel: Имя или ID канала
+            message_id: ID сообщения
+
+        Returns:
+            bool: True, если есть неустаревшая отметка
+        """
+        row = self._conn.execute('''
+            SELECT 1 FROM seen
+            WHERE channel IN (?, ?) AND message_id = ? AND seen_at >= ?
+            LIMIT 1
+        ''', (str(channel), LEGACY_CHANNEL, message_id, self._cutoff())).fetchone()
+        return row is not None
+
+    def add(self, channel: str, message_id: int) -> None:
+        """
+        Отмечает сообщение как обработанное.
+
+        Args:
+            channel: Имя или ID канала
+            message_id: ID сообщения
+        """
+        self.add_many([(channel, message_id)])
+
+    def add_many(self, items: Iterable[Tuple[str, int]]) -> None:
+        """
+        Отмечает несколько сообщений одной транзакцией.
+
+        Args:
+            items: Пары (канал, ID сообщения)
+        """
+        now = time.time()
+        rows = [(str(channel), message_id, now) for channel, message_id in items]
+        if not rows:
+            return
+
+        with self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.executemany('''
+                INSERT INTO seen (channel, message_id, seen_at) VALUES (?, ?, ?)
+                ON CONFLICT (channel, message_id) DO UPDATE SET seen_at = excluded.seen_at
+            ''', rows)
+
+    def expire(self) -> int:
+        """
+        Удаляет устаревшие отметки.
+
+        Returns:
+            int: Сколько отметок удалено
+        """
+        if not self.ttl:
+            return 0
+        with self._conn:
+            self._conn.execute('BEGIN')
+            cursor = self._conn.execute('DELETE FROM seen WHERE seen_at < ?', (self._cutoff(),))
+        return cursor.rowcount
+
+    def compact(self) -> int:
+        """
+        Удаляет устаревшие отметки и сжимает файл базы.
+
+        SQLite выполняет VACUUM и перенос журнала атомарно, поэтому сбой
+        во время компактирования не теряет данные.
+
+        Returns:
+            int: Сколько отметок удалено
+        """
+        removed = self.expire()
+        self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self._conn.execute('VACUUM')
+        return removed
+
+    def import_legacy(self, path: Union[str, Path]) -> int:
+        """
+        Переносит ID из старого processed.json.
+
+        В старом формате канал не сохранялся, поэтому ID записываются
+        с каналом LEGACY_CHANNEL и совпадают с сообщением любого канала,
+        пока не устареют. После переноса файл переименовывается в *.migrated.
+
+        Args:
+            path: Путь к processed.json
+
+        Returns:
+            int: Сколько ID перенесено
+        """
+        path = Path(path)
+        if not path.exists():
+            return 0
+
+        try:
+            with open(path, 'r') as f:
+                message_ids = [int(message_id) for message_id in json.load(f)]
+        except (json.JSONDecodeError, ValueError, TypeError) as e:
+            logger.error(f"Ошибка загрузки {path}: {e}")
+            return 0
+
+        self.add_many((LEGACY_CHANNEL, message_id) for message_id in message_ids)
+        os.replace(path, path.with_suffix(path.suffix + '.migrated'))
+        logger.info(f"Перенесено {len(message_ids)} ID из {path}")
+        return len(message_ids)
+
+
+def open_dedup_store(
+    path: Union[str, Path], ttl: float = DEFAULT_TTL, legacy_path: Optional[Union[str, Path]] = None
+) -> DedupStore:
+    """
+    Открывает хранилище и при первом запуске переносит старый processed.json.
+
+    Args:
+        path: Файл базы данных
+        ttl: Время жизни отметки в секундах
+        legacy_path: Путь к старому processed.json
+
+    Returns:
+        DedupStore: Открытое хранилище
+    """
+    store = DedupStore(path, ttl=ttl)
+    if legacy_path is not None:
+        store.import_legacy(legacy_path)
+    return store
@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from .classifiers import match_tags, is_hot_content, normalize_lowered
+from .summarizer import create_short_title, scan_prices_and_dates
+
+DEFAULT_CITY = "Москва"
+
+# Варианты написания города в нижнем регистре в порядке проверки
+CITY_ALIASES: List[Tuple[str, str]] = [
+    ("москва", "Москва"),
+    ("санкт-петербург", "Санкт-Петербург"),
+    ("спб", "Санкт-Петербург"),
+    ("питер", "Санкт-Петербург"),
+]
+
+@dataclass
+class MessageAnalysis:
+    """Результат разбора текста сообщения, общий для всех классификаторов"""
+    text: str
+    lowered: str
+    normalized: str
+    city: str
+    tags: List[str]
+    is_hot: bool
+    prices: List[int]
+    date_spans: List[Tuple[int, int]]
+    date: Optional[str]
+    short: str
+
+def city_from_lowered(lowered: str) -> str:
+    """
+    Определяет город по тексту в нижнем регистре.
+
+    Args:
+        lowered: Текст в нижнем регистре
+
+    Returns:
+        str: Найденный город или Москва по умолчанию
+    """
+    for alias, city in CITY_ALIASES:
+        if alias in lowered:
+            return city
+    return DEFAULT_CITY
+
+def analyze_text(text: str) -> MessageAnalysis:
+    """
+    Разбирает текст сообщения для всех классификаторов сразу.
+
+    Текст приводится к нижнему регистру и нормализуется один раз, а город,
+    теги, цены, даты и краткий заголовок считаются из общих данных.
+
+    Args:
+        text: Исходный текст сообщения
+
+    Returns:
+        MessageAnalysis: Результат разбора
+    """
+    lowered = text.lower()
+    normalized = normalize_lowered(lowered)
+
+    city = city_from_lowered(lowered)
+    tags = list(match_tags(normalized))
+    scan = scan_prices_and_dates(text)
+
+    return MessageAnalysis(
+        text=text,
+        lowered=lowered,
+        normalized=normalized,
+        city=city,
+        tags=tags,
+        is_hot=is_hot_content(tags),
+        prices=scan.prices,
+        date_spans=scan.date_spans,
+        date=scan.date,
+        short=create_short_title(text, tags, city, prices=scan.prices),
+    )
+
+def analyze_many(texts: Iterable[str]) -> List[MessageAnalysis]:
+    """
+    Разбирает пачку текстов, например целую страницу сообщений.
+
+    Args:
+        texts: Тексты сообщений
+
+    Returns:
+        List[MessageAnalysis]: Результаты в порядке входных текстов
+    """
+    return [analyze_text(text) for text in texts]
@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+from typing import Dict, List, Optional, Sequence
+
+from .classifiers import TAG_RULES, TagRule, reload_tag_rules
+from .enrichment import MessageAnalysis, analyze_many, analyze_text
+
+logger = logging.getLogger(__name__)
+
+# Сколько текстов отправлять в процесс одной задачей: крупнее пачка -
+# меньше накладных расходов на передачу, мельче - ровнее загрузка процессов
+BATCH_SIZE = 64
+
+# Текст для прогрева: проходит через все правила и шаблоны разбора
+_WARMUP_TEXT = "Скидка 20% на завтрак в СПб, бранч и вино за 1500₽ до 15 января"
+
+
+def _init_worker(rules: Dict[str, TagRule]) -> None:
+    """Инициализатор процесса: компилирует те же правила тегов, что у родителя"""
+    reload_tag_rules(rules)
+
+
+def _warm_up() -> int:
+    """Прогревает процесс одним разбором, возвращает его PID"""
+    analyze_text(_WARMUP_TEXT)
+    return os.getpid()
+
+
+class EnrichmentPool:
+    """
+    Разбор текстов (город, теги, краткий заголовок) в пуле процессов.
+
+    Разбор занимает процессор и при догрузке тысяч сообщений останавливал
+    бы цикл событий, который обслуживает и сетевой ввод-вывод Telethon.
+    Тексты отправляются в процессы пачками по batch_size, результаты
+    возвращаются в исходном порядке. Процессы запускаются и прогреваются
+    в start(): правила тегов компилируются в них один раз, на текущем
+    наборе правил родителя.
+    """
+
+    def __init__(self, workers: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                 mp_context: Optional[BaseContext] = None):
+        """
+        Args:
+            workers: Число процессов (по умолчанию по числу ядер)
+            batch_size: Сколько текстов в одной задаче
+            mp_context: Контекст multiprocessing (по умолчанию системный)
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.batch_size = max(1, batch_size)
+        self.mp_context = mp_context
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def __aenter__(self) -> 'EnrichmentPool':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def start(self) -> None:
+        """Запускает процессы и ждет, пока каждый будет готов к разбору"""
+        if self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            self.workers,
+            mp_context=self.mp_context,
+            initializer=_init_worker,
+            initargs=(dict(TAG_RULES),),
+        )
+        # Задачи отправляются все сразу, поэтому пул поднимает все процессы
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers)
+        ))
+        logger.info(f"Пул разбора запущен: {len(set(pids))} процессов")
+
+    async def analyze_many(self, texts: Sequence[str]) -> List[MessageAnalysis]:
+        """
+        Разбирает тексты в процессах пула.
+
+        Args:
+            texts: Тексты сообщений
+
+        Returns:
+            List[MessageAnalysis]: Результаты в порядке входных текстов
+        """
+        if not texts:
+            return []
+        if self._executor is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        batches = [list(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, analyze_many, batch) for batch in batches
+        ))
+        return [analysis for batch in results for analysis in batch]
+
+    async def aclose(self) -> None:
+        """Останавливает процессы, ожидая их завершения вне цикла событий"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            # shutdown(wait=True) ждет выхода процессов и остановил бы цикл событий
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(executor.shutdown, wait=True, cancel_futures=True)
+            )
+
+    def close(self) -> None:
+        """Останавливает процессы (для вызова вне цикла событий)"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
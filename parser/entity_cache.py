@@ -0,0 +1,345 @@
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from telethon import utils
+from telethon.tl.types import (
+    Channel, Chat, ChatForbidden, ChannelForbidden,
+    InputPeerChannel, InputPeerChat, InputPeerUser,
+)
+
+logger = logging.getLogger(__name__)
+
+# Сколько считать сведения о сущности свежими (по умолчанию сутки)
+DEFAULT_TTL = 24 * 60 * 60
+
+# Сколько сущностей держать в памяти
+DEFAULT_MAX_SIZE = 1000
+
+EntityKey = Union[int, str]
+
+
+@dataclass(frozen=True)
+class CachedEntity:
+    """Сведения о канале, чате или пользователе, достаточные для запросов к API"""
+    peer_id: int
+    kind: str
+    username: Optional[str]
+    title: Optional[str]
+    access_hash: Optional[int]
+    updated_at: float
+
+    def input_peer(self):
+        """
+        Возвращает InputPeer для запросов без обращения к get_entity.
+
+        Returns:
+            InputPeerChannel, InputPeerChat или InputPeerUser
+        """
+        real_id, _ = utils.resolve_id(self.peer_id)
+        if self.kind == 'channel':
+            return InputPeerChannel(real_id, self.access_hash or 0)
+        if self.kind == 'chat':
+            return InputPeerChat(real_id)
+        return InputPeerUser(real_id, self.access_hash or 0)
+
+
+def account_key(client: Any) -> str:
+    """
+    Возвращает постоянный ключ аккаунта клиента.
+
+    access_hash выдается каждому аккаунту свой, поэтому записи кэша
+    разделяются по аккаунтам: файл сессии или ID ключа авторизации.
+
+    Args:
+        client: Клиент Telegram
+
+    Returns:
+        str: Ключ аккаунта
+    """
+    session = getattr(client, 'session', None)
+    filename = getattr(session, 'filename', None)
+    if filename:
+        return Path(filename).stem
+    auth_key = getattr(session, 'auth_key', None)
+    if auth_key is not None and getattr(auth_key, 'key_id', None):
+        return f"key{auth_key.key_id}"
+    return 'default'
+
+
+def _normalize_username(key: str) -> str:
+    """Приводит @name, t.me/name и name к одному виду"""
+    username, _ = utils.parse_username(key)
+    return (username or key.lstrip('@')).lower()
+
+
+def entity_from_telethon(entity: Any) -> CachedEntity:
+    """
+    Извлекает сведения из объекта Telethon.
+
+    Args:
+        entity: Channel, Chat или User
+
+    Returns:
+        CachedEntity: Сведения для кэша
+    """
+    if isinstance(entity, (Channel, ChannelForbidden)):
+        kind = 'channel'
+    elif isinstance(entity, (Chat, ChatForbidden)):
+        kind = 'chat'
+    else:
+        kind = 'user'
+
+    title = getattr(entity, 'title', None)
+    if title is None:
+        name = ' '.join(filter(None, [getattr(entity, 'first_name', None),
+                                      getattr(entity, 'last_name', None)]))
+        title = name or None
+
+    return CachedEntity(
+        peer_id=utils.get_peer_id(entity),
+        kind=kind,
+        username=getattr(entity, 'username', None),
+        title=title,
+        access_hash=getattr(entity, 'access_hash', None),
+        updated_at=time.time(),
+    )
+
+
+class EntityCache:
+    """
+    Постоянный кэш сущностей Telegram: ID -> username, название, access_hash.
+
+    Записи хранятся в SQLite и переживают перезапуск, последние max_size
+    используемых держатся в памяти (LRU). Один кэш можно отдать нескольким
+    клиентам: записи каждого аккаунта хранятся отдельно. Записи старше ttl
+    считаются устаревшими и запрашиваются заново.
+    """
+
+    def __init__(self, path: Union[str, Path], ttl: float = DEFAULT_TTL,
+                 max_size: int = DEFAULT_MAX_SIZE):
+        """
+        Args:
+            path: Файл базы данных
+            ttl: Время жизни записи в секундах (0 - без ограничения)
+            max_size: Сколько записей держать в памяти
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._memory: "OrderedDict[Tuple[str, int], CachedEntity]" = OrderedDict()
+        self._usernames: Dict[Tuple[str, str], int] = {}
+
+        self._conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS entities (
+                account TEXT NOT NULL,
+                peer_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                username TEXT,
+                title TEXT,
+                access_hash INTEGER,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (account, peer_id)
+            ) WITHOUT ROWID
+        ''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_entities_username ON entities (account, username)'
+        )
+        self.warm()
+
+    def __enter__(self) -> 'EntityCache':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _is_fresh(self, entity: CachedEntity) -> bool:
+        return not self.ttl or time.time() - entity.updated_at < self.ttl
+
+    def _remember(self, account: str, entity: CachedEntity) -> None:
+        """Кладет запись в память, вытесняя давно не использованные"""
+        key = (account, entity.peer_id)
+        self._memory[key] = entity
+        self._memory.move_to_end(key)
+        if entity.username:
+            self._usernames[(account, entity.username.lower())] = entity.peer_id
+        while len(self._memory) > self.max_size:
+            (old_account, _), old = self._memory.popitem(last=False)
+            if old.username:
+                self._usernames.pop((old_account, old.username.lower()), None)
+
+    def warm(self) -> int:
+        """
+        Загружает в память последние обновленные неустаревшие записи.
+
+        Returns:
+            int: Сколько записей загружено
+        """
+        cutoff = time.time() - self.ttl if self.ttl else 0
+        rows = self._conn.execute('''
+            SELECT account, peer_id, kind, username, title, access_hash, updated_at
+            FROM entities WHERE updated_at >= ?
+            ORDER BY updated_at DESC LIMIT ?
+        ''', (cutoff, self.max_size)).fetchall()
+        # Самые свежие должны оказаться в конце LRU
+        for account, *fields in reversed(rows):
+            self._remember(account, CachedEntity(*fields))
+        if rows:
+            logger.info(f"Кэш сущностей: загружено {len(rows)} записей из {self.path}")
+        return len(rows)
+
+    def _load(self, account: str, key: EntityKey) -> Optional[CachedEntity]:
+        """Ищет запись в базе"""
+        if isinstance(key, int):
+            row = self._conn.execute('''
+                SELECT peer_id, kind, username, title, access_hash, updated_at
+                FROM entities WHERE account = ? AND peer_id = ?
+            ''', (account, key)).fetchone()
+        else:
+            row = self._conn.execute('''
+                SELECT peer_id, kind, username, title, access_hash, updated_at
+                FROM entities WHERE account = ? AND username = ? COLLATE NOCASE
+            ''', (account, key)).fetchone()
+        return CachedEntity(*row) if row else None
+
+    def get(self, client: Any, key: EntityKey) -> Optional[CachedEntity]:
+        """
+        Возвращает свежую запись из кэша без запросов к API.
+
+        Args:
+            client: Клиент Telegram (определяет аккаунт)
+            key: ID (с пометкой типа, как event.chat_id) или username
+
+        Returns:
+            Optional[CachedEntity]: Запись или None, если ее нет или она устарела
+        """
+        account = account_key(client)
+        if isinstance(key, str) and key.lstrip('-').isdigit():
+            key = int(key)
+        if isinstance(key, str):
+            key = _normalize_username(key)
+            peer_id = self._usernames.get((account, key))
+            entity = self._memory.get((account, peer_id)) if peer_id is not None else None
+        else:
+            entity = self._memory.get((account, key))
+
+        if entity is None:
+            entity = self._load(account, key)
+        if entity is None or not self._is_fresh(entity):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._remember(account, entity)
+        return entity
+
+    def put(self, client: Any, entity: Any) -> CachedEntity:
+        """
+        Запоминает сущность, полученную от Telethon.
+
+        Args:
+            client: Клиент Telegram, получивший сущность
+            entity: Channel, Chat или User
+
+        Returns:
+            CachedEntity: Сохраненная запись
+        """
+        account = account_key(client)
+        cached = entity if isinstance(entity, CachedEntity) else entity_from_telethon(entity)
+        with self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.execute('''
+                INSERT INTO entities (account, peer_id, kind, username, title, access_hash, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (account, peer_id) DO UPDATE SET
+                    kind = excluded.kind, username = excluded.username, title = excluded.title,
+                    access_hash = excluded.access_hash, updated_at = excluded.updated_at
+            ''', (account, cached.peer_id, cached.kind, cached.username, cached.title,
+                  cached.access_hash, cached.updated_at))
+        self._remember(account, cached)
+        return cached
+
+    async def resolve(self, client: Any, key: EntityKey) -> CachedEntity:
+        """
+        Возвращает запись из кэша, а при промахе запрашивает get_entity.
+
+        Args:
+            client: Клиент Telegram
+            key: ID или username
+
+        Returns:
+            CachedEntity: Сведения о сущности
+        """
+        cached = self.get(client, key)
+        if cached is not None:
+            return cached
+        return self.put(client, await client.get_entity(key))
+
+    async def get_input_entity(self, client: Any, key: EntityKey):
+        """
+        Возвращает InputPeer для запросов, обращаясь к API только при промахе.
+
+        Args:
+            client: Клиент Telegram
+            key: ID или username
+
+        Returns:
+            InputPeer сущности
+        """
+        return (await self.resolve(client, key)).input_peer()
+
+    async def prefetch(self, client: Any, keys: Iterable[EntityKey]) -> int:
+        """
+        Заранее запрашивает отсутствующие в кэше сущности (прогрев при запуске).
+
+        Args:
+            client: Клиент Telegram
+            keys: ID или username
+
+        Returns:
+            int: Сколько сущностей пришлось запросить
+        """
+        fetched = 0
+        for key in keys:
+            if self.get(client, key) is not None:
+                continue
+            try:
+                self.put(client, await client.get_entity(key))
+                fetched += 1
+            except Exception as e:
+                logger.warning(f"Не удалось получить сущность {key}: {e}")
+        return fetched
+
+    def expire(self) -> int:
+        """
+        Удаляет устаревшие записи из базы.
+
+        Returns:
+            int: Сколько записей удалено
+        """
+        if not self.ttl:
+            return 0
+        with self._conn:
+            self._conn.execute('BEGIN')
+            cursor = self._conn.execute(
+                'DELETE FROM entities WHERE updated_at < ?', (time.time() - self.ttl,)
+            )
+        return cursor.rowcount
@@ -0,0 +1,186 @@
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Порог, после которого автомат Ахо-Корасик обгоняет поиск через `in`.
+# Для небольших словарей встроенный поиск подстроки (на C) быстрее,
+# чем проход по тексту в интерпретаторе (см. benchmarks/bench_keyword_matcher.py).
+SCAN_THRESHOLD = 200
+
+
+class KeywordMatcher:
+    """
+    Многошаблонный поиск ключевых слов.
+
+    Строится один раз на набор ключевых слов и переиспользуется для всех
+    сообщений. Для больших словарей компилируется автомат Ахо-Корасик,
+    который находит все вхождения (включая перекрывающиеся) за один проход
+    по тексту независимо от числа ключевых слов.
+
+    Поиск регистрозависимый: ключевые слова и текст нормализуются
+    вызывающим кодом.
+    """
+
+    def __init__(self, keywords: Iterable[str], scan_threshold: int = SCAN_THRESHOLD):
+        """
+        Args:
+            keywords: Ключевые слова (пустые строки и дубликаты игнорируются)
+            scan_threshold: Размер словаря, начиная с которого строится автомат
+        """
+        self._keywords: Tuple[str, ...] = tuple(dict.fromkeys(k for k in keywords if k))
+        self._use_automaton = len(self._keywords) >= scan_threshold
+        self._goto: List[Dict[str, int]] = []
+        self._fail: List[int] = []
+        self._output: List[Tuple[str, ...]] = []
+
+        if self._use_automaton:
+            self._build_automaton()
+
+    @property
+    def keywords(self) -> Tuple[str, ...]:
+        """Ключевые слова, по которым построен поиск"""
+        return self._keywords
+
+    @property
+    def uses_automaton(self) -> bool:
+        """True, если поиск идет через автомат Ахо-Корасик"""
+        return self._use_automaton
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def _build_automaton(self) -> None:
+        """Строит бор ключевых слов и суффиксные ссылки"""
+        goto: List[Dict[str, int]] = [{}]
+        output: List[Tuple[str, ...]] = [()]
+
+        for keyword in self._keywords:
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(())
+                state = next_state
+            output[state] += (keyword,)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state] += output[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """
+        Находит все вхождения ключевых слов в тексте.
+
+        Args:
+            text: Текст для поиска
+
+        Returns:
+            List[Tuple[int, str]]: Пары (смещение, ключевое слово), отсортированные по смещению
+        """
+        if not text:
+            return []
+
+        matches: List[Tuple[int, str]] = []
+        if not self._use_automaton:
+            for keyword in self._keywords:
+                position = text.find(keyword)
+                while position != -1:
+                    matches.append((position, keyword))
+                    position = text.find(keyword, position + 1)
+            matches.sort()
+            return matches
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(text):
+            while True:
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if output[state]:
+                for keyword in output[state]:
+                    matches.append((index - len(keyword) + 1, keyword))
+
+        matches.sort()
+        return matches
+
+    def matched(self, text: str) -> Set[str]:
+        """
+        Возвращает набор ключевых слов, встречающихся в тексте.
+
+        Args:
+            text: Текст для поиска
+
+        Returns:
+            Set[str]: Найденные ключевые слова
+        """
+        if not text:
+            return set()
+
+        if not self._use_automaton:
+            return {keyword for keyword in self._keywords if keyword in text}
+
+        goto, fail, output = self._goto, self._fail, self._output
+        found: Set[str] = set()
+        state = 0
+        for char in text:
+            while True:
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def contains_any(self, text: str) -> bool:
+        """
+        Проверяет, есть ли в тексте хотя бы одно ключевое слово.
+
+        Args:
+            text: Текст для поиска
+
+        Returns:
+            bool: True при первом найденном вхождении
+        """
+        if not text:
+            return False
+
+        if not self._use_automaton:
+            return any(keyword in text for keyword in self._keywords)
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while True:
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if output[state]:
+                return True
+        return False
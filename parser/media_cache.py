@@ -0,0 +1,349 @@
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from telethon import utils
+from telethon.extensions import BinaryReader
+
+from .entity_cache import account_key
+
+logger = logging.getLogger(__name__)
+
+# Сколько места на диске занимают закэшированные файлы (по умолчанию 512 МБ)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Сколько считать загруженный, но еще не отправленный файл действительным.
+# Telegram хранит части загрузки ограниченное время, точный срок не документирован
+UPLOAD_TTL = 60 * 60
+
+
+def media_key(message: Any) -> Optional[str]:
+    """
+    Возвращает ключ содержимого медиа: ID фото или документа и размер.
+
+    Репост хранит ссылку на тот же файл, поэтому ключ у оригинала
+    и у всех его репостов один и тот же.
+
+    Args:
+        message: Сообщение Telethon
+
+    Returns:
+        Optional[str]: Ключ или None, если у медиа нет ID
+    """
+    document = message.document
+    if document is not None:
+        file_id = getattr(document, 'id', None)
+        size = getattr(document, 'size', None)
+        kind = 'doc'
+    else:
+        file_id = getattr(message.photo, 'id', None)
+        size = getattr(message.file, 'size', None) if message.file else None
+        kind = 'photo'
+    if not isinstance(file_id, int):
+        return None
+    return f"{kind}{file_id}_{size or 0}"
+
+
+def _sent_handle(message: Any) -> Optional[Any]:
+    """InputDocument или InputPhoto из сообщения, отправленного ботом"""
+    document = getattr(message, 'document', None)
+    if document is not None:
+        return utils.get_input_document(document)
+    photo = getattr(message, 'photo', None)
+    if photo is not None:
+        return utils.get_input_photo(photo)
+    return None
+
+
+class CacheWriter:
+    """
+    Запись файла в кэш по кускам.
+
+    Файл пишется во временный и попадает в кэш только после commit(),
+    поэтому прерванное скачивание не оставляет обрезанных файлов.
+    """
+
+    def __init__(self, cache: 'MediaCache', key: str, size: int):
+        self.key = key
+        self.size = size
+        self.written = 0
+        self._cache = cache
+        self._tmp_path = cache.directory / f"{key}.part"
+        self._file = open(self._tmp_path, 'wb')
+
+    def write(self, chunk: bytes) -> None:
+        """Дописывает очередной кусок"""
+        self._file.write(chunk)
+        self.written += len(chunk)
+
+    def commit(self) -> bool:
+        """
+        Переносит файл в кэш, если он записан целиком.
+
+        Returns:
+            bool: True, если файл сохранен
+        """
+        self._file.close()
+        if self.written != self.size:
+            self.abort()
+            return False
+        os.replace(self._tmp_path, self._cache.directory / self.key)
+        self._cache._add(self.key, self.size)
+        return True
+
+    def abort(self) -> None:
+        """Удаляет недописанный файл"""
+        self._file.close()
+        try:
+            self._tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class MediaCache:
+    """
+    Кэш медиа с адресацией по содержимому (ID файла Telegram и размер).
+
+    Скачанные файлы хранятся на диске, общий объем ограничен max_bytes:
+    при превышении удаляются давно не использованные (LRU). Для клиента,
+    который отправляет медиа, запоминается ссылка на уже загруженный файл:
+    сначала InputFile после загрузки, затем InputDocument или InputPhoto
+    из отправленного сообщения. Повторный файл отправляется по ссылке,
+    без скачивания и загрузки.
+    """
+
+    def __init__(self, directory: Union[str, Path], max_bytes: int = DEFAULT_MAX_BYTES,
+                 upload_ttl: float = UPLOAD_TTL):
+        """
+        Args:
+            directory: Каталог для файлов и индекса
+            max_bytes: Предельный объем файлов на диске (0 - файлы не хранятся,
+                запоминаются только ссылки на загруженное)
+            upload_ttl: Сколько секунд считать InputFile действительным
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.upload_ttl = upload_ttl
+        self.hits = 0
+        self.misses = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._uploads: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+
+        self._conn = sqlite3.connect(str(self.directory / 'index.db'), isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_files_last_used ON files (last_used)')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS handles (
+                account TEXT NOT NULL,
+                key TEXT NOT NULL,
+                handle BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (account, key)
+            ) WITHOUT ROWID
+        ''')
+        self.total_bytes = self._reconcile()
+
+    def __enter__(self) -> 'MediaCache':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Закрывает индекс"""
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def _reconcile(self) -> int:
+        """Убирает из индекса файлы, пропавшие с диска, и недописанные файлы"""
+        for tmp_path in self.directory.glob('*.part'):
+            tmp_path.unlink()
+        missing = [
+            (key,) for key, in self._conn.execute('SELECT key FROM files')
+            if not (self.directory / key).exists()
+        ]
+        if missing:
+            with self._conn:
+                self._conn.execute('BEGIN')
+                self._conn.executemany('DELETE FROM files WHERE key = ?', missing)
+        return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+
+    def _add(self, key: str, size: int) -> None:
+        """Вносит сохраненный файл в индекс и освобождает место"""
+        with self._conn:
+            self._conn.execute('BEGIN')
+            previous = self._conn.execute('SELECT size FROM files WHERE key = ?', (key,)).fetchone()
+            self._conn.execute('''
+                INSERT INTO files (key, size, last_used) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET size = excluded.size, last_used = excluded.last_used
+            ''', (key, size, time.time()))
+        self.total_bytes += size - (previous[0] if previous else 0)
+        self._evict()
+
+    def _evict(self) -> int:
+        """
+        Удаляет давно не использованные файлы, пока объем больше предела.
+
+        Returns:
+            int: Сколько файлов удалено
+        """
+        removed = 0
+        while self.total_bytes > self.max_bytes:
+            row = self._conn.execute(
+                'SELECT key, size FROM files ORDER BY last_used LIMIT 1'
+            ).fetchone()
+            if row is None:
+                break
+            key, size = row
+            try:
+                (self.directory / key).unlink()
+            except FileNotFoundError:
+                pass
+            self._conn.execute('DELETE FROM files WHERE key = ?', (key,))
+            self.total_bytes -= size
+            removed += 1
+        if removed:
+            logger.info(f"Кэш медиа: удалено {removed} файлов, занято {self.total_bytes} байт")
+        return removed
+
+    def path(self, key: str) -> Optional[Path]:
+        """
+        Возвращает путь к закэшированному файлу и отмечает его использование.
+
+        Args:
+            key: Ключ содержимого (media_key)
+
+        Returns:
+            Optional[Path]: Путь или None, если файла нет
+        """
+        path = self.directory / key
+        row = self._conn.execute('SELECT 1 FROM files WHERE key = ?', (key,)).fetchone()
+        if row is None or not path.exists():
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute('UPDATE files SET last_used = ? WHERE key = ?', (time.time(), key))
+        return path
+
+    def store(self, key: str, data: bytes) -> bool:
+        """
+        Сохраняет файл целиком (например, скачанное в память фото).
+
+        Args:
+            key: Ключ содержимого
+            data: Содержимое файла
+
+        Returns:
+            bool: True, если файл помещается в кэш и сохранен
+        """
+        writer = self.open_writer(key, len(data))
+        if writer is None:
+            return False
+        writer.write(data)
+        return writer.commit()
+
+    def open_writer(self, key: str, size: int) -> Optional[CacheWriter]:
+        """
+        Начинает запись файла по кускам.
+
+        Args:
+            key: Ключ содержимого
+            size: Точный размер файла
+
+        Returns:
+            Optional[CacheWriter]: Запись или None, если файл больше всего кэша
+        """
+        if size > self.max_bytes:
+            return None
+        return CacheWriter(self, key, size)
+
+    def get_handle(self, client: Any, key: str) -> Optional[Any]:
+        """
+        Возвращает ссылку на файл, уже загруженный этим клиентом.
+
+        Args:
+            client: Клиент, который будет отправлять файл
+            key: Ключ содержимого
+
+        Returns:
+            InputDocument, InputPhoto, InputFile или None
+        """
+        account = account_key(client)
+        row = self._conn.execute(
+            'SELECT handle FROM handles WHERE account = ? AND key = ?', (account, key)
+        ).fetchone()
+        if row is not None:
+            self.hits += 1
+            return BinaryReader(row[0]).tgread_object()
+
+        upload = self._uploads.get((account, key))
+        if upload is not None:
+            handle, uploaded_at = upload
+            if time.monotonic() - uploaded_at < self.upload_ttl:
+                self.hits += 1
+                return handle
+            del self._uploads[(account, key)]
+        return None
+
+    def remember_upload(self, client: Any, key: str, handle: Any) -> None:
+        """
+        Запоминает InputFile, полученный от upload_file.
+
+        Args:
+            client: Клиент, загрузивший файл
+            key: Ключ содержимого
+            handle: InputFile или InputFileBig
+        """
+        self._uploads[(account_key(client), key)] = (handle, time.monotonic())
+
+    def remember_sent(self, client: Any, key: str, message: Any) -> None:
+        """
+        Запоминает файл из отправленного сообщения.
+
+        В отличие от InputFile, такая ссылка не устаревает через час
+        и сохраняется между перезапусками.
+
+        Args:
+            client: Клиент, отправивший сообщение
+            key: Ключ содержимого
+            message: Отправленное сообщение
+        """
+        handle = _sent_handle(message)
+        if handle is None:
+            return
+        account = account_key(client)
+        self._uploads.pop((account, key), None)
+        with self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.execute('''
+                INSERT INTO handles (account, key, handle, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (account, key) DO UPDATE SET
+                    handle = excluded.handle, updated_at = excluded.updated_at
+            ''', (account, key, bytes(handle), time.time()))
+
+    def forget_handle(self, client: Any, key: str) -> None:
+        """
+        Забывает ссылку, которую Telegram больше не принимает.
+
+        Args:
+            client: Клиент, отправлявший файл
+            key: Ключ содержимого
+        """
+        account = account_key(client)
+        self._uploads.pop((account, key), None)
+        self._conn.execute('DELETE FROM handles WHERE account = ? AND key = ?', (account, key))
+
@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from telethon import errors, types
+
+from .entity_cache import account_key
+from .media_cache import CacheWriter, MediaCache, media_key
+
+logger = logging.getLogger(__name__)
+
+# Размер куска скачивания и части загрузки (максимум, который разрешает Telegram)
+CHUNK_SIZE = 512 * 1024
+
+# Ошибки, означающие, что сохраненная ссылка на файл больше не действует
+STALE_HANDLE_ERRORS = (
+    errors.FileReferenceExpiredError,
+    errors.FilePartMissingError,
+    errors.FileIdInvalidError,
+    errors.MediaEmptyError,
+)
+
+
+class ChunkStream:
+    """
+    Файлоподобный поток поверх асинхронного итератора кусков.
+
+    upload_file читает его частями через await read(n), а куски
+    подтягиваются из скачивания по мере чтения. В памяти лежит не больше
+    одного куска и недочитанного остатка, на диск ничего не пишется.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], size: int, name: str):
+        """
+        Args:
+            chunks: Куски файла по порядку (например, iter_download)
+            size: Точный размер файла в байтах
+            name: Имя файла (с расширением)
+        """
+        self.name = name
+        self.size = size
+        self.peak_buffer = 0
+        self._chunks = chunks.__aiter__()
+        self._buffer = bytearray()
+        self._exhausted = False
+
+    async def read(self, n: int = -1) -> bytes:
+        """
+        Возвращает следующие n байт (все оставшиеся при n < 0).
+
+        Args:
+            n: Сколько байт прочитать
+
+        Returns:
+            bytes: Данные; короче n только в конце файла
+        """
+        while not self._exhausted and (n < 0 or len(self._buffer) < n):
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self._exhausted = True
+                break
+            self._buffer += chunk
+            self.peak_buffer = max(self.peak_buffer, len(self._buffer))
+
+        if n < 0 or n > len(self._buffer):
+            n = len(self._buffer)
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+    async def close(self) -> None:
+        """Прерывает скачивание, если загрузка закончилась раньше"""
+        aclose = getattr(self._chunks, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+
+@dataclass
+class RelayedMedia:
+    """Медиа, готовое к отправке целевым клиентом через send_file"""
+    file: Any
+    attributes: Optional[List[Any]] = None
+    mime_type: Optional[str] = None
+    size: int = 0
+    reused: bool = False
+    peak_buffer: int = 0
+    elapsed: float = 0.0
+    key: Optional[str] = None
+    cached: bool = False
+
+    def send_kwargs(self) -> Dict[str, Any]:
+        """Аргументы send_file, сохраняющие тип и атрибуты исходного файла"""
+        kwargs: Dict[str, Any] = {}
+        if self.attributes:
+            kwargs['attributes'] = self.attributes
+        if self.mime_type:
+            kwargs['mime_type'] = self.mime_type
+        return kwargs
+
+    def album_media(self) -> Any:
+        """
+        Файл для отправки в составе альбома.
+
+        send_file со списком файлов не принимает attributes и mime_type
+        на каждую часть, поэтому загруженный документ передается готовым
+        InputMediaUploadedDocument: у видео сохраняются длительность,
+        размеры и потоковое воспроизведение, у документа - MIME-тип.
+        """
+        if self.mime_type and isinstance(self.file, (types.InputFile, types.InputFileBig)):
+            return types.InputMediaUploadedDocument(
+                file=self.file,
+                mime_type=self.mime_type,
+                attributes=list(self.attributes or []),
+            )
+        return self.file
+
+
+def _file_name(message: Any) -> str:
+    """Имя файла с расширением: по нему Telethon решает, фото это или документ"""
+    file = message.file
+    name = getattr(file, 'name', None) if file else None
+    if name:
+        return name
+    ext = getattr(file, 'ext', None) or ('.jpg' if message.photo else '')
+    return f"{message.id}{ext}"
+
+
+async def _tee(chunks: AsyncIterator[bytes], writer: CacheWriter) -> AsyncIterator[bytes]:
+    """Пропускает куски дальше, попутно записывая их в кэш"""
+    try:
+        async for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+    finally:
+        aclose = getattr(chunks, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+
+async def relay_media(
+    source: Any, target: Any, message: Any, chunk_size: int = CHUNK_SIZE,
+    cache: Optional[MediaCache] = None,
+) -> RelayedMedia:
+    """
+    Передает медиа сообщения от клиента-источника клиенту-получателю.
+
+    Если оба клиента - один аккаунт, ссылка на файл переиспользуется
+    без скачивания. Иначе документ скачивается кусками и одновременно
+    загружается получателем, так что память ограничена парой кусков,
+    а временные файлы не нужны. Фото (не больше 10 МБ) скачиваются в память.
+
+    С кэшем повторный файл (например, репост) отправляется по ссылке
+    на уже загруженный получателем файл, а если ссылки нет - загружается
+    с диска без скачивания.
+
+    Args:
+        source: Клиент, видевший сообщение (пользователь)
+        target: Клиент, который будет отправлять (бот)
+        message: Сообщение Telethon с медиа
+        chunk_size: Размер куска в байтах (кратен 1 КБ, не больше 512 КБ)
+        cache: Кэш медиа
+
+    Returns:
+        RelayedMedia: Загруженный файл и параметры для send_file
+    """
+    started = time.monotonic()
+    if account_key(source) == account_key(target):
+        return RelayedMedia(file=message.media, reused=True)
+
+    name = _file_name(message)
+    document = message.document
+    size = getattr(message.file, 'size', None)
+    key = media_key(message) if cache is not None else None
+    kwargs: Dict[str, Any] = {}
+    if document is not None:
+        kwargs = {'attributes': list(document.attributes), 'mime_type': document.mime_type}
+
+    if key is not None:
+        handle = cache.get_handle(target, key)
+        if handle is not None:
+            logger.info(f"Медиа {name} уже загружено ботом, отправляем по ссылке")
+            return RelayedMedia(file=handle, size=size or 0, key=key, cached=True, **kwargs)
+
+        path = cache.path(key)
+        if path is not None:
+            uploaded = await target.upload_file(
+                str(path), file_name=name, part_size_kb=chunk_size // 1024
+            )
+            cache.remember_upload(target, key, uploaded)
+            return RelayedMedia(
+                file=uploaded, size=path.stat().st_size, key=key,
+                elapsed=time.monotonic() - started, **kwargs,
+            )
+
+    if document is None or not size:
+        # Размер фото заранее точно не известен, а сами фото небольшие
+        data = await source.download_media(message, file=bytes)
+        uploaded = await target.upload_file(data, file_name=name)
+        if key is not None:
+            cache.store(key, data)
+            cache.remember_upload(target, key, uploaded)
+        return RelayedMedia(
+            file=uploaded, size=len(data), peak_buffer=len(data), key=key,
+            elapsed=time.monotonic() - started, **kwargs,
+        )
+
+    chunks = source.iter_download(message.media, request_size=chunk_size)
+    writer = cache.open_writer(key, size) if key is not None else None
+    if writer is not None:
+        chunks = _tee(chunks, writer)
+    stream = ChunkStream(chunks, size, name)
+    try:
+        uploaded = await target.upload_file(
+            stream, file_size=size, file_name=name, part_size_kb=chunk_size // 1024
+        )
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        await stream.close()
+
+    if writer is not None:
+        writer.commit()
+    if key is not None:
+        cache.remember_upload(target, key, uploaded)
+
+    relayed = RelayedMedia(
+        file=uploaded,
+        size=size,
+        peak_buffer=stream.peak_buffer,
+        elapsed=time.monotonic() - started,
+        key=key,
+        **kwargs,
+    )
+    logger.info(
+        f"Медиа {name} ({size} байт) передано потоком за {relayed.elapsed:.2f} сек, "
+        f"пик буфера {relayed.peak_buffer} байт"
+    )
+    return relayed
+
+
+async def send_media(
+    source: Any, target: Any, peer: Any, message: Any,
+    cache: Optional[MediaCache] = None, **kwargs: Any
+) -> Any:
+    """
+    Передает медиа сообщения и отправляет его клиентом-получателем.
+
+    Если сохраненная в кэше ссылка больше не принимается Telegram,
+    она забывается, а файл передается заново.
+
+    Args:
+        source: Клиент, видевший сообщение (пользователь)
+        target: Клиент, который отправляет (бот)
+        peer: Куда отправлять
+        message: Сообщение Telethon с медиа
+        cache: Кэш медиа
+        **kwargs: Остальные аргументы send_file (caption, parse_mode и т.д.)
+
+    Returns:
+        Отправленное сообщение
+    """
+    relayed = await relay_media(source, target, message, cache=cache)
+    try:
+        sent = await target.send_file(peer, relayed.file, **relayed.send_kwargs(), **kwargs)
+    except STALE_HANDLE_ERRORS as e:
+        if not relayed.cached:
+            raise
+        logger.warning(f"Ссылка на медиа {relayed.key} устарела ({e}), передаем файл заново")
+        cache.forget_handle(target, relayed.key)
+        relayed = await relay_media(source, target, message, cache=cache)
+        sent = await target.send_file(peer, relayed.file, **relayed.send_kwargs(), **kwargs)
+
+    if relayed.key is not None:
+        # Ссылка из свежего сообщения содержит актуальный file_reference
+        cache.remember_sent(target, relayed.key, sent)
+    return sent
+
+
+async def send_album(
+    source: Any, target: Any, peer: Any, parts: List[Any],
+    cache: Optional[MediaCache] = None, **kwargs: Any
+) -> List[Any]:
+    """
+    Передает медиа всех частей альбома и отправляет их одним альбомом.
+
+    Части передаются параллельно, а отправляются одним вызовом send_file
+    со списком файлов (messages.sendMultiMedia). Подпись из kwargs
+    достается первой части.
+
+    Args:
+        source: Клиент, видевший сообщения (пользователь)
+        target: Клиент, который отправляет (бот)
+        peer: Куда отправлять
+        parts: Части альбома с медиа, по порядку
+        cache: Кэш медиа
+        **kwargs: Остальные аргументы send_file (caption, parse_mode и т.д.)
+
+    Returns:
+        List[Any]: Отправленные сообщения
+    """
+    if len(parts) == 1:
+        return [await send_media(source, target, peer, parts[0], cache=cache, **kwargs)]
+
+    async def relay_all() -> List[RelayedMedia]:
+        return list(await asyncio.gather(
+            *(relay_media(source, target, part, cache=cache) for part in parts)
+        ))
+
+    relayed = await relay_all()
+    try:
+        sent = await target.send_file(peer, [item.album_media() for item in relayed], **kwargs)
+    except STALE_HANDLE_ERRORS as e:
+        stale = [item for item in relayed if item.cached]
+        if not stale:
+            raise
+        logger.warning(f"Ссылки на медиа альбома устарели ({e}), передаем файлы заново")
+        for item in stale:
+            cache.forget_handle(target, item.key)
+        relayed = await relay_all()
+        sent = await target.send_file(peer, [item.album_media() for item in relayed], **kwargs)
+
+    if not isinstance(sent, list):
+        sent = [sent]
+    for item, message in zip(relayed, sent):
+        if item.key is not None:
+            cache.remember_sent(target, item.key, message)
+    logger.info(f"Альбом из {len(parts)} частей отправлен одним запросом")
+    return sent
@@ -1,87 +1,96 @@
-import json
 import logging
 import logging.config
 import time
-from typing import List, Set
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 import asyncio
 import random
 import re
 
 from telethon import TelegramClient
-from telethon.tl.types import Message, Channel
+from telethon.tl.types import Message, InputPeerChannel
 from telethon.errors import FloodWaitError, ChatAdminRequiredError
 
 from config.settings import PARSER, LOGGING
 from .models import ParsedMessage
-from .classifiers import find_tags, is_hot_content
-from .summarizer import create_short_title
+from .enrichment import MessageAnalysis, analyze_many, analyze_text, city_from_lowered
+from .enrichment_pool import EnrichmentPool
+from .throttle import AccountThrottle, get_account_throttle
+from .watermarks import HighWaterMarks
+from .dedup import DedupStore, open_dedup_store
+from .entity_cache import EntityCache, account_key
+from .sharding import ShardScheduler
 
 # Настройка логирования
 logging.config.dictConfig(LOGGING)
 logger = logging.getLogger('parser')
 
+# Максимум сообщений, который Telegram отдает за один запрос истории
+HISTORY_PAGE_SIZE = 100
+
 def extract_city(text: str) -> str:
     """Извлекает город из текста или возвращает Москву по умолчанию"""
-    # Список городов для поиска
-    cities = ["Москва", "Санкт-Петербург", "Спб", "СПб", "Питер"]
-    
-    # Нормализуем текст
-    text = text.lower()
-    
-    for city in cities:
-        if city.lower() in text:
-            if city.lower() in ["спб", "питер"]:
-                return "Санкт-Петербург"
-            return city
-    
-    return "Москва"  # По умолчанию
+    return city_from_lowered(text.lower())
 
-def load_processed_ids() -> Set[int]:
-    """Загружает ID обработанных сообщений из файла"""
-    try:
-        if PARSER['processed_file'].exists():
-            with open(PARSER['processed_file'], 'r') as f:
-                return set(json.load(f))
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        logger.error(f"Ошибка загрузки {PARSER['processed_file']}: {e}")
-    return set()
-
-def save_processed_ids(processed_ids: Set[int]) -> None:
-    """Сохраняет ID обработанных сообщений в файл"""
-    PARSER['processed_file'].parent.mkdir(exist_ok=True)
-    try:
-        with open(PARSER['processed_file'], 'w') as f:
-            json.dump(list(processed_ids), f, indent=4)
-    except IOError as e:
-        logger.error(f"Ошибка сохранения {PARSER['processed_file']}: {e}")
+def open_processed_store() -> DedupStore:
+    """Открывает хранилище обработанных сообщений, перенося старый processed.json"""
+    return open_dedup_store(
+        PARSER['dedup_file'],
+        ttl=PARSER['dedup_ttl_days'] * 24 * 60 * 60,
+        legacy_path=PARSER['processed_file'],
+    )
+
+def open_entity_cache() -> EntityCache:
+    """Открывает постоянный кэш сущностей (загружает свежие записи в память)"""
+    return EntityCache(
+        PARSER['entity_cache_file'],
+        ttl=PARSER['entity_cache_ttl_hours'] * 60 * 60,
+        max_size=PARSER['entity_cache_size'],
+    )
+
+def message_text(message: Message) -> str:
+    """Текст или подпись сообщения"""
+    message_text = message.text if hasattr(message, 'text') else ""
+    message_caption = message.caption if hasattr(message, 'caption') else ""
+    return message_text or message_caption or ""
+
+async def analyze_texts(texts: List[str], pool: Optional[EnrichmentPool] = None) -> List[MessageAnalysis]:
+    """
+    Разбирает пачку текстов в пуле процессов или, без пула, в текущем потоке.
+    
+    Args:
+        texts: Тексты сообщений
+        pool: Пул процессов разбора
+        
+    Returns:
+        List[MessageAnalysis]: Результаты в порядке входных текстов
+    """
+    if pool is not None:
+        try:
+            return await pool.analyze_many(texts)
+        except Exception as e:
+            logger.error(f"Пул разбора недоступен, разбираем в текущем процессе: {e}")
+    return analyze_many(texts)
 
-async def process_message(message: Message, source: str) -> ParsedMessage:
+async def process_message(
+    message: Message, source: str, analysis: Optional[MessageAnalysis] = None
+) -> ParsedMessage:
     """
     Обрабатывает отдельное сообщение из канала.
     
     Args:
         message: Объект сообщения Telegram
         source: Имя канала-источника
+        analysis: Готовый разбор текста (например, из пула процессов)
         
     Returns:
         ParsedMessage: Обработанное сообщение
     """
-    # Получаем текст сообщения
-    message_text = message.text if hasattr(message, 'text') else ""
-    message_caption = message.caption if hasattr(message, 'caption') else ""
-    full_text = message_text or message_caption or ""
-    
-    # Определяем город
-    city = extract_city(full_text)
+    full_text = message_text(message)
     
-    # Находим теги
-    tags = list(find_tags(full_text))
-    
-    # Определяем, горячее ли предложение
-    is_hot = is_hot_content(tags)
-    
-    # Создаем короткое описание
-    short = create_short_title(full_text, tags, city)
+    # Город, теги, цены и краткое описание считаются за один разбор текста
+    if analysis is None:
+        analysis = analyze_text(full_text)
     
     # Формируем ссылку на сообщение
     link = f"https://t.me/{source.strip('@')}/{message.id}"
@@ -89,90 +98,342 @@ async def process_message(message: Message, source: str) -> ParsedMessage:
     return ParsedMessage(
         id=str(message.id),
         text=full_text,
-        city=city,
-        tags=tags,
-        is_hot=is_hot,
-        short=short,
+        city=analysis.city,
+        tags=analysis.tags,
+        is_hot=analysis.is_hot,
+        short=analysis.short,
         link=link,
         source=source
     )
 
-async def parse_channel(client: TelegramClient) -> List[ParsedMessage]:
+@dataclass
+class ChannelTiming:
+    """Время обработки канала: ожидание лимитов против полезной работы"""
+    channel: str
+    waiting: float = 0.0
+    working: float = 0.0
+    requests: int = 0
+    account: str = ''
+    flood_wait: float = 0.0
+
+# Время по каналам за последний запуск parse_channels
+channel_timings: Dict[str, ChannelTiming] = {}
+
+async def _fetch_history(
+    client: TelegramClient,
+    entity: InputPeerChannel,
+    limit: int,
+    throttle: AccountThrottle,
+    timing: ChannelTiming,
+    min_id: int = 0,
+) -> List[Message]:
     """
-    Парсит последние сообщения из целевых каналов.
+    Загружает последние сообщения канала постранично.
+    
+    Каждая страница - один запрос к API, и только перед ним берется
+    токен ограничителя частоты. Страницы идут от новых сообщений к старым
+    и останавливаются на min_id, поэтому после простоя догоняется
+    весь пропущенный хвост, но не больше limit сообщений.
     
     Args:
         client: Клиент Telegram
+        entity: Канал
+        limit: Сколько сообщений загрузить
+        throttle: Ограничения аккаунта
+        timing: Счетчики времени канала
+        min_id: Загружать только сообщения с ID больше этого
         
     Returns:
-        List[ParsedMessage]: Список обработанных сообщений
+        List[Message]: Сообщения от новых к старым
+    """
+    messages: List[Message] = []
+    offset_id = 0
+    
+    while len(messages) < limit:
+        page_size = min(HISTORY_PAGE_SIZE, limit - len(messages))
+        timing.waiting += await throttle.before_request()
+        timing.requests += 1
+        page = await client.get_messages(
+            entity, limit=page_size, offset_id=offset_id, min_id=min_id
+        )
+        
+        messages.extend(page)
+        if len(page) < page_size:
+            break
+        offset_id = page[-1].id
+    
+    return messages
+
+async def _parse_single_channel(
+    client: TelegramClient,
+    channel: str,
+    processed: DedupStore,
+    throttle: AccountThrottle,
+    watermarks: HighWaterMarks,
+    entities: EntityCache,
+    wait_on_flood: bool = True,
+    pool: Optional[EnrichmentPool] = None,
+) -> Tuple[List[ParsedMessage], ChannelTiming]:
+    """
+    Парсит последние сообщения одного канала.
+    
+    Каналы аккаунта читаются параллельно в пределах семафора throttle,
+    а FloodWaitError в любом из них приостанавливает все каналы аккаунта.
+    
+    Args:
+        client: Клиент Telegram
+        channel: Имя канала
+        processed: Хранилище обработанных сообщений
+        throttle: Ограничения аккаунта
+        watermarks: Последние обработанные ID по каналам
+        entities: Кэш сущностей (запрос к API только при промахе)
+        wait_on_flood: Ждать ли окончания FloodWait перед возвратом
+            (иначе канал можно сразу передать другому аккаунту)
+        pool: Пул процессов разбора текста (None - разбор в цикле событий)
+        
+    Returns:
+        Tuple[List[ParsedMessage], ChannelTiming]: Новые сообщения канала
+        в порядке получения и время ожидания/работы
     """
-    start_time = time.time()
-    processed_ids = load_processed_ids()
     new_messages: List[ParsedMessage] = []
+    timing = ChannelTiming(channel=channel)
     
-    for channel in PARSER['target_channels']:
+    async with throttle.semaphore:
+        started = time.monotonic()
         try:
-            # Добавляем небольшую задержку между каналами
-            await asyncio.sleep(random.uniform(PARSER['min_delay'], PARSER['max_delay']))
+            # Добавляем небольшую задержку перед каналом
+            delay = random.uniform(PARSER['min_delay'], PARSER['max_delay'])
+            await asyncio.sleep(delay)
+            timing.waiting += delay
             
             try:
-                entity = await client.get_entity(channel)
-                if not isinstance(entity, Channel):
+                cached = entities.get(client, channel)
+                if cached is None:
+                    timing.waiting += await throttle.before_request()
+                    timing.requests += 1
+                    cached = entities.put(client, await client.get_entity(channel))
+                    logger.info(f"Получена сущность канала {channel}")
+                if cached.kind != 'channel':
                     logger.warning(f"{channel} не является каналом, пропускаем")
-                    continue
-                    
-                logger.info(f"Получена сущность канала {channel}")
+                    return new_messages, timing
+                entity = cached.input_peer()
                 
-                count = 0
+                # Если канал уже читался, загружаем только новые сообщения
+                # (догоняя пропущенное страницами), иначе - последние message_limit
+                last_seen = watermarks.get(channel)
+                limit = PARSER['catchup_limit'] if last_seen else PARSER['message_limit']
+                messages = await _fetch_history(
+                    client, entity, limit, throttle, timing, min_id=last_seen
+                )
+                if last_seen and len(messages) >= limit:
+                    logger.warning(
+                        f"{channel}: новых сообщений больше {limit}, более старые пропущены"
+                    )
                 found = 0
                 
-                async for message in client.iter_messages(entity, limit=PARSER['message_limit']):
+                # Новые сообщения разбираются одной пачкой (в пуле, если он есть)
+                fresh = [
+                    message for message in messages
+                    if isinstance(message, Message) and not processed.contains(channel, message.id)
+                ]
+                analyses = await analyze_texts([message_text(message) for message in fresh], pool)
+                
+                for message, analysis in zip(fresh, analyses):
                     try:
-                        # Небольшая задержка между сообщениями
-                        await asyncio.sleep(random.uniform(0.5, 1))
-                        
-                        count += 1
-                        if count % 5 == 0:
-                            logger.info(f"Проверено {count}/{PARSER['message_limit']} сообщений...")
-                        
-                        if isinstance(message, Message) and message.id not in processed_ids:
-                            parsed_message = await process_message(message, channel)
-                            new_messages.append(parsed_message)
-                            processed_ids.add(message.id)
-                            found += 1
-                            logger.info(f"Найдено новое сообщение: ID {message.id} ({found} всего)")
+                        parsed_message = await process_message(message, channel, analysis)
+                        new_messages.append(parsed_message)
+                        processed.add(channel, message.id)
+                        found += 1
+                        logger.info(f"{channel}: найдено новое сообщение ID {message.id} ({found} всего)")
                             
-                    except FloodWaitError as e:
-                        logger.warning(f"Превышен лимит запросов, ожидаем {e.seconds} секунд")
-                        await asyncio.sleep(e.seconds)
                     except Exception as e:
                         logger.error(f"Ошибка обработки сообщения: {e}")
                         continue
+                
+                if messages:
+                    watermarks.advance(channel, max(message.id for message in messages))
                         
             except ChatAdminRequiredError:
                 logger.error(f"Бот должен быть администратором канала {channel}")
-                continue
+                return new_messages, timing
             except FloodWaitError as e:
-                logger.warning(f"Превышен лимит запросов для канала {channel}, ожидаем {e.seconds} секунд")
-                await asyncio.sleep(e.seconds)
-                continue
+                logger.warning(
+                    f"Превышен лимит запросов для канала {channel}, "
+                    f"все каналы аккаунта ожидают {e.seconds} секунд"
+                )
+                throttle.flood_gate.block(e.seconds)
+                timing.flood_wait = e.seconds
+                if wait_on_flood:
+                    timing.waiting += await throttle.flood_gate.wait()
+                return new_messages, timing
             except Exception as e:
                 logger.error(f"Ошибка при получении доступа к каналу {channel}: {e}")
-                continue
+                return new_messages, timing
                 
-            logger.info(f"Проверка канала {channel} завершена. Найдено: {found} сообщений")
+            logger.info(
+                f"Проверка канала {channel} завершена. Проверено: {len(messages)}, "
+                f"найдено: {found} сообщений"
+            )
             
         except Exception as e:
             logger.error(f"Ошибка парсинга канала {channel}: {e}")
-            continue
+        finally:
+            timing.working = max(0.0, time.monotonic() - started - timing.waiting)
+    
+    return new_messages, timing
+
+async def _parse_sharded_channel(
+    channel: str,
+    accounts: Dict[str, TelegramClient],
+    scheduler: ShardScheduler,
+    processed: DedupStore,
+    watermarks: HighWaterMarks,
+    entities: EntityCache,
+    pool: Optional[EnrichmentPool] = None,
+) -> Tuple[List[ParsedMessage], ChannelTiming]:
+    """
+    Парсит канал аккаунтом, который выберет scheduler.
+    
+    Если аккаунт получил FloodWait, канал сразу передается следующему
+    по кольцу аккаунту. Последний из аккаунтов, как и единственный,
+    дожидается окончания паузы, а канал дочитывается при следующем запуске.
+    
+    Args:
+        channel: Имя канала
+        accounts: Клиенты по ключам аккаунтов
+        scheduler: Распределение каналов по аккаунтам
+        processed: Хранилище обработанных сообщений
+        watermarks: Последние обработанные ID по каналам
+        entities: Кэш сущностей
+        pool: Пул процессов разбора текста
+        
+    Returns:
+        Tuple[List[ParsedMessage], ChannelTiming]: Новые сообщения канала и время
+    """
+    tried: List[str] = []
+    spent = ChannelTiming(channel=channel)
+    while True:
+        account = scheduler.assign(channel, exclude=tried)
+        tried.append(account)
+        last = len(tried) == len(accounts)
+        messages, timing = await _parse_single_channel(
+            accounts[account], channel, processed, scheduler.throttles[account],
+            watermarks, entities, wait_on_flood=last, pool=pool,
+        )
+        # Время и запросы прошлых попыток тоже относятся к каналу
+        timing.account = account
+        timing.waiting += spent.waiting
+        timing.working += spent.working
+        timing.requests += spent.requests
+        if not timing.flood_wait or last:
+            return messages, timing
+        spent = timing
+        logger.info(f"{channel}: аккаунт {account} ждет FloodWait, канал передан другому аккаунту")
+
+async def parse_channels(
+    accounts: Dict[str, TelegramClient],
+    concurrency: Optional[int] = None,
+    pool: Optional[EnrichmentPool] = None,
+) -> List[ParsedMessage]:
+    """
+    Парсит последние сообщения из целевых каналов несколькими аккаунтами.
+    
+    Каналы распределяются между аккаунтами консистентным хешированием,
+    у каждого аккаунта свои лимиты, поэтому пропускная способность растет
+    примерно пропорционально числу аккаунтов. Каналы аккаунта в FloodWait
+    временно читают другие аккаунты. Порядок сообщений внутри канала
+    и порядок каналов в результате сохраняются.
+    
+    Args:
+        accounts: Клиенты по ключам аккаунтов
+        concurrency: Число одновременно читаемых каналов на аккаунт;
+            по умолчанию PARSER['channel_concurrency']
+        pool: Пул процессов разбора текста; если не передан и
+            PARSER['enrichment_workers'] > 0, создается на время вызова
+        
+    Returns:
+        List[ParsedMessage]: Список обработанных сообщений
+    """
+    start_time = time.time()
+    
+    owns_pool = pool is None and PARSER.get('enrichment_workers', 0) > 0
+    if owns_pool:
+        pool = EnrichmentPool(PARSER['enrichment_workers'], PARSER.get('enrichment_batch_size', 64))
+        await pool.start()
+    
+    if concurrency is None:
+        concurrency = PARSER.get('channel_concurrency', 1)
+    throttles = {
+        account: get_account_throttle(
+            client,
+            concurrency,
+            rate=PARSER.get('requests_per_second', 0),
+            burst=PARSER.get('request_burst', 1),
+        )
+        for account, client in accounts.items()
+    }
+    scheduler = ShardScheduler(throttles)
+    channels = PARSER['target_channels']
+    if len(accounts) > 1:
+        plan = scheduler.plan(channels)
+        logger.info(
+            "Каналы по аккаунтам: "
+            + ", ".join(f"{account}: {len(assigned)}" for account, assigned in plan.items())
+        )
+    
+    watermarks = HighWaterMarks(PARSER['watermarks_file'])
     
-    if new_messages:
-        save_processed_ids(processed_ids)
-        logger.info(f"Сохранено {len(processed_ids)} ID обработанных сообщений")
+    try:
+        with open_processed_store() as processed, open_entity_cache() as entities:
+            results = await asyncio.gather(*(
+                _parse_sharded_channel(channel, accounts, scheduler, processed, watermarks, entities, pool)
+                for channel in channels
+            ))
+            expired = processed.expire()
+            entities.expire()
+    finally:
+        if owns_pool:
+            await pool.aclose()
+    watermarks.save()
+    
+    new_messages: List[ParsedMessage] = [
+        message for channel_messages, _ in results for message in channel_messages
+    ]
+    
+    channel_timings.clear()
+    for _, timing in results:
+        channel_timings[timing.channel] = timing
+        logger.info(
+            f"{timing.channel} ({timing.account}): ожидание {timing.waiting:.2f} сек, "
+            f"работа {timing.working:.2f} сек, запросов {timing.requests}"
+        )
+    
+    logger.info(
+        f"Отмечено {len(new_messages)} новых сообщений, удалено устаревших отметок: {expired}"
+    )
     
     total_time = time.time() - start_time
     logger.info(f"Парсинг завершен за {total_time:.2f} сек")
     
     # Возвращаем сообщения в обратном порядке (новые первыми)
-    return new_messages[::-1] 
\ No newline at end of file
+    return new_messages[::-1]
+
+async def parse_channel(
+    client: TelegramClient, concurrency: Optional[int] = None
+) -> List[ParsedMessage]:
+    """
+    Парсит последние сообщения из целевых каналов одним аккаунтом.
+    
+    Каналы читаются параллельно, но не более concurrency одновременно
+    на аккаунт. Порядок сообщений внутри канала и порядок каналов
+    в результате сохраняются.
+    
+    Args:
+        client: Клиент Telegram
+        concurrency: Число одновременно читаемых каналов;
+            по умолчанию PARSER['channel_concurrency']
+        
+    Returns:
+        List[ParsedMessage]: Список обработанных сообщений
+    """
+    return await parse_channels({account_key(client): client}, concurrency)
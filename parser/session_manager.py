@@ -79,6 +79,28 @@ class SessionStorage:
             logger.error(f"Ошибка при загрузке сессии: {e}")
             return None
             
+    def load_sessions(self, max_age_days=7):
+        """Возвращает строки всех неустаревших сессий: {хеш телефона: строка сессии}"""
+        try:
+            if not self.session_file.exists():
+                return {}
+                
+            with open(self.session_file, 'r') as f:
+                data = json.load(f)
+                
+            sessions = {}
+            for phone_hash, session_data in data.items():
+                last_updated = datetime.fromisoformat(session_data['last_updated'])
+                if datetime.now() - last_updated > timedelta(days=max_age_days):
+                    logger.warning(f"Сессия {phone_hash[:8]} устарела")
+                    continue
+                if session_data.get('session_string'):
+                    sessions[phone_hash] = session_data['session_string']
+            return sessions
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке сессий: {e}")
+            return {}
+            
     def clear_session(self, phone):
         """Очищает данные сессии"""
         try:
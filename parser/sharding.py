@@ -0,0 +1,168 @@
+import bisect
+import hashlib
+from typing import Any, Collection, Dict, Iterable, List, Optional, Tuple
+
+from .throttle import AccountThrottle
+
+# Сколько точек на кольце у каждого аккаунта: чем больше, тем ровнее
+# делятся каналы между аккаунтами
+DEFAULT_REPLICAS = 100
+
+
+def _hash(key: str) -> int:
+    """Позиция ключа на кольце (64 бита blake2b)"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+class HashRing:
+    """
+    Консистентное хеширование ключей по узлам.
+
+    Каждый узел занимает replicas точек на кольце, ключ принадлежит
+    первому узлу по часовой стрелке от своей позиции. При добавлении
+    или удалении узла переезжает только около 1/N ключей.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = DEFAULT_REPLICAS):
+        """
+        Args:
+            nodes: Узлы (например, ключи аккаунтов)
+            replicas: Точек на кольце на один узел
+        """
+        self.replicas = max(1, replicas)
+        self._points: List[Tuple[int, str]] = []
+        self._nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    @property
+    def nodes(self) -> List[str]:
+        """Узлы кольца"""
+        return list(self._nodes)
+
+    def add(self, node: str) -> None:
+        """Добавляет узел"""
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for replica in range(self.replicas):
+            bisect.insort(self._points, (_hash(f"{node}#{replica}"), node))
+
+    def remove(self, node: str) -> None:
+        """Удаляет узел"""
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        self._points = [point for point in self._points if point[1] != node]
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает узел, которому принадлежит ключ.
+
+        Args:
+            key: Ключ (например, имя канала)
+
+        Returns:
+            Optional[str]: Узел или None, если кольцо пустое
+        """
+        nodes = self.preference(key)
+        return nodes[0] if nodes else None
+
+    def preference(self, key: str) -> List[str]:
+        """
+        Возвращает все узлы в порядке обхода кольца от позиции ключа.
+
+        Первый - владелец ключа, следующие - запасные на случай его недоступности.
+
+        Args:
+            key: Ключ
+
+        Returns:
+            List[str]: Узлы без повторов
+        """
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, (_hash(key), ''))
+        order: List[str] = []
+        for offset in range(len(self._points)):
+            node = self._points[(start + offset) % len(self._points)][1]
+            if node not in order:
+                order.append(node)
+                if len(order) == len(self._nodes):
+                    break
+        return order
+
+
+class ShardScheduler:
+    """
+    Распределение каналов между аккаунтами.
+
+    Канал закреплен за аккаунтом через консистентное хеширование, поэтому
+    между запусками читается одним и тем же аккаунтом (его кэш сущностей
+    остается теплым). Пока аккаунт ждет окончания FloodWait, его каналы
+    достаются следующим по кольцу свободным аккаунтам, а после паузы
+    возвращаются владельцу.
+    """
+
+    def __init__(self, throttles: Dict[str, AccountThrottle], replicas: int = DEFAULT_REPLICAS):
+        """
+        Args:
+            throttles: Ограничения аккаунтов по их ключам
+            replicas: Точек на кольце на один аккаунт
+        """
+        self.throttles = throttles
+        self.ring = HashRing(sorted(throttles), replicas=replicas)
+
+    def owner(self, channel: str) -> Optional[str]:
+        """Аккаунт, за которым закреплен канал"""
+        return self.ring.get(_channel_key(channel))
+
+    def assign(self, channel: str, exclude: Collection[str] = ()) -> Optional[str]:
+        """
+        Выбирает аккаунт для чтения канала сейчас.
+
+        Берется первый по кольцу аккаунт без FloodWait; если пауза у всех,
+        то аккаунт, чья пауза закончится раньше.
+
+        Args:
+            channel: Имя канала
+            exclude: Аккаунты, которые уже пробовали
+
+        Returns:
+            Optional[str]: Ключ аккаунта или None, если пробовали все
+        """
+        candidates = [
+            account for account in self.ring.preference(_channel_key(channel))
+            if account not in exclude
+        ]
+        if not candidates:
+            return None
+        for account in candidates:
+            if self.throttles[account].flood_gate.remaining <= 0:
+                return account
+        return min(candidates, key=lambda account: self.throttles[account].flood_gate.remaining)
+
+    def plan(self, channels: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Текущее распределение каналов по аккаунтам.
+
+        Args:
+            channels: Имена каналов
+
+        Returns:
+            Dict[str, List[str]]: Каналы каждого аккаунта
+        """
+        plan: Dict[str, List[str]] = {account: [] for account in self.ring.nodes}
+        for channel in channels:
+            account = self.assign(channel)
+            if account is not None:
+                plan[account].append(channel)
+        return plan
+
+
+def _channel_key(channel: Any) -> str:
+    """Один ключ для @name, name и разного регистра"""
+    return str(channel).lstrip('@').lower()
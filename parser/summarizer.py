@@ -1,8 +1,96 @@
 import re
-from typing import List, Optional
-from .classifiers import extract_price, TAG_RULES
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from .classifiers import extract_price, PRICE_PATTERN, TAG_RULES
 
-def create_short_title(text: str, tags: List[str], city: str) -> str:
+MONTHS = (
+    "января|февраля|марта|апреля|мая|июня|"
+    "июля|августа|сентября|октября|ноября|декабря"
+)
+
+# Дата: день и месяц. Предлог перед датой проверяется отдельно (см. _date_kind),
+# чтобы шаблон начинался с цифры и regex-движок быстро пропускал остальной текст
+DATE_PATTERN = rf'(?P<date>\d{{1,2}}\s*(?:{MONTHS}))'
+_DATE_RE = re.compile(DATE_PATTERN, re.IGNORECASE)
+
+# После числа идет либо валюта, либо месяц, поэтому цены и даты
+# не пересекаются и ищутся одним проходом. Опережающая проверка (?=\d)
+# возвращает движку быстрый пропуск до цифры, который теряется на альтернативе
+_PRICE_DATE_RE = re.compile(rf'(?=\d)(?:{PRICE_PATTERN}|{DATE_PATTERN})', re.IGNORECASE)
+
+_SENTENCE_END_RE = re.compile(r'[.!?\n]+')
+
+@dataclass
+class PriceDateScan:
+    """Цены и даты, найденные за один проход по тексту"""
+    prices: List[int]
+    date_spans: List[Tuple[int, int]]
+    date: Optional[str]
+
+def _date_kind(text: str, start: int) -> str:
+    """
+    Определяет предлог перед датой.
+    
+    Returns:
+        str: 'until' для "до/по", 'since' для "с/начиная с", иначе пустая строка
+    """
+    end = start
+    while end and text[end - 1].isspace():
+        end -= 1
+    if end == start:
+        return ''
+    if text[max(end - 2, 0):end].lower() in ('до', 'по'):
+        return 'until'
+    if text[end - 1].lower() == 'с':
+        return 'since'
+    return ''
+
+def _pick_date(text: str, spans: List[Tuple[int, int]]) -> Optional[str]:
+    """
+    Выбирает основную дату: сначала срок "до/по", затем начало "с",
+    затем первая упомянутая дата.
+    """
+    if not spans:
+        return None
+    
+    kinds = [_date_kind(text, start) for start, _ in spans]
+    for kind in ('until', 'since'):
+        if kind in kinds:
+            start, end = spans[kinds.index(kind)]
+            return text[start:end]
+    
+    start, end = spans[0]
+    return text[start:end]
+
+def scan_prices_and_dates(text: str) -> PriceDateScan:
+    """
+    Находит цены и даты в тексте за один проход.
+    
+    Args:
+        text: Текст для анализа
+        
+    Returns:
+        PriceDateScan: Отсортированные цены, позиции дат и основная дата
+    """
+    prices = []
+    date_spans = []
+    
+    for match in _PRICE_DATE_RE.finditer(text):
+        price = match.group('price')
+        if price is not None:
+            prices.append(int(price))
+        else:
+            date_spans.append(match.span('date'))
+    
+    return PriceDateScan(
+        prices=sorted(prices),
+        date_spans=date_spans,
+        date=_pick_date(text, date_spans),
+    )
+
+def create_short_title(
+    text: str, tags: List[str], city: str, prices: Optional[List[int]] = None
+) -> str:
     """
     Создает краткий заголовок для сообщения.
     
@@ -10,17 +98,19 @@ def create_short_title(text: str, tags: List[str], city: str) -> str:
         text: Исходный текст сообщения
         tags: Список тегов
         city: Город
+        prices: Уже найденные цены; если не переданы, извлекаются из текста
         
     Returns:
         str: Краткий заголовок с эмодзи и ценой
     """
     # Извлекаем цены
-    prices = extract_price(text)
+    if prices is None:
+        prices = extract_price(text)
     min_price = min(prices) if prices else None
     
-    # Находим ключевые части текста
-    sentences = re.split(r'[.!?\n]+', text)
-    first_sentence = sentences[0].strip() if sentences else text
+    # Первое предложение - текст до первого знака конца предложения
+    sentence_end = _SENTENCE_END_RE.search(text)
+    first_sentence = (text[:sentence_end.start()] if sentence_end else text).strip()
     
     # Ограничиваем длину первого предложения
     if len(first_sentence) > 100:
@@ -46,20 +136,5 @@ def extract_date_info(text: str) -> Optional[str]:
     Returns:
         Optional[str]: Найденная дата или None
     """
-    months = (
-        "января|февраля|марта|апреля|мая|июня|"
-        "июля|августа|сентября|октября|ноября|декабря"
-    )
-    
-    date_patterns = [
-        rf'(?:до|по)\s+(\d{{1,2}}(?:\s+)?(?:{months}))',
-        rf'(?:с|начиная с)\s+(\d{{1,2}}(?:\s+)?(?:{months}))',
-        rf'(\d{{1,2}}(?:\s+)?(?:{months}))',
-    ]
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1)
-    
-    return None 
\ No newline at end of file
+    spans = [match.span() for match in _DATE_RE.finditer(text)]
+    return _pick_date(text, spans)
@@ -0,0 +1,158 @@
+import asyncio
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any
+
+
+class FloodGate:
+    """
+    Общая пауза для всех запросов аккаунта.
+
+    Когда любой канал получает FloodWaitError, ворота закрываются на
+    указанное время, и остальные каналы ждут перед следующим запросом.
+    """
+
+    def __init__(self):
+        self._resume_at = 0.0
+
+    @property
+    def remaining(self) -> float:
+        """Сколько секунд осталось до открытия ворот"""
+        return max(0.0, self._resume_at - time.monotonic())
+
+    def block(self, seconds: float) -> None:
+        """
+        Закрывает ворота на seconds секунд (не сокращая уже назначенную паузу).
+
+        Args:
+            seconds: Длительность паузы из FloodWaitError
+        """
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def wait(self) -> float:
+        """
+        Ждет открытия ворот.
+
+        Returns:
+            float: Сколько секунд пришлось ждать
+        """
+        waited = 0.0
+        # Паузу могут продлить, пока мы спим, поэтому проверяем повторно
+        while True:
+            delay = self.remaining
+            if delay <= 0:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов по алгоритму token bucket.
+
+    Токен расходуется на каждый реальный запрос к API, а не на локальную
+    обработку, поэтому разбор уже полученных сообщений не тормозится.
+    Допускается всплеск до capacity запросов, дальше - rate запросов в секунду.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        Args:
+            rate: Запросов в секунду (0 - без ограничения)
+            capacity: Размер всплеска
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """
+        Забирает токен, при необходимости дожидаясь его.
+
+        Токен резервируется сразу (баланс может уйти в минус), поэтому
+        конкурирующие задачи обслуживаются в порядке обращения.
+
+        Returns:
+            float: Сколько секунд пришлось ждать
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        self._refill()
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+
+        delay = -self._tokens / self.rate
+        await asyncio.sleep(delay)
+        return delay
+
+
+@dataclass
+class AccountThrottle:
+    """Ограничения запросов одного аккаунта Telegram"""
+    concurrency: int
+    pacer: TokenBucket = field(default_factory=lambda: TokenBucket(rate=0))
+    semaphore: asyncio.Semaphore = field(init=False)
+    flood_gate: FloodGate = field(default_factory=FloodGate)
+
+    def __post_init__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def before_request(self) -> float:
+        """
+        Ждет разрешения на запрос к API: окончания FloodWait и свободного токена.
+
+        Returns:
+            float: Сколько секунд пришлось ждать
+        """
+        waited = await self.flood_gate.wait()
+        waited += await self.pacer.acquire()
+        return waited
+
+
+# Ограничения привязаны к клиенту и исчезают вместе с ним
+_throttles: "weakref.WeakKeyDictionary[Any, AccountThrottle]" = weakref.WeakKeyDictionary()
+
+
+def get_account_throttle(
+    client: Any, concurrency: int = 1, rate: float = 0, burst: float = 1
+) -> AccountThrottle:
+    """
+    Возвращает ограничения для аккаунта клиента, создавая их при первом обращении.
+
+    Все вызовы с одним клиентом делят семафор и паузу после FloodWait,
+    даже если парсинг запущен несколько раз одновременно.
+
+    Args:
+        client: Клиент Telegram (один клиент - один аккаунт)
+        concurrency: Сколько каналов аккаунт может читать одновременно
+        rate: Запросов к API в секунду (0 - без ограничения)
+        burst: Сколько запросов можно сделать подряд без ожидания
+
+    Returns:
+        AccountThrottle: Ограничения аккаунта
+    """
+    concurrency = max(1, concurrency)
+    throttle = _throttles.get(client)
+    if throttle is None:
+        throttle = _throttles[client] = AccountThrottle(
+            concurrency=concurrency, pacer=TokenBucket(rate, burst)
+        )
+    elif (throttle.concurrency, throttle.pacer.rate, throttle.pacer.capacity) != (
+        concurrency, rate, max(1.0, burst)
+    ):
+        # Новые лимиты, но пауза после FloodWait сохраняется
+        throttle = _throttles[client] = AccountThrottle(
+            concurrency=concurrency,
+            pacer=TokenBucket(rate, burst),
+            flood_gate=throttle.flood_gate,
+        )
+    return throttle
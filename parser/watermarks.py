@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Union
+
+logger = logging.getLogger(__name__)
+
+
+class HighWaterMarks:
+    """
+    Последний обработанный ID сообщения по каждому каналу.
+
+    Используется как min_id при загрузке истории, чтобы из Telegram
+    приходили только сообщения новее уже обработанных.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path: JSON-файл, в котором хранятся отметки
+        """
+        self.path = Path(path)
+        self._marks: Dict[str, int] = self._load()
+        self._dirty = False
+
+    def _load(self) -> Dict[str, int]:
+        """Загружает отметки из файла"""
+        try:
+            if self.path.exists():
+                with open(self.path, 'r') as f:
+                    return {channel: int(message_id) for channel, message_id in json.load(f).items()}
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            logger.error(f"Ошибка загрузки {self.path}: {e}")
+        return {}
+
+    def get(self, channel: str) -> int:
+        """
+        Возвращает последний обработанный ID канала.
+
+        Args:
+            channel: Имя или ID канала
+
+        Returns:
+            int: ID сообщения или 0, если канал еще не читался
+        """
+        return self._marks.get(str(channel), 0)
+
+    def advance(self, channel: str, message_id: int) -> None:
+        """
+        Сдвигает отметку канала вперед (назад она никогда не двигается).
+
+        Args:
+            channel: Имя или ID канала
+            message_id: ID обработанного сообщения
+        """
+        if message_id > self.get(channel):
+            self._marks[str(channel)] = message_id
+            self._dirty = True
+
+    def save(self) -> None:
+        """Атомарно сохраняет отметки, если они изменились"""
+        if not self._dirty:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._marks, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except IOError as e:
+            logger.error(f"Ошибка сохранения {self.path}: {e}")
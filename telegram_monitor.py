@@ -2,10 +2,18 @@ import os
 import logging
 import asyncio
 import re
-from telethon import TelegramClient, events
+import socket
+from datetime import datetime, timedelta, timezone
+from telethon import events
 from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
 from dotenv import load_dotenv
-from db_manager import DatabaseManager
+from db_manager import DatabaseManager, AsyncDatabaseManager
+from parser.keyword_matcher import KeywordMatcher
+from parser.entity_cache import EntityCache
+from parser.media_cache import MediaCache
+from parser.album import AlbumAssembler, album_text
+from parser.clients import ClientRegistry
+from parser.media_relay import send_album
 
 # Настройка логирования
 logging.basicConfig(
@@ -17,52 +25,128 @@ logger = logging.getLogger(__name__)
 # Загрузка переменных окружения
 load_dotenv()
 
+# Как часто удалять устаревшие отметки об обработанных сообщениях (секунды)
+RETENTION_INTERVAL = 6 * 60 * 60
+
+# Как часто сверять версию справочников в базе: так воркеры в других
+# процессах видят изменения каналов и ключевых слов от админа (секунды)
+CATALOG_POLL_INTERVAL = 1
+
+# Срок аренды каналов воркером (секунды). Пульс продлевает аренду втрое
+# чаще, а каналы упавшего воркера переходят к другим не позже этого срока
+LEASE_TTL = 30
+
+# Сколько последних сообщений дочитать из канала, полученного от другого
+# воркера: пока канал был ничей, новые посты могли не дойти ни до кого.
+# Посты старше срока хранения отметок не дочитываются: их отметки и
+# закрепления пересылок уже удалены, и они были бы пересланы повторно
+TAKEOVER_BACKFILL = 20
+
+def monitored_chat_ids(channels):
+    """Возвращает множество chat_id каналов для проверки событий за O(1)"""
+    chat_ids = set()
+    for channel in channels:
+        try:
+            chat_ids.add(int(channel['channel_id']))
+        except (TypeError, ValueError):
+            logger.warning(f"Пропущен канал с нечисловым ID: {channel['channel_id']}")
+    return frozenset(chat_ids)
+
 class TelegramMonitor:
-    def __init__(self):
+    def __init__(self, db=None, clients=None, worker_id=None, adb=None):
         # Получение учетных данных
         self.api_id = int(os.getenv('API_ID'))
         self.api_hash = os.getenv('API_HASH')
         self.bot_token = os.getenv('BOT_TOKEN')
         self.output_channel = os.getenv('OUTPUT_CHANNEL')
         
-        # Инициализация базы данных
-        self.db = DatabaseManager()
+        # Инициализация базы данных (можно передать общий с ботом менеджер)
+        self._owns_db = db is None
+        self.db = db or DatabaseManager.from_env()
+        # Асинхронный доступ к базе: общий с ботом, если передан, иначе
+        # создается в run(), внутри цикла событий
+        self._owns_adb = adb is None
+        self.adb = adb
         
-        # Создание временной директории для медиа
-        if not os.path.exists('temp'):
-            os.makedirs('temp')
+        # Кэш сущностей, общий для обоих клиентов (тоже создается в run(),
+        # в потоке, где будет использоваться)
+        self.entity_cache_file = os.getenv('ENTITY_CACHE_FILE', 'data/entities.db')
+        self.entities = None
+        self.output_peer = None
         
-        # Клиенты для чтения и отправки
+        # Кэш медиа: репосты одного файла отправляются по ссылке на уже
+        # загруженный ботом файл или загружаются с диска без скачивания
+        self.media_cache_dir = os.getenv('MEDIA_CACHE_DIR', 'data/media')
+        self.media_cache_max_mb = int(os.getenv('MEDIA_CACHE_MAX_MB', 512))
+        self.media_cache = None
+        
+        # Сборщик альбомов: части с общим grouped_id обрабатываются одним постом
+        self.albums = AlbumAssembler(self.process_post)
+        
+        # Клиенты для чтения и отправки берутся из реестра (можно передать
+        # общий для процесса, тогда подключение делится с другими компонентами)
+        self._owns_clients = clients is None
+        self.clients = clients or ClientRegistry(
+            self.api_id, self.api_hash, self.bot_token,
+            user_session=os.getenv('USER_SESSION', 'user_session'),
+            bot_session=os.getenv('BOT_SESSION', 'bot_session'),
+        )
         self.user_client = None
         self.bot_client = None
         
-        # Кэш ключевых слов
+        # Кэш ключевых слов и скомпилированный поиск по ним. Версия справочников,
+        # из которой собран поиск, сверяется с базой на каждом событии
         self.keywords = []
+        self.keyword_matcher = KeywordMatcher([])
+        self.keywords_version = None
         self.refresh_keywords()
         
-    def refresh_keywords(self):
-        """Обновляет кэш ключевых слов из базы данных"""
-        self.keywords = [k['word'].lower() for k in self.db.get_all_keywords()]
-        logger.info(f"Загружены ключевые слова: {self.keywords}")
+        # Отслеживаемые чаты. Множество заменяется целиком, поэтому обработчик
+        # событий всегда видит либо старый, либо новый список, но не смесь
+        self.monitored_chats = frozenset()
+        self.catalog_chats = frozenset()
+        self.chats_version = None
+        
+        # Несколько воркеров (процессов или хостов с общей базой) делят каналы
+        # через аренду: каждый слушает только арендованные им каналы.
+        # None - аренда еще не получена, слушаются все каналы справочника
+        self.worker_id = worker_id or os.getenv('WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ttl = int(os.getenv('LEASE_TTL', LEASE_TTL))
+        self.leased_chats = None
+        
+    def refresh_keywords(self, catalog=None):
+        """Пересобирает поиск по ключевым словам из снимка справочников"""
+        catalog = catalog or self.db.get_catalog()
+        self.keywords = [k['word'].lower() for k in catalog.keywords]
+        self.keyword_matcher = KeywordMatcher(self.keywords)
+        self.keywords_version = catalog.version
+        logger.info(f"Загружено ключевых слов: {len(self.keyword_matcher)} (версия {catalog.version})")
+        
+    async def ensure_fresh_keywords(self):
+        """Пересобирает поиск, если админ изменил справочники (без перезапуска)"""
+        # catalog_version учитывает и изменения из других процессов: watch_catalog
+        # сверяет его с версией в базе каждые CATALOG_POLL_INTERVAL секунд
+        if self.keywords_version != self.db.catalog_version:
+            self.refresh_keywords(await self.adb.get_catalog())
         
     async def start_clients(self):
-        """Запускает клиентов для мониторинга и отправки сообщений"""
+        """Получает клиентов для мониторинга и отправки сообщений"""
         # Клиент для чтения (от имени пользователя)
-        self.user_client = TelegramClient('user_session', self.api_id, self.api_hash)
-        await self.user_client.start()
-        logger.info("Клиент пользователя запущен")
+        self.user_client = await self.clients.user()
+        logger.info("Клиент пользователя получен")
         
         # Клиент для отправки (от имени бота)
-        self.bot_client = TelegramClient('bot_session', self.api_id, self.api_hash)
-        await self.bot_client.start(bot_token=self.bot_token)
-        logger.info("Клиент бота запущен")
+        self.bot_client = await self.clients.bot()
+        logger.info("Клиент бота получен")
         
     async def stop_clients(self):
-        """Останавливает клиентов"""
+        """Возвращает клиентов реестру (отключает, если реестр свой)"""
         if self.user_client:
-            await self.user_client.disconnect()
+            self.clients.release(self.user_client)
         if self.bot_client:
-            await self.bot_client.disconnect()
+            self.clients.release(self.bot_client)
+        if self._owns_clients:
+            await self.clients.close()
         logger.info("Клиенты остановлены")
     
     def contains_keywords(self, text):
@@ -70,8 +154,14 @@ class TelegramMonitor:
         if not text:
             return False
             
-        text = text.lower()
-        return any(keyword in text for keyword in self.keywords)
+        return self.keyword_matcher.contains_any(text.lower())
+    
+    def find_keywords(self, text):
+        """Возвращает найденные ключевые слова и их смещения в тексте (в нижнем регистре)"""
+        if not text:
+            return []
+            
+        return self.keyword_matcher.find_all(text.lower())
     
     def format_message(self, message_text, channel_username, message_id):
         """Форматирует текст сообщения"""
@@ -93,23 +183,33 @@ class TelegramMonitor:
         return text
     
     async def process_message(self, event):
-        """Обрабатывает новое сообщение и пересылает его если нужно"""
+        """Передает новое сообщение в сборщик альбомов"""
+        # Части альбома копятся и обрабатываются вместе, обычное сообщение - сразу
+        await self.albums.add(event.message)
+        
+    async def process_post(self, parts):
+        """Обрабатывает пост (сообщение или альбом целиком) и пересылает его если нужно"""
+        first = parts[0]
+        
         # Пропускаем сообщения от ботов или системные сообщения
-        if event.message.from_id and getattr(event.message.from_id, 'user_id', None) and event.message.from_id.user_id == 777000:
+        if first.from_id and getattr(first.from_id, 'user_id', None) and first.from_id.user_id == 777000:
             return
             
         # Получаем идентификаторы сообщения и канала
-        message_id = event.message.id
-        channel_id = str(event.chat_id)
+        message_id = first.id
+        channel_id = str(first.chat_id)
         
         # Пропускаем, если уже обрабатывали
-        if self.db.message_exists(message_id, channel_id):
+        if await self.adb.message_exists(message_id, channel_id):
             logger.info(f"Сообщение {message_id} уже обработано, пропускаем")
             return
+        if not self.is_leased(first.chat_id):
+            # Канал передан другому воркеру, пока пост собирался
+            return
             
         # Получаем информацию о канале
         try:
-            channel = await event.client.get_entity(event.chat_id)
+            channel = await self.entities.resolve(first.client, first.chat_id)
             channel_username = channel.username
             channel_name = channel.title
             logger.info(f"Новое сообщение из канала {channel_name} (@{channel_username})")
@@ -117,89 +217,236 @@ class TelegramMonitor:
             logger.error(f"Ошибка при получении информации о канале: {e}")
             return
             
-        # Проверяем текст на наличие ключевых слов
-        if not self.contains_keywords(event.message.text):
+        # Проверяем текст на наличие ключевых слов (у альбома подпись одна на все части)
+        text = album_text(parts)
+        await self.ensure_fresh_keywords()
+        if not self.contains_keywords(text):
             logger.info(f"Сообщение не содержит ключевых слов, пропускаем")
-            self.db.add_processed_message(message_id, channel_id)
+            await self.mark_processed(parts)
+            return
+            
+        # Пост пересылает тот воркер, который первым закрепил его за собой
+        if not await self.adb.claim_forward(message_id, channel_id, self.worker_id):
+            logger.info(f"Сообщение {message_id} пересылает другой воркер, пропускаем")
             return
             
         try:
-            # Если есть медиа, скачиваем его
-            if event.message.media:
-                # Скачиваем медиа во временную директорию
-                path = await event.message.download_media('temp/')
-                logger.info(f"Медиа сохранено в {path}")
-                
-                # Форматируем текст сообщения
-                formatted_text = self.format_message(
-                    event.message.text,
-                    channel_username,
-                    message_id
-                )
-                
-                # Отправляем сообщение с медиа
-                await self.bot_client.send_file(
-                    self.output_channel,
-                    path,
+            # Форматируем текст сообщения
+            formatted_text = self.format_message(
+                text,
+                channel_username,
+                message_id
+            )
+            
+            # Если есть фото или файлы, передаем их боту
+            media_parts = [part for part in parts if part.photo or part.document]
+            if media_parts:
+                # Файлы скачиваются кусками и сразу загружаются ботом, без
+                # временных файлов; уже пересланные файлы берутся из кэша.
+                # Альбом отправляется одним запросом
+                await send_album(
+                    first.client,
+                    self.bot_client,
+                    self.output_peer,
+                    media_parts,
+                    cache=self.media_cache,
                     caption=formatted_text,
                     parse_mode='html'
                 )
-                logger.info("Сообщение с медиа успешно отправлено")
-                
-                # Удаляем временный файл
-                os.remove(path)
+                logger.info(f"Сообщение с медиа ({len(media_parts)} шт.) успешно отправлено")
             else:
-                # Форматируем текст сообщения
-                formatted_text = self.format_message(
-                    event.message.text,
-                    channel_username,
-                    message_id
-                )
-                
                 # Отправляем только текст
                 await self.bot_client.send_message(
-                    self.output_channel,
+                    self.output_peer,
                     formatted_text,
                     parse_mode='html'
                 )
                 logger.info("Текстовое сообщение успешно отправлено")
                 
-            # Добавляем сообщение в историю обработанных
-            self.db.add_processed_message(message_id, channel_id)
-            
         except Exception as e:
+            # Пост не отправлен: закрепление снимается, его перешлет повтор или другой воркер
             logger.error(f"Ошибка при обработке сообщения: {e}")
+            await self.adb.release_forward(message_id, channel_id, self.worker_id)
+            return
+            
+        # Добавляем сообщение в историю обработанных. Если запись не удалась,
+        # закрепление остается: оно и не даст переслать пост повторно
+        try:
+            await self.mark_processed(parts)
+        except Exception as e:
+            logger.error(f"Ошибка при отметке сообщения {message_id} обработанным: {e}")
+            
+    async def mark_processed(self, parts):
+        """Отмечает все части поста обработанными"""
+        for part in parts:
+            await self.adb.add_processed_message(part.id, str(part.chat_id))
     
+    def refresh_chats(self, catalog):
+        """Атомарно заменяет множество отслеживаемых чатов"""
+        self.catalog_chats = monitored_chat_ids(catalog.channels)
+        self.chats_version = catalog.version
+        self.apply_leases()
+        logger.info(f"Настроен мониторинг для {len(self.monitored_chats)} из "
+                    f"{len(self.catalog_chats)} каналов (версия {catalog.version})")
+        
+    def apply_leases(self):
+        """Оставляет в отслеживаемых только арендованные этим воркером каналы"""
+        chats = self.catalog_chats
+        if self.leased_chats is not None:
+            chats = chats & self.leased_chats
+        self.monitored_chats = frozenset(chats)
+        
+    def is_leased(self, chat_id):
+        """Арендован ли канал этим воркером (до первой аренды - любой)"""
+        return self.leased_chats is None or chat_id in self.leased_chats
+        
+    def is_monitored(self, event):
+        """Фильтр событий: сообщение из отслеживаемого чата"""
+        return event.chat_id in self.monitored_chats
+        
+    async def renew_leases(self):
+        """Продлевает аренду каналов и возвращает полученные от других воркеров"""
+        claimed = await self.adb.claim_channels(
+            self.worker_id, [str(chat_id) for chat_id in self.catalog_chats], self.lease_ttl
+        )
+        leased = frozenset(int(chat_id) for chat_id in claimed)
+        previous, self.leased_chats = self.leased_chats, leased
+        self.apply_leases()
+        if previous is None:
+            logger.info(f"Воркер {self.worker_id}: арендовано {len(leased)} из {len(self.catalog_chats)} каналов")
+            return frozenset()
+        if leased != previous:
+            logger.info(f"Воркер {self.worker_id}: получено {len(leased - previous)}, "
+                        f"отдано {len(previous - leased)}, всего {len(leased)} каналов")
+        return leased - previous
+        
+    def backfill_cutoff(self):
+        """Граница дочитывания: посты старше срока хранения отметок пропускаются"""
+        if not self.db.processed_retention_days:
+            return None
+        return datetime.now(timezone.utc) - timedelta(days=self.db.processed_retention_days)
+        
+    async def backfill(self, chat_ids):
+        """Дочитывает последние посты каналов, полученных от другого воркера"""
+        cutoff = self.backfill_cutoff()
+        for chat_id in chat_ids:
+            try:
+                messages = await self.user_client.get_messages(chat_id, limit=TAKEOVER_BACKFILL)
+            except Exception as e:
+                logger.error(f"Не удалось дочитать канал {chat_id}: {e}")
+                continue
+            # От старых к новым, как пришли бы события
+            for message in reversed(messages):
+                if cutoff is not None and message.date and message.date < cutoff:
+                    continue
+                await self.albums.add(message)
+        await self.albums.flush()
+        
+    async def hold_leases(self):
+        """Фоновая задача: пульс воркера, перераспределение каналов между воркерами"""
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                acquired = await self.renew_leases()
+            except Exception as e:
+                logger.error(f"Ошибка при продлении аренды каналов: {e}")
+                continue
+            if acquired:
+                await self.entities.prefetch(self.user_client, sorted(acquired))
+                await self.backfill(sorted(acquired))
+        
     async def setup_handlers(self):
         """Настраивает обработчики событий для мониторинга каналов"""
-        # Получаем все активные каналы из базы данных
-        channels = self.db.get_channels_by_city()
+        # Получаем все активные каналы из кэша справочников и арендуем свою долю
+        self.refresh_chats(await self.adb.get_catalog())
+        await self.renew_leases()
         
-        if not channels:
-            logger.warning("В базе данных нет каналов для мониторинга")
-            return
+        if not self.monitored_chats:
+            logger.warning("В базе данных нет каналов для мониторинга, ждем добавления")
             
-        # Регистрируем обработчик для всех каналов
-        @self.user_client.on(events.NewMessage(chats=[int(c['channel_id']) for c in channels]))
+        # Обработчик регистрируется один раз и проверяет chat_id по текущему
+        # множеству, поэтому новые каналы подхватываются без перезапуска
+        @self.user_client.on(events.NewMessage(func=self.is_monitored))
         async def new_message_handler(event):
             await self.process_message(event)
             
-        logger.info(f"Настроен мониторинг для {len(channels)} каналов")
+    async def warm_entities(self):
+        """Прогревает кэш сущностей: отслеживаемые каналы и канал для пересылки"""
+        self.output_peer = await self.entities.get_input_entity(self.bot_client, self.output_channel)
+        fetched = await self.entities.prefetch(self.user_client, sorted(self.monitored_chats))
+        logger.info(f"Кэш сущностей прогрет, запрошено у API: {fetched}")
+        
+    async def watch_catalog(self):
+        """Фоновая задача: применяет изменения каналов и ключевых слов от админа"""
+        while True:
+            await asyncio.sleep(CATALOG_POLL_INTERVAL)
+            try:
+                # Версия в базе: бот с админкой может работать в другом процессе
+                version = await self.adb.sync_catalog_version()
+                if self.chats_version == version:
+                    continue
+                catalog = await self.adb.get_catalog()
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении списка каналов: {e}")
+                continue
+            self.refresh_chats(catalog)
+            try:
+                await self.renew_leases()
+            except Exception as e:
+                logger.error(f"Ошибка при аренде новых каналов: {e}")
+            await self.entities.prefetch(self.user_client, sorted(self.monitored_chats))
+            if self.keywords_version != catalog.version:
+                self.refresh_keywords(catalog)
+        
+    async def purge_processed_messages_periodically(self):
+        """Фоновая задача: удаляет отметки старше срока хранения"""
+        while True:
+            try:
+                # Очистка идет через поток-писатель и не мешает обработке событий
+                await self.adb.write(self.db.purge_processed_messages)
+            except Exception as e:
+                logger.error(f"Ошибка при удалении устаревших отметок: {e}")
+            await asyncio.sleep(RETENTION_INTERVAL)
         
     async def run(self):
         """Запускает мониторинг каналов"""
+        # Запросы к базе не блокируют цикл событий, записи идут пачками
+        if self._owns_adb:
+            self.adb = AsyncDatabaseManager(self.db)
+        self.entities = EntityCache(self.entity_cache_file)
+        self.media_cache = MediaCache(self.media_cache_dir, max_bytes=self.media_cache_max_mb * 1024 * 1024)
         await self.start_clients()
         await self.setup_handlers()
+        await self.warm_entities()
         
         logger.info("Бот запущен и готов к мониторингу каналов")
+        background_tasks = [
+            asyncio.create_task(self.purge_processed_messages_periodically()),
+            asyncio.create_task(self.watch_catalog()),
+            asyncio.create_task(self.hold_leases()),
+        ]
         
         # Запускаем бесконечный цикл для работы клиентов
         try:
             await self.user_client.run_until_disconnected()
         finally:
+            for task in background_tasks:
+                task.cancel()
+            # Каналы сразу свободны для других воркеров, без ожидания срока аренды
+            try:
+                await self.adb.release_worker(self.worker_id)
+            except Exception as e:
+                logger.error(f"Ошибка при снятии аренды каналов: {e}")
             await self.stop_clients()
+            if self._owns_adb:
+                await self.adb.close()
+            self.entities.close()
+            self.media_cache.close()
+            if self._owns_db:
+                self.db.close()
             
-# Точка входа в программу
+# Точка входа в программу: каждый запущенный процесс - отдельный воркер,
+# каналы делятся между воркерами через аренду в общей базе
 if __name__ == "__main__":
     monitor = TelegramMonitor()
     asyncio.run(monitor.run()) 
\ No newline at end of file
@@ -10,7 +10,9 @@ from telethon import TelegramClient
 from telethon.sessions import StringSession
 
 from config import settings
-from parser.monitor import parse_channel
+from parser.clients import get_registry
+from parser.monitor import parse_channels
+from parser.session_manager import SessionStorage
 from bot.sender import send_messages_to_user
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -23,38 +25,31 @@ async def main():
     logging.info("Запуск бота...")
 
     # --- Инициализация клиентов --- #
-    # Используем сохраненную строку сессии для авторизации
-    telethon_client = TelegramClient(StringSession(SESSION_STRING), settings.API_ID, settings.API_HASH)
+    # Клиент Telethon берется из общего реестра с сохраненной строкой сессии
+    async def password_callback():
+        # Используем getpass для скрытого ввода пароля
+        return getpass.getpass("Введите ваш облачный пароль 2FA: ")
+
+    clients = get_registry(
+        api_id=settings.API_ID,
+        api_hash=settings.API_HASH,
+        user_session=StringSession(SESSION_STRING),
+        phone=lambda: input('Введите номер телефона (например, +79991234567): '),
+        password=password_callback,
+    )
     bot = Bot(token=settings.BOT_TOKEN)
 
     try:
         # --- Подключение Telethon --- #
+        # Если сессия истекла, реестр запустит повторную авторизацию
         logging.info("Подключение к Telegram (Telethon) с сохраненной сессией...")
-        
-        # Определяем обработчик для ввода пароля 2FA (на случай, если сессия истечет)
-        async def password_callback():
-            # Используем getpass для скрытого ввода пароля
-            return getpass.getpass("Введите ваш облачный пароль 2FA: ")
-        
-        # Сначала пробуем подключиться напрямую, без ввода данных
-        await telethon_client.connect()
-        
-        # Если не авторизованы, то запускаем полный процесс авторизации
-        if not await telethon_client.is_user_authorized():
-            logging.info("Сессия истекла, запрашиваем повторную авторизацию...")
-            await telethon_client.start(
-                phone=lambda: input('Введите номер телефона (например, +79991234567): '),
-                password=password_callback
-            )
-            
-            # После успешной авторизации сохраняем новую строку сессии
-            if await telethon_client.is_user_authorized():
-                new_session_string = telethon_client.session.save()
-                logging.info(f"Новая строка сессии: {new_session_string}")
-                logging.info("Сохраните эту строку для будущего использования.")
-            else:
-                logging.error("Не удалось авторизоваться даже с вводом данных. Завершение работы.")
-                return
+        telethon_client = await clients.user()
+
+        # После повторной авторизации сохраняем новую строку сессии
+        new_session_string = telethon_client.session.save()
+        if new_session_string != SESSION_STRING:
+            logging.info(f"Новая строка сессии: {new_session_string}")
+            logging.info("Сохраните эту строку для будущего использования.")
         
         # Проверка авторизации
         me = await telethon_client.get_me()
@@ -64,8 +59,15 @@ async def main():
         await send_last_message(telethon_client, bot)
 
         # --- Основной цикл (в данном случае один запуск) --- #
-        logging.info("Начинаем парсинг канала...")
-        new_filtered_messages = await parse_channel(telethon_client)
+        # Дополнительные аккаунты из хранилища сессий делят каналы с основным
+        sessions = {
+            phone_hash[:8]: session
+            for phone_hash, session in SessionStorage().load_sessions().items()
+            if session != new_session_string
+        }
+        accounts = {'main': telethon_client, **await clients.accounts(sessions)}
+        logging.info(f"Начинаем парсинг каналов ({len(accounts)} аккаунтов)...")
+        new_filtered_messages = await parse_channels(accounts)
 
         if new_filtered_messages:
             logging.info(f"Найдено {len(new_filtered_messages)} новых сообщений. Отправка...")
@@ -78,9 +80,8 @@ async def main():
         logging.exception(f"Произошла ошибка во время выполнения: {e}")
     finally:
         # --- Закрытие соединений --- #
-        if telethon_client.is_connected():
-            await telethon_client.disconnect()
-            logging.info("Telethon клиент отключен.")
+        await clients.close()
+        logging.info("Telethon клиент отключен.")
         # Закрываем сессию бота Aiogram
         if hasattr(bot, 'session') and bot.session:
             await bot.session.close()
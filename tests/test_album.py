@@ -0,0 +1,138 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+from telethon import types
+from parser.album import MAX_ALBUM_SIZE, AlbumAssembler, album_text, group_albums
+from parser.media_relay import send_album
+
+
+def make_part(message_id: int, grouped_id: Optional[int] = None, text: str = "",
+              chat_id: int = -100) -> SimpleNamespace:
+    return SimpleNamespace(id=message_id, grouped_id=grouped_id, text=text, chat_id=chat_id)
+
+
+def test_group_albums_keeps_post_order() -> None:
+    """История приходит от новых к старым, части альбома сортируются по ID"""
+    messages = [
+        make_part(5),
+        make_part(4, grouped_id=7),
+        make_part(3, grouped_id=7, text="подпись"),
+        make_part(2, grouped_id=7, chat_id=-200),
+        make_part(1),
+    ]
+
+    posts = group_albums(messages)
+    assert [[part.id for part in parts] for parts in posts] == [[5], [3, 4], [2], [1]]
+    assert album_text(posts[1]) == "подпись"
+
+
+@pytest.mark.parametrize("texts, expected", [(["", "a", "b"], "a"), (["", ""], ""), ([None], "")])
+def test_album_text(texts: List[Optional[str]], expected: str) -> None:
+    assert album_text([make_part(i, text=t) for i, t in enumerate(texts)]) == expected
+
+
+def collect(window: float = 0.05):
+    posts = []
+
+    async def handler(parts):
+        posts.append([part.id for part in parts])
+
+    return posts, AlbumAssembler(handler, window=window)
+
+
+def test_assembler_buffers_album_parts() -> None:
+    """Альбом обрабатывается один раз, обычное сообщение - сразу"""
+    posts, albums = collect()
+
+    async def run():
+        await albums.add(make_part(3, grouped_id=9))
+        await albums.add(make_part(1))
+        await albums.add(make_part(2, grouped_id=9, text="подпись"))
+        await albums.add(make_part(2, grouped_id=9))
+        assert posts == [[1]]
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert posts == [[1], [2, 3]]
+    assert len(albums) == 0
+
+
+def test_assembler_dispatches_full_album_at_once() -> None:
+    posts, albums = collect(window=10)
+
+    async def run():
+        for message_id in range(MAX_ALBUM_SIZE):
+            await albums.add(make_part(message_id, grouped_id=1))
+
+    asyncio.run(run())
+    assert posts == [list(range(MAX_ALBUM_SIZE))]
+
+
+def test_assembler_flush() -> None:
+    posts, albums = collect(window=10)
+
+    async def run():
+        await albums.add(make_part(1, grouped_id=1))
+        await albums.add(make_part(2, grouped_id=2))
+        await albums.flush()
+
+    asyncio.run(run())
+    assert posts == [[1], [2]]
+
+
+def test_send_album_uses_one_request() -> None:
+    """Все части альбома отправляются одним send_file со списком файлов"""
+    calls = []
+
+    class Client:
+        session = SimpleNamespace(filename="user.session")
+
+        async def send_file(self, peer, file, **kwargs):
+            calls.append((file, kwargs))
+            return [SimpleNamespace(id=i) for i in range(len(file))]
+
+    client = Client()
+    parts = [SimpleNamespace(media=f"media{i}") for i in range(3)]
+    sent = asyncio.run(send_album(client, client, "peer", parts, caption="подпись"))
+
+    assert calls == [(["media0", "media1", "media2"], {"caption": "подпись"})]
+    assert len(sent) == 3
+
+
+def test_send_album_keeps_document_attributes() -> None:
+    """Загруженные видео альбома отправляются с атрибутами и MIME-типом исходных файлов"""
+    calls = []
+    video = types.DocumentAttributeVideo(duration=12, w=1280, h=720, supports_streaming=True)
+
+    class Source:
+        session = SimpleNamespace(filename="user.session")
+
+        async def download_media(self, message, file=bytes):
+            return b"data"
+
+    class Target:
+        session = SimpleNamespace(filename="bot.session")
+
+        async def upload_file(self, file, file_name=None, **kwargs):
+            return types.InputFile(id=len(calls), parts=1, name=file_name, md5_checksum="")
+
+        async def send_file(self, peer, file, **kwargs):
+            calls.append(file)
+            return [SimpleNamespace(id=i) for i in range(len(file))]
+
+    parts = [
+        SimpleNamespace(
+            id=i, media=f"media{i}", photo=None,
+            document=SimpleNamespace(attributes=[video], mime_type="video/mp4"),
+            file=SimpleNamespace(size=0, name=f"clip{i}.mp4", ext=".mp4"),
+        )
+        for i in range(2)
+    ]
+    asyncio.run(send_album(Source(), Target(), "peer", parts))
+
+    [files] = calls
+    assert all(isinstance(media, types.InputMediaUploadedDocument) for media in files)
+    assert [media.mime_type for media in files] == ["video/mp4", "video/mp4"]
+    assert files[0].attributes == [video]
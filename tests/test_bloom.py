@@ -0,0 +1,32 @@
+from parser.bloom import BloomFilter
+
+
+def test_no_false_negatives() -> None:
+    bloom = BloomFilter(capacity=1000, fp_rate=0.01)
+    keys = [f"-100{i}:{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    assert bloom.count == 1000
+    assert not bloom.is_full
+
+
+def test_false_positive_rate_close_to_target() -> None:
+    bloom = BloomFilter(capacity=5000, fp_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"seen:{i}")
+
+    false_positives = sum(f"new:{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.03
+    assert 0.005 < bloom.expected_fp_rate() < 0.02
+
+
+def test_stats() -> None:
+    bloom = BloomFilter(capacity=100)
+    bloom.add("a")
+    stats = bloom.stats()
+
+    assert stats["items"] == 1
+    assert stats["memory_bytes"] == bloom.memory_bytes > 0
+    assert stats["hash_count"] >= 1
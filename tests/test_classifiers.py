@@ -1,5 +1,14 @@
 import pytest
-from parser.classifiers import normalize_text, find_tags, is_hot_content, extract_price, TAG_RULES
+from parser.classifiers import (
+    normalize_text,
+    find_tags,
+    find_tags_many,
+    is_hot_content,
+    extract_price,
+    reload_tag_rules,
+    TagRule,
+    TAG_RULES,
+)
 
 @pytest.mark.parametrize(
     "input_text,expected",
@@ -36,6 +45,24 @@ def test_normalize_text(input_text: str, expected: str) -> None:
 def test_find_tags(input_text: str, expected_tags: set[str]) -> None:
     assert find_tags(input_text) == expected_tags
 
+def test_find_tags_many_keeps_order() -> None:
+    texts = ["Пицца и вино", "Обычный текст", "Поздний завтрак с кофе"]
+    assert find_tags_many(texts) == [
+        {"пицца", "бар"},
+        set(),
+        {"бранч", "завтрак"},
+    ]
+
+def test_reload_tag_rules() -> None:
+    """Проверяет, что новые правила применяются после перекомпиляции"""
+    original = dict(TAG_RULES)
+    try:
+        reload_tag_rules({"десерт": TagRule(keywords=["Тирамису"], emoji="🍰")})
+        assert find_tags("Тирамису и пицца") == {"десерт"}
+    finally:
+        reload_tag_rules(original)
+    assert find_tags("Тирамису и пицца") == {"пицца"}
+
 @pytest.mark.parametrize(
     "tags,expected",
     [
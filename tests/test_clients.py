@@ -0,0 +1,94 @@
+import asyncio
+from typing import List
+
+import pytest
+from parser.clients import BOT, USER, ClientRegistry
+from telegram_monitor import TelegramMonitor
+
+
+class FakeClient:
+    created: List["FakeClient"] = []
+
+    def __init__(self, session, api_id, api_hash):
+        self.session = session
+        self.started_with = None
+        self.connected = False
+        FakeClient.created.append(self)
+
+    async def start(self, **kwargs):
+        if self.session == "broken":
+            self.connected = True
+            raise ConnectionError("нет сети")
+        self.started_with = kwargs
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+
+@pytest.fixture
+def registry() -> ClientRegistry:
+    FakeClient.created = []
+    return ClientRegistry(1, "hash", "token", phone="+7000", client_factory=FakeClient)
+
+
+def test_clients_are_connected_once(registry: ClientRegistry) -> None:
+    """Все компоненты получают одного клиента на роль"""
+    async def run():
+        clients = await asyncio.gather(*(registry.user() for _ in range(5)))
+        bot = await registry.bot()
+        return clients, bot
+
+    clients, bot = asyncio.run(run())
+    assert all(client is clients[0] for client in clients)
+    assert registry.connects == 2
+    assert registry.borrowers(USER) == 5
+    assert clients[0].started_with == {"phone": "+7000"}
+    assert bot.started_with == {"bot_token": "token"}
+
+
+def test_release_keeps_connection_until_close(registry: ClientRegistry) -> None:
+    async def run():
+        async with registry.borrow(USER) as client:
+            pass
+        assert client.connected
+        assert registry.borrowers(USER) == 0
+        await registry.close()
+        return client
+
+    assert not asyncio.run(run()).connected
+
+
+def test_other_event_loop_is_rejected(registry: ClientRegistry) -> None:
+    """Клиенты привязаны к циклу событий, в котором подключены"""
+    async def borrow_and_hold():
+        await registry.user()
+        with pytest.raises(RuntimeError):
+            await asyncio.to_thread(asyncio.run, registry.user())
+
+    asyncio.run(borrow_and_hold())
+
+
+def test_failed_start_is_not_registered() -> None:
+    FakeClient.created = []
+    registry = ClientRegistry(1, "hash", user_session="broken", client_factory=FakeClient)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(registry.user())
+    assert registry.borrowers(USER) == 0
+    assert not FakeClient.created[0].connected
+
+
+def test_monitor_borrows_shared_clients(registry: ClientRegistry) -> None:
+    """Монитор с общим реестром не отключает клиентов при остановке"""
+    monitor = TelegramMonitor.__new__(TelegramMonitor)
+    monitor.clients = registry
+    monitor._owns_clients = False
+
+    async def run():
+        await monitor.start_clients()
+        await monitor.stop_clients()
+
+    asyncio.run(run())
+    assert monitor.user_client.connected and monitor.bot_client.connected
+    assert registry.borrowers(USER) == registry.borrowers(BOT) == 0
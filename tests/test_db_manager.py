@@ -0,0 +1,400 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from db_manager import AsyncDatabaseManager, DatabaseManager
+from db_schema import create_database
+
+
+@pytest.fixture
+def db(tmp_path: Path) -> DatabaseManager:
+    db_file = str(tmp_path / "test.db")
+    create_database(db_file)
+    return DatabaseManager(db_file)
+
+
+def test_processed_messages(db: DatabaseManager) -> None:
+    assert not db.message_exists(1, "-100")
+    assert db.add_processed_message(1, "-100")
+    assert not db.add_processed_message(1, "-100")
+
+    assert db.message_exists(1, "-100")
+    assert not db.message_exists(1, "-200")
+
+
+def test_message_filter_rebuilt_from_database(db: DatabaseManager) -> None:
+    """Новый экземпляр видит сообщения, добавленные до его создания"""
+    db.add_processed_message(42, "-100")
+
+    fresh = DatabaseManager(db.db_file)
+    assert fresh.message_exists(42, "-100")
+    assert fresh.get_message_filter_stats()["items"] == 1
+
+
+def test_message_filter_stats(db: DatabaseManager) -> None:
+    for message_id in range(50):
+        db.add_processed_message(message_id, "-100")
+    for message_id in range(50, 150):
+        assert not db.message_exists(message_id, "-100")
+
+    stats = db.get_message_filter_stats()
+    assert stats["lookups"] == 100
+    assert stats["skipped_db_queries"] + stats["false_positives"] == 100
+    assert stats["observed_fp_rate"] < 0.1
+    assert stats["memory_bytes"] > 0
+
+
+def test_connection_per_thread(db: DatabaseManager) -> None:
+    """Бот и монитор пишут из разных потоков, у каждого свое соединение"""
+    def worker(channel_id: str) -> None:
+        for message_id in range(100):
+            db.add_processed_message(message_id, channel_id)
+
+    threads = [threading.Thread(target=worker, args=(f"-{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    fresh = DatabaseManager(db.db_file)
+    assert all(fresh.message_exists(99, f"-{n}") for n in range(4))
+    assert len(db._connections) == 4
+
+    db.close()
+    assert db._connections == []
+    # После close() соединение открывается заново
+    assert db.message_exists(0, "-0")
+
+
+def test_batch_rolls_back_together(db: DatabaseManager) -> None:
+    """Записи внутри batch() фиксируются или откатываются вместе"""
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db.add_city("Казань")
+            raise RuntimeError
+    assert "Казань" not in [c["name"] for c in db.get_all_cities()]
+
+    with db.batch():
+        db.add_city("Казань")
+        assert db.add_city("Казань") is None
+    assert [c["name"] for c in db.get_all_cities()].count("Казань") == 1
+
+
+def test_filter_rebuilt_before_batch_commit_keeps_keys(db: DatabaseManager) -> None:
+    """Фильтр, перестроенный другим потоком до коммита пачки, получает ее ключи после коммита"""
+    def rebuild() -> None:
+        db._message_filter = None
+        assert not db.message_exists(1, "-100")
+
+    with db.batch():
+        assert db.add_processed_message(1, "-100")
+        # Поток чтения не видит незафиксированную строку
+        reader = threading.Thread(target=rebuild)
+        reader.start()
+        reader.join()
+    assert db.message_exists(1, "-100")
+
+
+def test_async_writes_are_batched(db: DatabaseManager) -> None:
+    async def scenario() -> list:
+        adb = AsyncDatabaseManager(db)
+        results = await asyncio.gather(
+            *(adb.add_processed_message(message_id % 50, "-100") for message_id in range(100))
+        )
+        assert await adb.message_exists(49, "-100")
+        assert not await adb.message_exists(50, "-100")
+        await adb.close()
+        assert adb.writes == 100
+        assert adb.batches < 100
+        return results
+
+    results = asyncio.run(scenario())
+    assert results.count(True) == 50
+    assert results.count(False) == 50
+
+
+def test_async_write_error_propagates(db: DatabaseManager) -> None:
+    async def scenario() -> None:
+        adb = AsyncDatabaseManager(db)
+        with pytest.raises(sqlite3.OperationalError):
+            await adb.write(db._write, "INSERT INTO missing_table VALUES (1)")
+        # Ошибка одной записи не мешает остальным
+        assert await adb.add_processed_message(1, "-100")
+        await adb.close()
+
+    asyncio.run(scenario())
+
+
+def test_async_admin_writes_visible_to_reads(db: DatabaseManager) -> None:
+    """Записи бота через писателя видны следующему чтению, кэш справочников сбрасывается"""
+    async def scenario() -> None:
+        adb = AsyncDatabaseManager(db)
+        assert await adb.add_user(1)
+        await adb.set_admin_status(1, 1)
+        city_id = await adb.add_city("Казань")
+        await adb.update_user_city(1, city_id)
+        user = await adb.get_user(1)
+        assert user["is_admin"] == 1 and user["city_name"] == "Казань"
+
+        assert await adb.add_channel("-100", "Канал", "channel", city_id)
+        assert await adb.add_keyword("скидка")
+        catalog = await adb.get_catalog()
+        assert [c["channel_id"] for c in catalog.channels] == ["-100"]
+        assert [k["word"] for k in catalog.keywords] == ["скидка"]
+
+        await adb.delete_channel("-100")
+        await adb.delete_keyword(catalog.keywords[0]["id"])
+        catalog = await adb.get_catalog()
+        assert catalog.channels == [] and catalog.keywords == []
+        await adb.close()
+
+    asyncio.run(scenario())
+
+
+def test_write_behind_flushes_by_count(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "test.db")
+    create_database(db_file)
+    db = DatabaseManager(db_file, processed_flush_every=3, processed_flush_interval=0)
+
+    assert db.add_processed_message(1, "-100")
+    assert db.add_processed_message(2, "-100")
+    # Отметки еще в памяти, но дубликаты уже распознаются
+    assert db.message_exists(1, "-100")
+    assert not db.add_processed_message(1, "-100")
+    assert not DatabaseManager(db_file).message_exists(1, "-100")
+
+    assert db.add_processed_message(3, "-100")
+    reader = DatabaseManager(db_file)
+    assert all(reader.message_exists(message_id, "-100") for message_id in (1, 2, 3))
+
+
+def test_write_behind_flush_joins_open_batch(tmp_path: Path) -> None:
+    """Запись отметок внутри batch() не коммитит пачку, а при ее откате отметки не теряются"""
+    db_file = str(tmp_path / "test.db")
+    create_database(db_file)
+    db = DatabaseManager(db_file, processed_flush_every=2, processed_flush_interval=0)
+    # Отметка, поставленная до пачки другим вызовом
+    assert db.add_processed_message(1, "-100")
+
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db.add_city("Казань")
+            assert db.add_processed_message(2, "-100")
+            raise RuntimeError
+    reader = DatabaseManager(db_file)
+    assert "Казань" not in [c["name"] for c in reader.get_all_cities()]
+    assert not reader.message_exists(1, "-100")
+    # Отметки остались отложенными и по-прежнему считаются обработанными
+    assert db.message_exists(1, "-100") and db.message_exists(2, "-100")
+    assert not db.add_processed_message(2, "-100")
+
+    assert db.flush_processed_messages() == 2
+    reader = DatabaseManager(db_file)
+    assert all(reader.message_exists(message_id, "-100") for message_id in (1, 2))
+
+    with db.batch():
+        db.add_city("Казань")
+        assert db.add_processed_message(3, "-100")
+        assert db.add_processed_message(4, "-100")
+        # Записаны в пачку, но до коммита остаются в памяти
+        assert len(db._pending_messages) == 2
+    assert not db._pending_messages
+    reader = DatabaseManager(db_file)
+    assert "Казань" in [c["name"] for c in reader.get_all_cities()]
+    assert all(reader.message_exists(message_id, "-100") for message_id in (3, 4))
+
+
+def test_write_behind_flushes_by_time_and_on_close(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "test.db")
+    create_database(db_file)
+    db = DatabaseManager(db_file, processed_flush_every=1000, processed_flush_interval=0.05)
+
+    db.add_processed_message(1, "-100")
+    deadline = time.monotonic() + 5
+    while db._pending_messages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert DatabaseManager(db_file).message_exists(1, "-100")
+
+    db.add_processed_message(2, "-100")
+    db.close()
+    assert DatabaseManager(db_file).message_exists(2, "-100")
+
+
+def _age_marks(db_file: str, table: str, days: int) -> None:
+    """Сдвигает время обработки всех отметок таблицы в прошлое"""
+    conn = sqlite3.connect(db_file)
+    conn.execute(f"UPDATE {table} SET processed_at = datetime('now', '-{days} days')")
+    conn.commit()
+    conn.close()
+
+
+def test_purge_removes_expired_rows(db: DatabaseManager) -> None:
+    db.add_processed_message(1, "-100")
+    _age_marks(db.db_file, "processed_messages", 40)
+    db.add_processed_message(2, "-100")
+
+    assert db.purge_processed_messages(retention_days=30) == 1
+    assert not db.message_exists(1, "-100")
+    assert db.message_exists(2, "-100")
+
+
+def test_purge_drops_expired_buckets(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "test.db")
+    create_database(db_file)
+    conn = sqlite3.connect(db_file)
+    # Два старых периода: первый целиком старше срока, а за вторым
+    # идет текущий период, поэтому он чистится построчно
+    for table in ("processed_messages_20000101", "processed_messages_20000108"):
+        conn.execute(f"CREATE TABLE {table} AS SELECT * FROM processed_messages WHERE 0")
+    conn.execute("INSERT INTO processed_messages_20000101 (message_id, channel_id, processed_at) "
+                 "VALUES (1, '-100', '2000-01-01 00:00:00')")
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(db_file, processed_bucket_days=7)
+    assert db.add_processed_message(2, "-100")
+    assert not db.add_processed_message(2, "-100")
+    assert db.message_exists(1, "-100")
+
+    assert db.purge_processed_messages(retention_days=30) == 1
+    tables = {row[0] for row in sqlite3.connect(db_file).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "processed_messages_20000101" not in tables
+    assert "processed_messages_20000108" in tables
+    assert not db.message_exists(1, "-100")
+    assert db.message_exists(2, "-100")
+
+
+def test_catalog_cached_until_changed(db: DatabaseManager) -> None:
+    catalog = db.get_catalog()
+    assert db.get_catalog() is catalog
+
+    db.add_keyword("скидка")
+    fresh = db.get_catalog()
+    assert fresh.version > catalog.version
+    assert [k["word"] for k in fresh.keywords] == ["скидка"]
+
+    # Неудачная запись справочник не меняет
+    assert db.add_keyword("скидка") is None
+    assert db.get_catalog() is fresh
+
+
+def test_catalog_version_bumped_after_batch_commit(db: DatabaseManager) -> None:
+    version = db.catalog_version
+    with db.batch():
+        city_id = db.add_city("Казань")
+        db.add_channel("-100", "Канал", "channel", city_id)
+        assert db.catalog_version == version
+    assert db.catalog_version == version + 1
+
+    catalog = db.get_catalog()
+    assert catalog.get_city(city_id)["name"] == "Казань"
+    assert [c["channel_name"] for c in catalog.get_channels_by_city(city_id)] == ["Канал"]
+    assert catalog.get_channels_by_city(city_id + 1) == []
+
+
+def test_catalog_change_from_other_process_is_seen(tmp_path: Path) -> None:
+    """Изменение справочников через другой экземпляр видно после сверки версии в базе"""
+    db_file = str(tmp_path / "test.db")
+    create_database(db_file)
+    monitor, bot = DatabaseManager(db_file), DatabaseManager(db_file)
+    catalog = monitor.get_catalog()
+    assert monitor.sync_catalog_version() == catalog.version
+
+    bot.add_keyword("скидка")
+    assert monitor.get_catalog() is catalog
+    assert monitor.sync_catalog_version() > catalog.version
+    assert [k["word"] for k in monitor.get_catalog().keywords] == ["скидка"]
+
+    # Запись в обход DatabaseManager тоже повышает версию (триггеры)
+    version = monitor.sync_catalog_version()
+    conn = sqlite3.connect(db_file)
+    conn.execute("UPDATE keywords SET is_active = 0")
+    conn.commit()
+    conn.close()
+    assert monitor.sync_catalog_version() > version
+    assert monitor.get_catalog().keywords == []
+
+
+CHANNELS = [f"-100{n}" for n in range(10)]
+
+
+def _expire_worker(db_file: str, worker_id: str) -> None:
+    """Имитирует упавшего воркера: его пульс и аренды просрочены"""
+    conn = sqlite3.connect(db_file)
+    conn.execute("UPDATE monitor_workers SET expires_at = 0 WHERE worker_id = ?", (worker_id,))
+    conn.execute("UPDATE channel_leases SET expires_at = 0 WHERE worker_id = ?", (worker_id,))
+    conn.commit()
+    conn.close()
+
+
+def test_workers_split_channels(db: DatabaseManager) -> None:
+    """Второй воркер получает свою долю после следующего пульса первого"""
+    assert db.claim_channels("a", CHANNELS, ttl=30) == set(CHANNELS)
+    assert db.claim_channels("b", CHANNELS, ttl=30) == set()
+
+    first = db.claim_channels("a", CHANNELS, ttl=30)
+    second = db.claim_channels("b", CHANNELS, ttl=30)
+    assert len(first) == len(second) == 5
+    assert first.isdisjoint(second)
+    # Повторный пульс ничего не перекладывает
+    assert db.claim_channels("a", CHANNELS, ttl=30) == first
+
+
+def test_dead_worker_channels_move(db: DatabaseManager) -> None:
+    db.claim_channels("a", CHANNELS, ttl=30)
+    db.claim_channels("b", CHANNELS, ttl=30)
+    db.claim_channels("a", CHANNELS, ttl=30)
+    db.claim_channels("b", CHANNELS, ttl=30)
+
+    _expire_worker(db.db_file, "a")
+    assert db.claim_channels("b", CHANNELS, ttl=30) == set(CHANNELS)
+
+
+def test_released_worker_frees_channels(db: DatabaseManager) -> None:
+    db.claim_channels("a", CHANNELS, ttl=30)
+    db.release_worker("a")
+    assert db.claim_channels("b", CHANNELS, ttl=30) == set(CHANNELS)
+    # Удаленный из справочника канал отпускается
+    assert db.claim_channels("b", CHANNELS[:3], ttl=30) == set(CHANNELS[:3])
+
+
+def test_forward_claimed_by_one_worker(db: DatabaseManager) -> None:
+    """Один пост пересылает только один воркер"""
+    assert db.claim_forward(1, "-100", "a")
+    assert db.claim_forward(1, "-100", "a")
+    assert not db.claim_forward(1, "-100", "b")
+
+    db.release_forward(1, "-100", "b")
+    assert not db.claim_forward(1, "-100", "b")
+    db.release_forward(1, "-100", "a")
+    assert db.claim_forward(1, "-100", "b")
+
+
+def test_lease_claims_from_two_processes(tmp_path: Path) -> None:
+    """Два менеджера (как два процесса) не получают один канал"""
+    db_file = str(tmp_path / "test.db")
+    create_database(db_file)
+    managers = [DatabaseManager(db_file), DatabaseManager(db_file)]
+    claimed = [set(), set()]
+
+    def worker(n: int) -> None:
+        for _ in range(20):
+            claimed[n] = managers[n].claim_channels(f"w{n}", CHANNELS, ttl=30)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert claimed[0].isdisjoint(claimed[1])
+
+    # За два пульса каждого воркера лишние каналы отпущены и разобраны
+    for _ in range(2):
+        claimed = [managers[n].claim_channels(f"w{n}", CHANNELS, ttl=30) for n in range(2)]
+    assert claimed[0].isdisjoint(claimed[1])
+    assert claimed[0] | claimed[1] == set(CHANNELS)
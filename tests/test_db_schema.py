@@ -0,0 +1,54 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from db_manager import CHANNELS_BY_CITY_QUERY, USERS_BY_CITY_QUERY
+from db_schema import SCHEMA_VERSION, create_database, migrate
+
+
+@pytest.fixture
+def db_file(tmp_path: Path) -> str:
+    db_file = str(tmp_path / "test.db")
+    create_database(db_file)
+    return db_file
+
+
+def test_migrations_are_applied_once(db_file: str) -> None:
+    assert migrate(db_file) == SCHEMA_VERSION
+
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    conn.close()
+
+
+def test_existing_database_is_upgraded(tmp_path: Path) -> None:
+    """База, созданная до появления миграций, получает индексы без потери данных"""
+    db_file = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE cities (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+    conn.execute("INSERT INTO cities (name) VALUES ('Москва')")
+    conn.commit()
+    conn.close()
+
+    assert migrate(db_file) == SCHEMA_VERSION
+
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT name FROM cities").fetchall() == [("Москва",)]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_channels_city_active", "idx_users_city"} <= indexes
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    "query, index",
+    [
+        (CHANNELS_BY_CITY_QUERY, "idx_channels_city_active"),
+        (USERS_BY_CITY_QUERY, "idx_users_city"),
+    ],
+)
+def test_city_queries_use_covering_index(db_file: str, query: str, index: str) -> None:
+    conn = sqlite3.connect(db_file)
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", (1,))]
+    conn.close()
+
+    assert any(f"USING COVERING INDEX {index}" in step for step in plan), plan
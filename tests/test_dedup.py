@@ -0,0 +1,59 @@
+import json
+import time
+from pathlib import Path
+
+import pytest
+from parser.dedup import DedupStore, open_dedup_store
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> DedupStore:
+    with DedupStore(tmp_path / "processed.db") as store:
+        yield store
+
+
+def test_key_includes_channel(store: DedupStore) -> None:
+    """Одинаковые ID в разных каналах не конфликтуют"""
+    store.add("@a", 1)
+
+    assert store.contains("@a", 1)
+    assert ("@a", 1) in store
+    assert not store.contains("@b", 1)
+
+
+def test_add_many_and_len(store: DedupStore) -> None:
+    store.add_many([("@a", 1), ("@a", 2), ("@b", 1), ("@a", 1)])
+    assert len(store) == 3
+
+
+def test_persists_between_runs(tmp_path: Path) -> None:
+    path = tmp_path / "processed.db"
+    with DedupStore(path) as store:
+        store.add("@a", 10)
+
+    with DedupStore(path) as store:
+        assert store.contains("@a", 10)
+
+
+def test_ttl_expiry_and_compaction(tmp_path: Path) -> None:
+    with DedupStore(tmp_path / "processed.db", ttl=0.05) as store:
+        store.add_many([("@a", 1), ("@a", 2)])
+        time.sleep(0.1)
+        store.add("@a", 3)
+
+        assert not store.contains("@a", 1)
+        assert store.contains("@a", 3)
+        assert store.compact() == 2
+        assert len(store) == 1
+
+
+def test_legacy_ids_are_migrated(tmp_path: Path) -> None:
+    legacy = tmp_path / "processed.json"
+    legacy.write_text(json.dumps([5, 6]))
+
+    with open_dedup_store(tmp_path / "processed.db", legacy_path=legacy) as store:
+        assert store.contains("@any", 5)
+        assert not store.contains("@any", 7)
+
+    assert not legacy.exists()
+    assert (tmp_path / "processed.json.migrated").exists()
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from bot.delivery import DeliveryQueue, StatusMessage, chat_rate, retry_after
+
+
+class RetryAfter(Exception):
+    """Аналог TelegramRetryAfter из aiogram"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after}")
+        self.retry_after = retry_after
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent: List[str] = []
+        self.edits: List[str] = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append(text)
+        return SimpleNamespace(message_id=1)
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.edits.append(text)
+
+
+def unlimited(chat_id) -> float:
+    return 0
+
+
+@pytest.mark.parametrize("chat_id, expected", [(123, 1), (-100123, 20 / 60), ("@channel", 20 / 60)])
+def test_chat_rate(chat_id, expected: float) -> None:
+    assert chat_rate(chat_id) == expected
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RetryAfter(5), 5.0),
+    (SimpleNamespace(seconds=7), 7.0),
+    (ValueError("boom"), None),
+])
+def test_retry_after(error, expected) -> None:
+    assert retry_after(error) == expected
+
+
+def test_media_is_prepared_concurrently_and_sent_in_order() -> None:
+    """Медиа готовится параллельно, а в чат уходит в порядке постановки"""
+    sent = []
+
+    async def run() -> float:
+        async with DeliveryQueue(workers=3, global_rate=0, rate_for=unlimited) as queue:
+            started = time.monotonic()
+            futures = []
+            for i, delay in enumerate([0.15, 0.1, 0.05]):
+                async def prepare(i=i, delay=delay):
+                    await asyncio.sleep(delay)
+                    return i
+
+                async def send(payload):
+                    sent.append(payload)
+                    return payload
+
+                futures.append(queue.submit(1, send, prepare=prepare))
+            assert await asyncio.gather(*futures) == [0, 1, 2]
+            return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert sent == [0, 1, 2]
+    assert elapsed < 0.25
+
+
+def test_prepared_media_waiting_to_be_sent_is_bounded() -> None:
+    """Наперед готовится не больше prepare_concurrency медиа, даже если отправка медленная"""
+    held = []
+    peak = []
+
+    async def run():
+        async with DeliveryQueue(workers=1, prepare_concurrency=2, global_rate=0,
+                                 rate_for=lambda chat_id: 100) as queue:
+            async def prepare():
+                held.append(1)
+                peak.append(len(held))
+                return b"media"
+
+            async def send(payload):
+                held.pop()
+                return payload
+
+            await asyncio.gather(*(queue.submit(1, send, prepare=prepare) for _ in range(10)))
+
+    asyncio.run(run())
+    assert len(peak) == 10
+    assert max(peak) <= 2
+
+
+def test_chat_rate_limit_is_respected() -> None:
+    async def run() -> float:
+        async with DeliveryQueue(global_rate=0, rate_for=lambda chat_id: 20) as queue:
+            started = time.monotonic()
+
+            async def send(_):
+                return None
+
+            await asyncio.gather(*(queue.submit(1, send) for _ in range(5)))
+            return time.monotonic() - started
+
+    # Первый токен есть сразу, остальные четыре - по одному в 1/20 секунды
+    assert asyncio.run(run()) >= 0.19
+
+
+def test_flood_wait_is_retried() -> None:
+    calls = []
+
+    async def run():
+        async with DeliveryQueue(global_rate=0, rate_for=unlimited) as queue:
+            async def send(_):
+                calls.append(time.monotonic())
+                if len(calls) == 1:
+                    raise RetryAfter(0.1)
+                return "ok"
+
+            return await queue.submit(1, send)
+
+    assert asyncio.run(run()) == "ok"
+    assert calls[1] - calls[0] >= 0.09
+
+
+def test_errors_are_returned_to_caller() -> None:
+    async def run():
+        async with DeliveryQueue(global_rate=0, rate_for=unlimited, max_retries=1) as queue:
+            async def send(_):
+                raise RetryAfter(0)
+
+            async def fine(_):
+                return "ok"
+
+            failed = queue.submit(1, send)
+            passed = queue.submit(1, fine)
+            return await asyncio.gather(failed, passed, return_exceptions=True)
+
+    failed, passed = asyncio.run(run())
+    assert isinstance(failed, RetryAfter)
+    assert passed == "ok"
+
+
+def test_higher_priority_goes_first() -> None:
+    order = []
+
+    async def run():
+        queue = DeliveryQueue(workers=1, global_rate=0, rate_for=unlimited)
+
+        def sender(name):
+            async def send(_):
+                order.append(name)
+            return send
+
+        futures = [queue.submit(1, sender("low"), priority=2),
+                   queue.submit(1, sender("high"), priority=0)]
+        queue.start()
+        await asyncio.gather(*futures)
+        await queue.close()
+
+    asyncio.run(run())
+    assert order == ["high", "low"]
+
+
+def test_status_message_coalesces_updates() -> None:
+    """Частые обновления схлопываются в редкие правки одного сообщения"""
+    bot = FakeBot()
+
+    async def run():
+        async with DeliveryQueue(global_rate=0, rate_for=unlimited) as queue:
+            status = StatusMessage(bot, queue, 1, interval=0.05)
+            await status.start("start")
+            for i in range(20):
+                status.update(f"progress {i}")
+                await asyncio.sleep(0.01)
+            await status.finish("done")
+
+    asyncio.run(run())
+    assert bot.sent == ["start"]
+    assert 1 <= len(bot.edits) < 10
+    assert bot.edits[-1] == "done"
@@ -0,0 +1,44 @@
+import pytest
+from parser.classifiers import find_tags, is_hot_content
+from parser.enrichment import analyze_many, analyze_text, city_from_lowered
+from parser.summarizer import create_short_title, extract_date_info
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("Открытие в Москве", "Москва"),
+        ("Новый бар в СПб", "Санкт-Петербург"),
+        ("Питер, встречай бранч", "Санкт-Петербург"),
+        ("Без города", "Москва"),
+    ],
+)
+def test_city_from_lowered(text: str, expected: str) -> None:
+    assert city_from_lowered(text.lower()) == expected
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Скидка 20% на все суши и роллы! Приходите к нам.",
+        "Новый шеф-повар в Питере представляет авторское меню за 1500₽ до 15 января",
+        "Бранч с вином и пиццей, подарок каждому гостю. Всего 990 руб",
+        "",
+    ],
+)
+def test_analyze_text_matches_separate_classifiers(text: str) -> None:
+    """Общий разбор дает те же результаты, что и отдельные функции"""
+    analysis = analyze_text(text)
+    tags = list(find_tags(text))
+
+    assert set(analysis.tags) == set(tags)
+    assert analysis.is_hot == is_hot_content(tags)
+    assert analysis.date == extract_date_info(text)
+    assert analysis.short == create_short_title(text, analysis.tags, analysis.city)
+
+def test_analyze_many_keeps_order() -> None:
+    texts = ["Пицца в СПб за 500₽", "Завтрак в Москве"]
+    results = analyze_many(texts)
+
+    assert [r.text for r in results] == texts
+    assert results[0].city == "Санкт-Петербург"
+    assert results[0].prices == [500]
+    assert results[1].tags == ["завтрак"]
@@ -0,0 +1,73 @@
+import asyncio
+from typing import Iterator
+
+import pytest
+from parser.classifiers import TAG_RULES, TagRule, reload_tag_rules
+from parser.enrichment import analyze_many
+from parser.enrichment_pool import EnrichmentPool
+
+TEXTS = [
+    "Скидка 20% на все суши и роллы! Приходите к нам.",
+    "Новый шеф-повар в Питере представляет авторское меню за 1500₽ до 15 января",
+    "Бранч с вином и пиццей, подарок каждому гостю. Всего 990 руб",
+    "",
+    "Завтрак в Москве",
+] * 3
+
+
+@pytest.fixture
+def default_rules() -> Iterator[None]:
+    saved = dict(TAG_RULES)
+    yield
+    reload_tag_rules(saved)
+
+
+@pytest.mark.parametrize("batch_size", [1, 4, 100])
+def test_pool_matches_inline_in_order(batch_size: int) -> None:
+    """Результаты пула совпадают с разбором в процессе и идут в исходном порядке"""
+    async def run():
+        async with EnrichmentPool(workers=2, batch_size=batch_size) as pool:
+            return await pool.analyze_many(TEXTS)
+
+    assert asyncio.run(run()) == analyze_many(TEXTS)
+
+
+def test_workers_use_parent_rules(default_rules: None) -> None:
+    """Процессы компилируют правила, действующие у родителя на момент запуска"""
+    reload_tag_rules({"рамен": TagRule(keywords=["рамен"], emoji="🍜")})
+
+    async def run():
+        async with EnrichmentPool(workers=1) as pool:
+            return await pool.analyze_many(["Рамен и суши со скидкой"])
+
+    assert asyncio.run(run())[0].tags == ["рамен"]
+
+
+def test_empty_batch_does_not_start_pool() -> None:
+    pool = EnrichmentPool(workers=1)
+    assert asyncio.run(pool.analyze_many([])) == []
+    pool.close()
+
+
+def test_aclose_does_not_block_event_loop() -> None:
+    """Остановка процессов идет в потоке, цикл событий продолжает работу"""
+    async def run():
+        pool = EnrichmentPool(workers=1)
+        await pool.start()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        before = ticks
+        await pool.aclose()
+        ticker.cancel()
+        assert pool._executor is None
+        return ticks - before
+
+    assert asyncio.run(run()) > 0
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from parser.entity_cache import EntityCache
+from telethon.tl.types import Channel, ChatPhotoEmpty, InputPeerChannel
+
+
+def make_channel(channel_id: int, username: str) -> Channel:
+    return Channel(id=channel_id, title=f"Канал {channel_id}", photo=ChatPhotoEmpty(),
+                   date=datetime.now(), access_hash=channel_id * 10, username=username)
+
+
+class FakeClient:
+    """Клиент, считающий запросы get_entity"""
+
+    def __init__(self, name: str, entities: dict):
+        self.session = SimpleNamespace(filename=f"{name}.session")
+        self.entities = entities
+        self.requests = 0
+
+    async def get_entity(self, key):
+        self.requests += 1
+        return self.entities[key]
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> EntityCache:
+    with EntityCache(tmp_path / "entities.db") as cache:
+        yield cache
+
+
+def test_resolve_hits_api_once(cache: EntityCache) -> None:
+    client = FakeClient("user", {"@news": make_channel(1, "News")})
+
+    first = asyncio.run(cache.resolve(client, "@news"))
+    assert asyncio.run(cache.resolve(client, "https://t.me/news")) == first
+    assert asyncio.run(cache.resolve(client, -1000000000001)) == first
+    assert client.requests == 1
+
+    assert first.title == "Канал 1"
+    assert first.input_peer() == InputPeerChannel(1, 10)
+
+
+def test_accounts_are_separate(cache: EntityCache) -> None:
+    """access_hash у каждого аккаунта свой, записи не смешиваются"""
+    user = FakeClient("user", {"@news": make_channel(1, "news")})
+    bot = FakeClient("bot", {"@news": make_channel(1, "news")})
+
+    asyncio.run(cache.resolve(user, "@news"))
+    assert cache.get(bot, "@news") is None
+    asyncio.run(cache.resolve(bot, "@news"))
+    assert bot.requests == 1
+
+
+def test_persists_and_warms(tmp_path: Path) -> None:
+    path = tmp_path / "entities.db"
+    client = FakeClient("user", {"@news": make_channel(1, "news")})
+    with EntityCache(path) as cache:
+        asyncio.run(cache.prefetch(client, ["@news"]))
+
+    with EntityCache(path) as cache:
+        assert len(cache) == 1
+        assert cache.get(client, "@news").peer_id == -1000000000001
+
+
+def test_lru_eviction_and_ttl(tmp_path: Path) -> None:
+    channels = {f"@c{i}": make_channel(i, f"c{i}") for i in range(1, 4)}
+    client = FakeClient("user", channels)
+    with EntityCache(tmp_path / "entities.db", ttl=0.05, max_size=2) as cache:
+        for key in channels:
+            asyncio.run(cache.resolve(client, key))
+        assert len(cache) == 2
+        # Вытесненная из памяти запись читается с диска
+        assert cache.get(client, "@c1") is not None
+
+        time.sleep(0.1)
+        assert cache.get(client, "@c1") is None
+        assert cache.expire() == 3
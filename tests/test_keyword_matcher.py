@@ -0,0 +1,58 @@
+import pytest
+from parser.keyword_matcher import KeywordMatcher
+
+KEYWORDS = ["скидк", "скидка", "завтрак", "поздний завтрак", "бар", "%"]
+
+
+@pytest.fixture(params=[False, True], ids=["scan", "automaton"])
+def matcher(request: pytest.FixtureRequest) -> KeywordMatcher:
+    threshold = 0 if request.param else len(KEYWORDS) + 1
+    return KeywordMatcher(KEYWORDS, scan_threshold=threshold)
+
+
+def test_matcher_mode(matcher: KeywordMatcher) -> None:
+    assert len(matcher) == len(KEYWORDS)
+    assert matcher.keywords == tuple(KEYWORDS)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("скидка 20% на бар", [(0, "скидк"), (0, "скидка"), (9, "%"), (14, "бар")]),
+        ("поздний завтрак", [(0, "поздний завтрак"), (8, "завтрак")]),
+        ("бар бар", [(0, "бар"), (4, "бар")]),
+        ("обычный текст", []),
+        ("", []),
+    ],
+)
+def test_find_all(matcher: KeywordMatcher, text: str, expected: list) -> None:
+    assert matcher.find_all(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("скидки в баре", {"скидк", "бар"}),
+        ("поздний завтрак", {"поздний завтрак", "завтрак"}),
+        ("обычный текст", set()),
+    ],
+)
+def test_matched(matcher: KeywordMatcher, text: str, expected: set) -> None:
+    assert matcher.matched(text) == expected
+    assert matcher.contains_any(text) == bool(expected)
+
+
+def test_matches_naive_search_on_large_vocabulary() -> None:
+    """Автомат дает тот же результат, что и поиск подстрок по каждому слову"""
+    keywords = [f"слово{i}" for i in range(500)] + ["кофе", "офе", "е"]
+    text = "кофе и слово42, слово420 и слово4"
+    matcher = KeywordMatcher(keywords)
+
+    assert matcher.uses_automaton
+    assert matcher.matched(text) == {k for k in keywords if k in text}
+
+
+def test_empty_and_duplicate_keywords_are_ignored() -> None:
+    matcher = KeywordMatcher(["", "акция", "акция"])
+    assert matcher.keywords == ("акция",)
+    assert not matcher.contains_any("любой текст")
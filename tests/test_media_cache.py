@@ -0,0 +1,158 @@
+import asyncio
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from telethon import errors
+from telethon.tl.types import Document, InputDocument
+from parser.media_cache import MediaCache, media_key
+from parser.media_relay import relay_media, send_media
+
+KB = 1024
+
+
+class SourceClient:
+    def __init__(self, data: bytes):
+        self.session = SimpleNamespace(filename="user.session")
+        self.data = data
+        self.downloads = 0
+
+    def iter_download(self, media, request_size: int):
+        self.downloads += 1
+
+        async def gen():
+            for start in range(0, len(self.data), request_size):
+                yield self.data[start:start + request_size]
+        return gen()
+
+    async def download_media(self, message, file=bytes):
+        self.downloads += 1
+        return self.data
+
+
+class BotClient:
+    """Загружает и отправляет файлы, как бот в Telethon"""
+
+    def __init__(self, stale_handles: bool = False):
+        self.session = SimpleNamespace(filename="bot.session")
+        self.uploads = []
+        self.sent = []
+        self.stale_handles = stale_handles
+
+    async def upload_file(self, file, file_size=None, file_name=None, part_size_kb=512):
+        if isinstance(file, str):
+            data = Path(file).read_bytes()
+        elif isinstance(file, bytes):
+            data = file
+        else:
+            data = await file.read(file_size)
+        self.uploads.append(data)
+        return SimpleNamespace(name=file_name, size=len(data))
+
+    async def send_file(self, peer, file, **kwargs):
+        if isinstance(file, InputDocument) and self.stale_handles:
+            raise errors.FileReferenceExpiredError(request=None)
+        self.sent.append(file)
+        document = Document(
+            id=777, access_hash=42, file_reference=b"ref", date=datetime(2024, 1, 1),
+            mime_type="video/mp4", size=4, dc_id=2, attributes=[],
+        )
+        return SimpleNamespace(document=document, photo=None)
+
+
+def make_message(data: bytes, document_id: int = 1) -> SimpleNamespace:
+    document = SimpleNamespace(id=document_id, size=len(data), attributes=[], mime_type="video/mp4")
+    return SimpleNamespace(
+        id=10, media="media", photo=None, document=document,
+        file=SimpleNamespace(size=len(data), name="clip.mp4", ext=".mp4"),
+    )
+
+
+@pytest.mark.parametrize("message, expected", [
+    (SimpleNamespace(document=SimpleNamespace(id=5, size=100), photo=None, file=None), "doc5_100"),
+    (SimpleNamespace(document=None, photo=SimpleNamespace(id=7), file=SimpleNamespace(size=30)), "photo7_30"),
+    (SimpleNamespace(document=None, photo=True, file=SimpleNamespace(size=30)), None),
+])
+def test_media_key(message: SimpleNamespace, expected: str) -> None:
+    assert media_key(message) == expected
+
+
+def test_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    """Вытесняется файл, к которому дольше всего не обращались"""
+    with MediaCache(tmp_path, max_bytes=25) as cache:
+        for key in ("a", "b"):
+            cache.store(key, b"x" * 10)
+            time.sleep(0.01)
+        assert cache.path("a") is not None
+        time.sleep(0.01)
+        cache.store("c", b"x" * 10)
+
+        assert cache.path("b") is None
+        assert cache.path("a") is not None
+        assert cache.total_bytes == 20
+        assert not (tmp_path / "b").exists()
+
+
+def test_cache_skips_files_larger_than_cap(tmp_path: Path) -> None:
+    with MediaCache(tmp_path, max_bytes=5) as cache:
+        assert not cache.store("big", b"x" * 10)
+        assert len(cache) == 0
+
+
+def test_cache_survives_restart(tmp_path: Path) -> None:
+    """Файлы и ссылки на отправленные файлы переживают перезапуск"""
+    bot = BotClient()
+    with MediaCache(tmp_path) as cache:
+        cache.store("doc1_4", b"data")
+        cache.remember_sent(bot, "doc1_4", asyncio.run(bot.send_file("peer", "file")))
+
+    with MediaCache(tmp_path) as cache:
+        assert cache.total_bytes == 4
+        assert cache.path("doc1_4").read_bytes() == b"data"
+        assert cache.get_handle(bot, "doc1_4") == InputDocument(777, 42, b"ref")
+        assert cache.get_handle(SimpleNamespace(session=SimpleNamespace(filename="other")), "doc1_4") is None
+
+
+def test_repost_is_sent_without_transfer(tmp_path: Path) -> None:
+    """Повторный файл отправляется по ссылке: без скачивания и загрузки"""
+    data = bytes(range(256)) * 4 * KB
+    source, bot = SourceClient(data), BotClient()
+
+    with MediaCache(tmp_path) as cache:
+        asyncio.run(send_media(source, bot, "peer", make_message(data), cache=cache, caption="1"))
+        asyncio.run(send_media(source, bot, "peer", make_message(data), cache=cache, caption="2"))
+
+        assert source.downloads == 1
+        assert bot.uploads == [data]
+        assert bot.sent[1] == InputDocument(777, 42, b"ref")
+        assert (tmp_path / "doc1_1048576").read_bytes() == data
+
+
+def test_stale_handle_is_uploaded_from_disk(tmp_path: Path) -> None:
+    """Устаревшая ссылка забывается, файл загружается с диска без скачивания"""
+    data = b"y" * (3 * KB)
+    source, bot = SourceClient(data), BotClient()
+
+    with MediaCache(tmp_path) as cache:
+        asyncio.run(send_media(source, bot, "peer", make_message(data), cache=cache))
+        bot.stale_handles = True
+        asyncio.run(send_media(source, bot, "peer", make_message(data), cache=cache))
+
+        assert source.downloads == 1
+        assert bot.uploads == [data, data]
+
+
+def test_unsent_upload_is_reused(tmp_path: Path) -> None:
+    """InputFile запоминается сразу после загрузки"""
+    data = b"z" * KB
+    source, bot = SourceClient(data), BotClient()
+
+    with MediaCache(tmp_path, max_bytes=0) as cache:
+        first = asyncio.run(relay_media(source, bot, make_message(data), cache=cache))
+        second = asyncio.run(relay_media(source, bot, make_message(data), cache=cache))
+
+        assert second.cached and second.file is first.file
+        assert len(cache) == 0
+        assert source.downloads == 1
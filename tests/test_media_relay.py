@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from parser.media_relay import ChunkStream, relay_media
+
+KB = 1024
+
+
+async def chunks_of(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+class SourceClient:
+    def __init__(self, name: str, data: bytes):
+        self.session = SimpleNamespace(filename=f"{name}.session")
+        self.data = data
+        self.downloaded = 0
+
+    def iter_download(self, media, request_size: int):
+        async def gen():
+            for start in range(0, len(self.data), request_size):
+                self.downloaded += 1
+                yield self.data[start:start + request_size]
+        return gen()
+
+    async def download_media(self, message, file=bytes):
+        return self.data
+
+
+class TargetClient:
+    """Читает поток частями, как upload_file в Telethon"""
+
+    def __init__(self, name: str):
+        self.session = SimpleNamespace(filename=f"{name}.session")
+        self.received = b""
+
+    async def upload_file(self, file, file_size=None, file_name=None, part_size_kb=512):
+        if isinstance(file, bytes):
+            self.received = file
+        else:
+            part_size = part_size_kb * KB
+            for _ in range((file_size + part_size - 1) // part_size):
+                self.received += await file.read(part_size)
+        return SimpleNamespace(name=file_name)
+
+
+def make_message(data: bytes, photo: bool = False) -> SimpleNamespace:
+    document = None if photo else SimpleNamespace(attributes=["attr"], mime_type="video/mp4")
+    return SimpleNamespace(
+        id=1, media="media", photo=photo, document=document,
+        file=SimpleNamespace(size=len(data), name=None if photo else "clip.mp4", ext=".jpg"),
+    )
+
+
+@pytest.mark.parametrize("chunk, part", [(4, 4), (3, 4), (5, 2)])
+def test_chunk_stream_reads_in_parts(chunk: int, part: int) -> None:
+    data = bytes(range(23))
+
+    async def read_all() -> tuple:
+        stream = ChunkStream(chunks_of(data, chunk), len(data), "f.bin")
+        parts = []
+        while True:
+            block = await stream.read(part)
+            if not block:
+                return b"".join(parts), stream.peak_buffer
+            parts.append(block)
+
+    result, peak = asyncio.run(read_all())
+    assert result == data
+    assert peak < chunk + part
+
+
+def test_relay_streams_documents_with_bounded_buffer() -> None:
+    data = bytes(range(256)) * (10 * KB)  # 2.5 МБ
+    source, target = SourceClient("user", data), TargetClient("bot")
+
+    relayed = asyncio.run(relay_media(source, target, make_message(data), chunk_size=128 * KB))
+
+    assert target.received == data
+    assert relayed.file.name == "clip.mp4"
+    assert relayed.send_kwargs() == {"attributes": ["attr"], "mime_type": "video/mp4"}
+    assert relayed.peak_buffer <= 2 * 128 * KB
+    assert source.downloaded == 20
+
+
+def test_relay_reuses_media_on_same_account() -> None:
+    data = b"x" * KB
+    source = SourceClient("user", data)
+
+    relayed = asyncio.run(relay_media(source, source, make_message(data)))
+    assert relayed.reused
+    assert relayed.file == "media"
+    assert source.downloaded == 0
+
+
+def test_relay_photo_gets_image_name() -> None:
+    data = b"x" * KB
+    target = TargetClient("bot")
+
+    relayed = asyncio.run(relay_media(SourceClient("user", data), target, make_message(data, photo=True)))
+    assert relayed.file.name == "1.jpg"
+    assert target.received == data
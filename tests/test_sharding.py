@@ -0,0 +1,79 @@
+import time
+from collections import Counter
+from typing import Dict
+
+import pytest
+from parser.sharding import HashRing, ShardScheduler
+from parser.throttle import AccountThrottle
+
+CHANNELS = [f"@channel_{i}" for i in range(2000)]
+
+
+def make_throttles(*accounts: str) -> Dict[str, AccountThrottle]:
+    return {account: AccountThrottle(concurrency=1) for account in accounts}
+
+
+@pytest.mark.parametrize("nodes", [2, 4, 8])
+def test_ring_spreads_keys_evenly(nodes: int) -> None:
+    """Каждому узлу достается примерно равная доля ключей"""
+    ring = HashRing([f"account_{i}" for i in range(nodes)])
+    counts = Counter(ring.get(channel) for channel in CHANNELS)
+    expected = len(CHANNELS) / nodes
+    assert len(counts) == nodes
+    assert all(0.6 * expected < count < 1.4 * expected for count in counts.values())
+
+
+def test_adding_node_moves_only_its_share() -> None:
+    """Новый узел забирает около 1/N ключей, остальные остаются на месте"""
+    ring = HashRing(["a", "b", "c"])
+    before = {channel: ring.get(channel) for channel in CHANNELS}
+    ring.add("d")
+    moved = [channel for channel in CHANNELS if ring.get(channel) != before[channel]]
+    assert all(ring.get(channel) == "d" for channel in moved)
+    assert 0.15 < len(moved) / len(CHANNELS) < 0.35
+
+    ring.remove("d")
+    assert {channel: ring.get(channel) for channel in CHANNELS} == before
+
+
+def test_preference_lists_each_node_once() -> None:
+    ring = HashRing(["a", "b", "c"])
+    order = ring.preference("@channel")
+    assert sorted(order) == ["a", "b", "c"]
+    assert order[0] == ring.get("@channel")
+    assert HashRing().preference("@channel") == []
+
+
+def test_channel_name_variants_share_owner() -> None:
+    scheduler = ShardScheduler(make_throttles("a", "b", "c"))
+    assert scheduler.owner("@News") == scheduler.owner("news")
+
+
+def test_assign_skips_account_in_flood_wait() -> None:
+    """Каналы аккаунта в FloodWait читает следующий аккаунт, после паузы - снова владелец"""
+    throttles = make_throttles("a", "b", "c")
+    scheduler = ShardScheduler(throttles)
+    owner = scheduler.owner("@channel")
+    backup = scheduler.assign("@channel", exclude=[owner])
+
+    throttles[owner].flood_gate.block(0.05)
+    assert scheduler.assign("@channel") == backup
+
+    time.sleep(0.06)
+    assert scheduler.assign("@channel") == owner
+
+
+def test_assign_prefers_shortest_pause_and_respects_exclude() -> None:
+    throttles = make_throttles("a", "b")
+    scheduler = ShardScheduler(throttles)
+    throttles["a"].flood_gate.block(100)
+    throttles["b"].flood_gate.block(10)
+    assert scheduler.assign("@channel") == "b"
+    assert scheduler.assign("@channel", exclude=["b"]) == "a"
+    assert scheduler.assign("@channel", exclude=["a", "b"]) is None
+
+
+def test_plan_covers_every_channel_once() -> None:
+    scheduler = ShardScheduler(make_throttles("a", "b", "c"))
+    plan = scheduler.plan(CHANNELS[:30])
+    assert sorted(channel for channels in plan.values() for channel in channels) == sorted(CHANNELS[:30])
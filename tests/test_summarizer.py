@@ -1,5 +1,5 @@
 import pytest
-from parser.summarizer import create_short_title, extract_date_info
+from parser.summarizer import create_short_title, extract_date_info, scan_prices_and_dates
 
 @pytest.mark.parametrize(
     "text,tags,city,expected",
@@ -42,6 +42,14 @@ def test_create_short_title(text: str, tags: list[str], city: str, expected: str
             "Мероприятие пройдет 25 декабря",
             "25 декабря",
         ),
+        (
+            "С 1 марта по 15 января",
+            "15 января",
+        ),
+        (
+            "5 мая и с 7 мая",
+            "7 мая",
+        ),
         (
             "Текст без даты",
             None,
@@ -49,4 +57,20 @@ def test_create_short_title(text: str, tags: list[str], city: str, expected: str
     ],
 )
 def test_extract_date_info(text: str, expected: str | None) -> None:
-    assert extract_date_info(text) == expected 
\ No newline at end of file
+    assert extract_date_info(text) == expected 
+
+def test_scan_prices_and_dates() -> None:
+    """Проверяет однопроходный поиск цен и дат"""
+    text = "Сет за 1500₽ до 15 января, бокал 400 руб"
+    scan = scan_prices_and_dates(text)
+
+    assert scan.prices == [400, 1500]
+    assert scan.date == "15 января"
+    assert [text[start:end] for start, end in scan.date_spans] == ["15 января"]
+
+def test_scan_prices_and_dates_empty() -> None:
+    scan = scan_prices_and_dates("Текст без цен и дат")
+
+    assert scan.prices == []
+    assert scan.date_spans == []
+    assert scan.date is None
@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from db_manager import Catalog
+from parser.keyword_matcher import KeywordMatcher
+from telegram_monitor import TelegramMonitor, monitored_chat_ids
+
+
+@pytest.mark.parametrize(
+    "channel_ids, expected",
+    [
+        (["-1001", "-1002"], {-1001, -1002}),
+        (["-1001", "@channel"], {-1001}),
+        ([], set()),
+    ],
+)
+def test_monitored_chat_ids(channel_ids: list, expected: set) -> None:
+    assert monitored_chat_ids([{"channel_id": c} for c in channel_ids]) == expected
+
+
+def test_refresh_chats_swaps_filter() -> None:
+    """Новый список каналов применяется к событиям без перерегистрации обработчика"""
+    monitor = TelegramMonitor.__new__(TelegramMonitor)
+    monitor.leased_chats = None
+    monitor.refresh_chats(Catalog(1, cities=[], channels=[{"channel_id": "-1001"}], keywords=[]))
+
+    assert monitor.is_monitored(SimpleNamespace(chat_id=-1001))
+    assert not monitor.is_monitored(SimpleNamespace(chat_id=-1002))
+
+    monitor.refresh_chats(Catalog(2, cities=[], channels=[{"channel_id": "-1002"}], keywords=[]))
+    assert monitor.chats_version == 2
+    assert not monitor.is_monitored(SimpleNamespace(chat_id=-1001))
+    assert monitor.is_monitored(SimpleNamespace(chat_id=-1002))
+
+
+def test_only_leased_chats_are_monitored() -> None:
+    """Воркер слушает только арендованные каналы, остальные - других воркеров"""
+    monitor = TelegramMonitor.__new__(TelegramMonitor)
+    monitor.leased_chats = frozenset({-1001})
+    monitor.refresh_chats(
+        Catalog(1, cities=[], channels=[{"channel_id": "-1001"}, {"channel_id": "-1002"}], keywords=[])
+    )
+
+    assert monitor.is_monitored(SimpleNamespace(chat_id=-1001))
+    assert not monitor.is_monitored(SimpleNamespace(chat_id=-1002))
+    assert monitor.is_leased(-1001) and not monitor.is_leased(-1002)
+
+
+def test_backfill_skips_posts_older_than_retention() -> None:
+    """Посты, отметки о которых уже удалены очисткой, не дочитываются повторно"""
+    now = datetime.now(timezone.utc)
+    messages = [
+        SimpleNamespace(id=2, date=now - timedelta(days=1)),
+        SimpleNamespace(id=1, date=now - timedelta(days=45)),
+    ]
+    added = []
+
+    async def get_messages(chat_id, limit):
+        return messages
+
+    async def flush():
+        pass
+
+    async def add(message):
+        added.append(message.id)
+
+    monitor = TelegramMonitor.__new__(TelegramMonitor)
+    monitor.db = SimpleNamespace(processed_retention_days=30)
+    monitor.user_client = SimpleNamespace(get_messages=get_messages)
+    monitor.albums = SimpleNamespace(add=add, flush=flush)
+    asyncio.run(monitor.backfill([-1001]))
+    assert added == [2]
+
+    # Без срока хранения отметки не удаляются, дочитывается все
+    added.clear()
+    monitor.db.processed_retention_days = 0
+    asyncio.run(monitor.backfill([-1001]))
+    assert added == [1, 2]
+
+
+class FakeAsyncDb:
+    """Журнал закреплений и отметок вместо AsyncDatabaseManager"""
+
+    def __init__(self, fail_mark: bool = False) -> None:
+        self.fail_mark = fail_mark
+        self.released = []
+
+    async def message_exists(self, message_id, channel_id):
+        return False
+
+    async def claim_forward(self, message_id, channel_id, worker_id):
+        return True
+
+    async def release_forward(self, message_id, channel_id, worker_id):
+        self.released.append(message_id)
+
+    async def add_processed_message(self, message_id, channel_id):
+        if self.fail_mark:
+            raise RuntimeError("database is locked")
+        return True
+
+
+def _monitor_for_post(adb: FakeAsyncDb, send) -> TelegramMonitor:
+    async def resolve(client, chat_id):
+        return SimpleNamespace(username="channel", title="Канал")
+
+    monitor = TelegramMonitor.__new__(TelegramMonitor)
+    monitor.adb = adb
+    monitor.db = SimpleNamespace(catalog_version=1)
+    monitor.keywords_version = 1
+    monitor.keyword_matcher = KeywordMatcher(["скидка"])
+    monitor.leased_chats = None
+    monitor.worker_id = "a"
+    monitor.output_peer = "@output"
+    monitor.entities = SimpleNamespace(resolve=resolve)
+    monitor.bot_client = SimpleNamespace(send_message=send)
+    return monitor
+
+
+@pytest.mark.parametrize("send_fails, mark_fails, released", [
+    (True, False, [7]),
+    (False, True, []),
+])
+def test_claim_released_only_when_send_fails(send_fails: bool, mark_fails: bool, released: list) -> None:
+    """Закрепление снимается, только если пост не отправлен, а не при ошибке отметки"""
+    async def send(peer, text, parse_mode=None):
+        if send_fails:
+            raise ConnectionError
+
+    adb = FakeAsyncDb(fail_mark=mark_fails)
+    monitor = _monitor_for_post(adb, send)
+    post = SimpleNamespace(id=7, chat_id=-1001, from_id=None, client=None,
+                           photo=None, document=None, text="Скидка 20%")
+    asyncio.run(monitor.process_post([post]))
+    assert adb.released == released
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from parser.throttle import FloodGate, TokenBucket, get_account_throttle
+
+
+class FakeClient:
+    """Заглушка клиента: ограничения привязываются к объекту"""
+
+
+def test_flood_gate_blocks_all_waiters() -> None:
+    async def scenario() -> list:
+        gate = FloodGate()
+        gate.block(0.05)
+        start = time.monotonic()
+        await asyncio.gather(gate.wait(), gate.wait())
+        return [time.monotonic() - start, gate.remaining]
+
+    elapsed, remaining = asyncio.run(scenario())
+    assert elapsed >= 0.05
+    assert remaining == 0
+
+
+def test_flood_gate_does_not_shorten_pause() -> None:
+    gate = FloodGate()
+    gate.block(10)
+    gate.block(1)
+    assert gate.remaining > 9
+
+
+def test_account_throttle_is_shared_per_client() -> None:
+    async def scenario() -> None:
+        client, other = FakeClient(), FakeClient()
+        throttle = get_account_throttle(client, 2)
+
+        assert get_account_throttle(client, 2) is throttle
+        assert get_account_throttle(other, 2) is not throttle
+
+        throttle.flood_gate.block(5)
+        resized = get_account_throttle(client, 4)
+        assert resized.concurrency == 4
+        assert resized.flood_gate is throttle.flood_gate
+
+    asyncio.run(scenario())
+
+
+def test_semaphore_bounds_concurrency() -> None:
+    async def scenario() -> int:
+        throttle = get_account_throttle(FakeClient(), 2)
+        active = peak = 0
+
+        async def fetch() -> None:
+            nonlocal active, peak
+            async with throttle.semaphore:
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(fetch() for _ in range(6)))
+        return peak
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_token_bucket_allows_burst_then_paces() -> None:
+    async def scenario() -> list:
+        bucket = TokenBucket(rate=50, capacity=2)
+        return [await bucket.acquire() for _ in range(4)]
+
+    waits = asyncio.run(scenario())
+    assert waits[:2] == [0.0, 0.0]
+    assert all(wait > 0 for wait in waits[2:])
+    assert sum(waits) < 0.1
+
+
+def test_token_bucket_without_rate_never_waits() -> None:
+    async def scenario() -> float:
+        bucket = TokenBucket(rate=0)
+        return sum([await bucket.acquire() for _ in range(100)])
+
+    assert asyncio.run(scenario()) == 0
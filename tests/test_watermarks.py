@@ -0,0 +1,31 @@
+import json
+from pathlib import Path
+
+from parser.watermarks import HighWaterMarks
+
+
+def test_marks_only_move_forward(tmp_path: Path) -> None:
+    marks = HighWaterMarks(tmp_path / "marks.json")
+
+    assert marks.get("@channel") == 0
+    marks.advance("@channel", 10)
+    marks.advance("@channel", 5)
+    assert marks.get("@channel") == 10
+
+
+def test_marks_persist_between_runs(tmp_path: Path) -> None:
+    path = tmp_path / "data" / "marks.json"
+    marks = HighWaterMarks(path)
+    marks.advance("@a", 42)
+    marks.advance("@b", 7)
+    marks.save()
+
+    assert json.loads(path.read_text()) == {"@a": 42, "@b": 7}
+    assert HighWaterMarks(path).get("@a") == 42
+
+
+def test_corrupted_file_is_ignored(tmp_path: Path) -> None:
+    path = tmp_path / "marks.json"
+    path.write_text("{not json")
+
+    assert HighWaterMarks(path).get("@a") == 0